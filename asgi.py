@@ -0,0 +1,254 @@
+"""
+Async (ASGI) serving mode.
+
+/search, /refresh_matches and /load_more are served by async handlers that await
+Riot I/O through riot_client_async, so one process can keep hundreds of slow
+lookups in flight. Job streams (/jobs/<job_id>/stream) are polled on the event loop
+instead of holding a thread each. Every other route is passed through to the Flask app.
+
+Usage:
+    uvicorn asgi:app --workers 1
+"""
+import asyncio
+import io
+import json
+import sys
+import time
+from urllib.parse import parse_qs
+from asgiref.wsgi import WsgiToAsgi
+from flask import render_template
+import riot_client_async
+from main import (
+    app as flask_app,
+    job_queue,
+    JOB_STREAM_POLL_INTERVAL,
+    JOB_STREAM_TIMEOUT,
+    read_job_stream,
+    build_cached_profile,
+    build_new_profile,
+    cache_profile_page,
+    get_cached_profile_page,
+    submit_refresh_job,
+    submit_lobby_rank_job,
+)
+from riot_client import InvalidCursorError, sanitize_user_id
+from singleflight import async_single_flight
+from storage import storage
+
+wsgi_app = WsgiToAsgi(flask_app)
+
+
+async def read_body(receive):
+    body = b""
+    while True:
+        message = await receive()
+        body += message.get("body", b"")
+        if not message.get("more_body"):
+            return body
+
+
+async def send_response(send, status, body, content_type):
+    await send({
+        "type": "http.response.start",
+        "status": status,
+        "headers": [(b"content-type", content_type.encode()), (b"content-length", str(len(body)).encode())],
+    })
+    await send({"type": "http.response.body", "body": body})
+
+
+async def send_json(send, data, status=200):
+    await send_response(send, status, json.dumps(data).encode(), "application/json")
+
+
+def build_environ(scope):
+    """
+    Build a minimal WSGI environ for the ASGI request, so Flask templates (url_for) can render.
+    """
+    headers = {name.decode().lower(): value.decode() for name, value in scope.get("headers", [])}
+    server_name, server_port = scope.get("server") or ("localhost", 80)
+    return {
+        "REQUEST_METHOD": scope["method"],
+        "SCRIPT_NAME": scope.get("root_path", ""),
+        "PATH_INFO": scope["path"],
+        "QUERY_STRING": scope.get("query_string", b"").decode(),
+        "SERVER_NAME": server_name,
+        "SERVER_PORT": str(server_port),
+        "SERVER_PROTOCOL": "HTTP/1.1",
+        "HTTP_HOST": headers.get("host", server_name),
+        "wsgi.url_scheme": scope.get("scheme", "http"),
+        "wsgi.input": io.BytesIO(),
+        "wsgi.errors": sys.stderr,
+    }
+
+
+def render_page(scope, template, **context):
+    with flask_app.request_context(build_environ(scope)):
+        return render_template(template, **context)
+
+
+async def send_page(scope, send, template, status=200, **context):
+    body = render_page(scope, template, **context).encode()
+    await send_response(send, status, body, "text/html; charset=utf-8")
+
+
+@async_single_flight(lambda user_id, game_name, tag_line, region: (user_id, region))
+async def start_new_user_ingestion(user_id, game_name, tag_line, region):
+    """
+    Resolve a new user's account, summoner and ranked stats without blocking, and queue
+    the job that fetches their matches. Concurrent searches for the same user and region
+    share one call.
+
+    :return: Tuple of (summoner_info, ranked_stats, ingestion job ID).
+    """
+    account_info = await riot_client_async.get_account_by_riot_id(game_name, tag_line, region)
+    if not account_info or "puuid" not in account_info:
+        raise Exception("Failed to fetch valid account information.")
+
+    summoner_info = await riot_client_async.get_summoner_info_by_puuid(account_info["puuid"], region)
+    if not summoner_info or "id" not in summoner_info:
+        raise Exception("Failed to fetch valid summoner information.")
+
+    ranked_stats = next(
+        (
+            stats
+            for stats in await riot_client_async.get_ranked_stats_by_summoner_id(summoner_info["id"], region) or []
+            if stats["queueType"] == "RANKED_SOLO_5x5"
+        ),
+        None,
+    )
+
+    puuid = account_info["puuid"]
+    job_id = await asyncio.to_thread(
+        job_queue.submit, "ingest_user", f"ingest:{puuid}:{region}",
+        user_id=user_id, puuid=puuid, region=region, summoner_info=summoner_info, ranked_stats=ranked_stats,
+    )
+    return summoner_info, ranked_stats, job_id
+
+
+async def search(scope, receive, send):
+    form = {key: values[0] for key, values in parse_qs((await read_body(receive)).decode()).items()}
+    game_name = form.get("game_name", "")
+    tag_line = form.get("tag_line", "")
+    region = form.get("region", "na1")
+
+    try:
+        user_id = sanitize_user_id(f"{game_name}#{tag_line}")
+
+        # Hot profiles are served as rendered while their page version is unchanged
+        page = await asyncio.to_thread(get_cached_profile_page, user_id, game_name, tag_line, region)
+        if page is not None:
+            return await send_response(send, 200, page.encode(), "text/html; charset=utf-8")
+
+        user_data = await asyncio.to_thread(storage.get_profile, user_id)
+
+        if user_data:
+            # Existing user: Load matches from the database
+            context = await asyncio.to_thread(build_cached_profile, user_id, user_data, game_name, tag_line, region)
+            page = render_page(scope, "result.html", **context)
+            lobby_ranks_pending = await asyncio.to_thread(
+                submit_lobby_rank_job, user_id, region, context["user_match_details"]
+            )
+            cache_profile_page(user_id, user_data, game_name, tag_line, region, page, lobby_ranks_pending)
+            return await send_response(send, 200, page.encode(), "text/html; charset=utf-8")
+
+        # New user: Fetch matches from Riot API (concurrent searches share one lookup)
+        summoner_info, ranked_stats, job_id = await start_new_user_ingestion(user_id, game_name, tag_line, region)
+        context = build_new_profile(game_name, tag_line, region, summoner_info, ranked_stats, job_id)
+        return await send_page(scope, send, "result.html", **context)
+    except Exception as e:
+        print("Error in search:", e)
+        return await send_page(scope, send, "error.html", status=400, error=str(e))
+
+
+async def load_more_matches(scope, receive, send):
+    try:
+        body = json.loads(await read_body(receive) or b"{}")
+        user_id = body.get("user_id")
+        if not user_id:
+            raise ValueError("User ID is required.")
+
+        next_matches, next_cursor = await riot_client_async.load_match_page(
+            user_id, cursor=body.get("cursor"), region=body.get("region", "na1")
+        )
+        if not next_matches:
+            return await send_json(send, {"message": "No more matches to load!"})
+
+        return await send_json(send, {"matches": next_matches, "next_cursor": next_cursor})
+    except InvalidCursorError as e:
+        return await send_json(send, {"error": str(e)}, status=400)
+    except Exception as e:
+        print("Error in load_more_matches:", e)
+        return await send_json(send, {"error": str(e)}, status=500)
+
+
+async def refresh_matches(scope, receive, send):
+    try:
+        body = json.loads(await read_body(receive) or b"{}")
+        user_id = body.get("user_id")
+        if not user_id:
+            return await send_json(send, {"error": "User ID is required."}, status=400)
+
+        # Sync in the background; the page polls /jobs/<job_id> for the result
+        job_id = await asyncio.to_thread(submit_refresh_job, user_id, body.get("region", "na1"))
+        return await send_json(send, {"job_id": job_id, "status": "queued"}, status=202)
+    except Exception as e:
+        print("Error in refresh_matches:", e)
+        return await send_json(send, {"error": str(e)}, status=500)
+
+
+async def job_stream(scope, receive, send):
+    """
+    Stream a background job's progress as newline-delimited JSON (see main.job_stream).
+    """
+    job_id = scope["path"][len("/jobs/"):-len("/stream")]
+    step = await asyncio.to_thread(read_job_stream, job_id, 0)
+    if step is None:
+        return await send_json(send, {"error": "Job not found."}, status=404)
+
+    await send({
+        "type": "http.response.start",
+        "status": 200,
+        "headers": [(b"content-type", b"application/x-ndjson"), (b"cache-control", b"no-cache")],
+    })
+    deadline = time.monotonic() + JOB_STREAM_TIMEOUT
+    while True:
+        lines, sent, done = step
+        if lines:
+            await send({"type": "http.response.body", "body": "".join(lines).encode(), "more_body": True})
+        if done or time.monotonic() > deadline:
+            break
+        await asyncio.sleep(JOB_STREAM_POLL_INTERVAL)
+        step = await asyncio.to_thread(read_job_stream, job_id, sent)
+        if step is None:
+            break
+    await send({"type": "http.response.body", "body": b""})
+
+
+ASYNC_ROUTES = {
+    ("POST", "/search"): search,
+    ("POST", "/load_more"): load_more_matches,
+    ("POST", "/refresh_matches"): refresh_matches,
+}
+
+
+async def app(scope, receive, send):
+    """
+    ASGI entry point: async handlers for the Riot-bound routes, Flask for everything else.
+    """
+    if scope["type"] == "lifespan":
+        while True:
+            message = await receive()
+            if message["type"] == "lifespan.startup":
+                await send({"type": "lifespan.startup.complete"})
+            elif message["type"] == "lifespan.shutdown":
+                await send({"type": "lifespan.shutdown.complete"})
+                return
+
+    handler = ASYNC_ROUTES.get((scope.get("method"), scope.get("path"))) if scope["type"] == "http" else None
+    if scope["type"] == "http" and scope.get("method") == "GET":
+        path = scope.get("path", "")
+        if path.startswith("/jobs/") and path.endswith("/stream") and path.count("/") == 3:
+            handler = job_stream
+    if handler:
+        return await handler(scope, receive, send)
+    return await wsgi_app(scope, receive, send)
@@ -0,0 +1,469 @@
+"""
+Local stand-in for the Riot API, for benchmarks and offline runs.
+
+Serves recorded account-v1, summoner-v4, league-v4 and match-v5 responses from a
+fixture directory, one JSON file per response. Match ID lists that were not recorded
+for the exact query are answered from the recorded match payloads, so paging,
+startTime/endTime and queue filters work for any query. The server can add latency,
+enforce app and method rate limits with Riot's headers and 429 responses, and fail a
+share of requests with 5xx errors.
+
+The routing value is the first path segment, so point the app at the server with:
+
+    RIOT_API_BASE_URL=http://127.0.0.1:8765/{region}
+
+Usage:
+    python bench/fixture_server.py [--fixtures bench/fixtures] [--port 8765]
+                                   [--latency-ms 80] [--jitter-ms 40]
+                                   [--app-rate-limit 20:1,100:120] [--method-rate-limit 2000:10]
+                                   [--error-rate 0.01]
+    python bench/fixture_server.py --record        # proxy to the Riot API and save responses
+    python bench/fixture_server.py --generate 50   # write synthetic fixtures for 50 players
+
+GET /__stats returns the upstream call counts (add ?reset=1 to clear them) and
+GET /__players lists the Riot IDs that have an account fixture.
+"""
+import argparse
+import hashlib
+import json
+import os
+import random
+import re
+import threading
+import time
+from collections import Counter, deque
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qsl, unquote, urlencode, urlsplit
+
+import requests
+
+# Directory holding the recorded responses
+DEFAULT_FIXTURES_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "fixtures")
+
+# Riot API host that --record forwards requests to
+RIOT_API_UPSTREAM_URL = os.getenv("RIOT_API_UPSTREAM_URL", "https://{region}.api.riotgames.com")
+
+# Riot's page size and maximum count for match ID lists
+DEFAULT_MATCH_ID_COUNT = 20
+MAX_MATCH_ID_COUNT = 100
+
+# Endpoint names, matching the method names riot_client uses for its rate limits
+ENDPOINTS = (
+    ("account-v1.by-riot-id", re.compile(r"^/riot/account/v1/accounts/by-riot-id/([^/]+)/([^/]+)$")),
+    ("summoner-v4.by-puuid", re.compile(r"^/lol/summoner/v4/summoners/by-puuid/([^/]+)$")),
+    ("league-v4.by-summoner", re.compile(r"^/lol/league/v4/entries/by-summoner/([^/]+)$")),
+    ("match-v5.ids", re.compile(r"^/lol/match/v5/matches/by-puuid/([^/]+)/ids$")),
+    ("match-v5.match", re.compile(r"^/lol/match/v5/matches/([^/]+)$")),
+)
+
+# Queue IDs counted as ranked by the match-v5 `type=ranked` filter
+RANKED_QUEUES = {420, 440}
+
+
+def classify_path(path):
+    """
+    Name the Riot endpoint a path belongs to.
+
+    :return: Tuple of (endpoint name or None, path arguments).
+    """
+    for name, pattern in ENDPOINTS:
+        match = pattern.match(path)
+        if match:
+            return name, tuple(unquote(arg) for arg in match.groups())
+    return None, ()
+
+
+def fixture_key(routing, path, query):
+    """
+    Key of a recorded response: routing value, path and sorted query string.
+    """
+    return f"/{routing}{path}?{urlencode(sorted(query))}"
+
+
+def fixture_filename(key):
+    return hashlib.sha1(key.encode()).hexdigest() + ".json"
+
+
+class RateLimitWindows:
+    """
+    Server-side sliding windows for one set of limits (e.g. "20:1,100:120").
+    """
+
+    def __init__(self, spec):
+        self.limits = []
+        for part in (spec or "").split(","):
+            if part.strip():
+                limit, window = part.split(":")
+                self.limits.append((int(limit), float(window)))
+        self.header = ",".join(f"{limit}:{int(window)}" for limit, window in self.limits)
+        self._calls = {}  # key -> deque of call times
+
+    def try_record(self, key, now):
+        """
+        Record a call if every window has room.
+
+        :return: Tuple of (seconds to wait, or 0 if recorded; count header value).
+        """
+        calls = self._calls.setdefault(key, deque())
+        longest = max((window for _, window in self.limits), default=0)
+        while calls and calls[0] <= now - longest:
+            calls.popleft()
+
+        counts = [(limit, window, sum(1 for t in calls if t > now - window)) for limit, window in self.limits]
+        wait = 0
+        for limit, window, count in counts:
+            if count >= limit:
+                oldest_in_window = [t for t in calls if t > now - window][-limit]
+                wait = max(wait, oldest_in_window + window - now)
+        if not wait:
+            calls.append(now)
+            counts = [(limit, window, count + 1) for limit, window, count in counts]
+        count_header = ",".join(f"{count}:{int(window)}" for _, window, count in counts)
+        return wait, count_header
+
+
+class FixtureStore:
+    """
+    Recorded responses keyed by routing value, path and query, plus an index of the
+    recorded match payloads per PUUID for answering unrecorded match ID queries.
+    """
+
+    def __init__(self, directory):
+        self.directory = directory
+        self._responses = {}
+        self._matches_by_puuid = {}  # (routing, puuid) -> [(start timestamp, queue ID, match ID)]
+        self._players = []
+        self._sorted = True
+        self._lock = threading.Lock()
+        os.makedirs(directory, exist_ok=True)
+        for filename in sorted(os.listdir(directory)):
+            if filename.endswith(".json"):
+                with open(os.path.join(directory, filename), "r", encoding="utf-8") as f:
+                    self._index(json.load(f))
+
+    def __len__(self):
+        return len(self._responses)
+
+    def _index(self, fixture):
+        self._responses[fixture["key"]] = fixture
+        if fixture["status"] != 200:
+            return
+
+        routing = fixture["key"].split("/", 2)[1]
+        endpoint, args = classify_path(fixture["path"])
+        if endpoint == "match-v5.match":
+            info = fixture["body"].get("info", {})
+            entry = (info.get("gameStartTimestamp", 0), info.get("queueId"), args[0])
+            for participant in info.get("participants", []):
+                self._matches_by_puuid.setdefault((routing, participant.get("puuid")), []).append(entry)
+            self._sorted = False
+        elif endpoint == "account-v1.by-riot-id":
+            self._players.append({"game_name": args[0], "tag_line": args[1], "routing": routing})
+
+    def get(self, key):
+        return self._responses.get(key)
+
+    def save(self, key, path, status, body):
+        """
+        Record a response and write it to the fixture directory.
+        """
+        fixture = {"key": key, "path": path, "status": status, "body": body}
+        with self._lock:
+            with open(os.path.join(self.directory, fixture_filename(key)), "w", encoding="utf-8") as f:
+                json.dump(fixture, f)
+            self._index(fixture)
+
+    def match_ids(self, routing, puuid, query):
+        """
+        Answer a match ID list query from the recorded match payloads, newest first.
+        """
+        params = dict(query)
+        start_time = int(params["startTime"]) * 1000 if "startTime" in params else None
+        end_time = int(params["endTime"]) * 1000 if "endTime" in params else None
+        queue = int(params["queue"]) if "queue" in params else None
+        match_type = params.get("type")
+        start = int(params.get("start", 0))
+        count = min(int(params.get("count", DEFAULT_MATCH_ID_COUNT)), MAX_MATCH_ID_COUNT)
+
+        with self._lock:
+            if not self._sorted:
+                for entries in self._matches_by_puuid.values():
+                    entries.sort(reverse=True)
+                self._sorted = True
+
+        match_ids = [
+            match_id
+            for timestamp, queue_id, match_id in self._matches_by_puuid.get((routing, puuid), [])
+            if (start_time is None or timestamp >= start_time)
+            and (end_time is None or timestamp <= end_time)
+            and (queue is None or queue_id == queue)
+            and (match_type != "ranked" or queue_id in RANKED_QUEUES)
+        ]
+        return match_ids[start:start + count]
+
+    def players(self):
+        return list(self._players)
+
+
+class FixtureServer(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def __init__(self, address, store, latency_ms=0, jitter_ms=0, app_rate_limit="", method_rate_limit="",
+                 error_rate=0.0, record=False):
+        super().__init__(address, FixtureHandler)
+        self.store = store
+        self.latency_ms = latency_ms
+        self.jitter_ms = jitter_ms
+        self.error_rate = error_rate
+        self.record = record
+        self.app_limits = RateLimitWindows(app_rate_limit)
+        self.method_limits = RateLimitWindows(method_rate_limit)
+        self.stats_lock = threading.Lock()
+        self.reset_stats()
+
+    def reset_stats(self):
+        with self.stats_lock:
+            self.calls = Counter()
+            self.statuses = Counter()
+            self.missing = Counter()
+
+    def stats(self):
+        with self.stats_lock:
+            return {
+                "requests": sum(self.calls.values()),
+                "by_endpoint": dict(self.calls),
+                "by_status": {str(status): count for status, count in self.statuses.items()},
+                "missing_fixtures": dict(self.missing),
+            }
+
+    def check_rate_limits(self, routing, endpoint):
+        """
+        Count a call against the app and method limits.
+
+        :return: Tuple of (rate limit response headers, seconds to retry after or 0,
+            type of the exceeded limit).
+        """
+        with self.stats_lock:
+            now = time.monotonic()
+            app_wait, app_count = self.app_limits.try_record(routing, now)
+            method_wait, method_count = (0, "") if app_wait else self.method_limits.try_record((routing, endpoint), now)
+
+        headers = {}
+        if self.app_limits.limits:
+            headers["X-App-Rate-Limit"] = self.app_limits.header
+            headers["X-App-Rate-Limit-Count"] = app_count
+        if self.method_limits.limits:
+            headers["X-Method-Rate-Limit"] = self.method_limits.header
+            if method_count:
+                headers["X-Method-Rate-Limit-Count"] = method_count
+        if app_wait:
+            return headers, app_wait, "application"
+        return headers, method_wait, "method"
+
+
+class FixtureHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+
+    def log_message(self, format, *args):
+        pass
+
+    def send_json(self, status, body, headers=None):
+        data = json.dumps(body).encode()
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json;charset=utf-8")
+        self.send_header("Content-Length", str(len(data)))
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.end_headers()
+        self.wfile.write(data)
+
+    def do_GET(self):
+        url = urlsplit(self.path)
+        query = parse_qsl(url.query)
+        if url.path == "/__stats":
+            stats = self.server.stats()
+            if dict(query).get("reset") == "1":
+                self.server.reset_stats()
+            return self.send_json(200, stats)
+        if url.path == "/__players":
+            return self.send_json(200, self.server.store.players())
+
+        _, routing, path = url.path.split("/", 2) if url.path.count("/") >= 2 else ("", "", url.path)
+        path = "/" + path
+        endpoint, args = classify_path(path)
+        server = self.server
+        with server.stats_lock:
+            server.calls[endpoint or "unknown"] += 1
+
+        if server.latency_ms or server.jitter_ms:
+            delay = server.latency_ms + random.uniform(-server.jitter_ms, server.jitter_ms)
+            time.sleep(max(delay, 0) / 1000)
+
+        headers, retry_after, limit_type = server.check_rate_limits(routing, endpoint)
+        if retry_after:
+            headers.update({"Retry-After": str(max(int(retry_after + 0.999), 1)), "X-Rate-Limit-Type": limit_type})
+            return self.respond(429, {"status": {"message": "Rate limit exceeded", "status_code": 429}}, headers)
+
+        if server.error_rate and random.random() < server.error_rate:
+            status = random.choice((500, 503))
+            return self.respond(status, {"status": {"message": "Simulated error", "status_code": status}}, headers)
+
+        key = fixture_key(routing, path, query)
+        fixture = server.store.get(key)
+        if fixture is None and server.record:
+            fixture = self.record(key, routing, path, query)
+        if fixture is not None:
+            return self.respond(fixture["status"], fixture["body"], headers)
+        if endpoint == "match-v5.ids":
+            return self.respond(200, server.store.match_ids(routing, args[0], query), headers)
+
+        with server.stats_lock:
+            server.missing[endpoint or "unknown"] += 1
+        self.respond(404, {"status": {"message": "Data not found - no fixture recorded", "status_code": 404}}, headers)
+
+    def respond(self, status, body, headers):
+        with self.server.stats_lock:
+            self.server.statuses[status] += 1
+        self.send_json(status, body, headers)
+
+    def record(self, key, routing, path, query):
+        """
+        Fetch a response from the Riot API and save it as a fixture. Rate limited and
+        failed responses are passed through without being recorded.
+        """
+        api_key = self.headers.get("X-Riot-Token") or os.getenv("RIOT_API_KEY")
+        try:
+            response = requests.get(
+                f"{RIOT_API_UPSTREAM_URL.format(region=routing)}{path}",
+                params=query, headers={"X-Riot-Token": api_key}, timeout=10,
+            )
+        except requests.exceptions.RequestException as e:
+            print(f"Failed to record {key}: {e}")
+            return None
+
+        if response.status_code not in (200, 404):
+            print(f"Not recording {key}: status {response.status_code}")
+            return {"status": response.status_code, "body": response.json() if response.content else {}}
+
+        self.server.store.save(key, path, response.status_code, response.json())
+        return self.server.store.get(key)
+
+
+def generate_fixtures(store, players, matches_per_player=60, platform="na1", routing="americas", seed=1):
+    """
+    Write synthetic fixtures: accounts, summoners, ranks and shared match payloads for a
+    pool of players. Every match has ten players from the pool, so lobbies overlap the
+    way they do for real players.
+    """
+    rng = random.Random(seed)
+    champions = ["Ahri", "Jinx", "Lux", "Garen", "Thresh", "LeeSin", "Yasuo", "Ezreal", "Leona", "Darius",
+                 "Orianna", "KaiSa", "Nautilus", "Viego", "Sett"]
+    tiers = ["IRON", "BRONZE", "SILVER", "GOLD", "PLATINUM", "EMERALD", "DIAMOND"]
+    queues = [420] * 8 + [440, 450]  # Mostly solo queue, some flex and ARAM
+    now = int(time.time() * 1000)
+
+    pool = []
+    for i in range(players):
+        puuid = f"bench-puuid-{i:05d}"
+        summoner_id = f"bench-summoner-{i:05d}"
+        game_name, tag_line = f"Bench{i}", "BENCH"
+        pool.append((puuid, summoner_id, game_name, tag_line))
+        store.save(
+            fixture_key(routing, f"/riot/account/v1/accounts/by-riot-id/{game_name}/{tag_line}", []),
+            f"/riot/account/v1/accounts/by-riot-id/{game_name}/{tag_line}", 200,
+            {"puuid": puuid, "gameName": game_name, "tagLine": tag_line},
+        )
+        store.save(
+            fixture_key(platform, f"/lol/summoner/v4/summoners/by-puuid/{puuid}", []),
+            f"/lol/summoner/v4/summoners/by-puuid/{puuid}", 200,
+            {"id": summoner_id, "puuid": puuid, "profileIconId": rng.randint(1, 28),
+             "summonerLevel": rng.randint(30, 500), "revisionDate": now},
+        )
+        wins, losses = rng.randint(10, 200), rng.randint(10, 200)
+        store.save(
+            fixture_key(platform, f"/lol/league/v4/entries/by-summoner/{summoner_id}", []),
+            f"/lol/league/v4/entries/by-summoner/{summoner_id}", 200,
+            [{"queueType": "RANKED_SOLO_5x5", "tier": rng.choice(tiers), "rank": rng.choice(["I", "II", "III", "IV"]),
+              "leaguePoints": rng.randint(0, 99), "wins": wins, "losses": losses, "summonerId": summoner_id}],
+        )
+
+    match_count = max(players * matches_per_player // 10, 1)
+    for n in range(match_count):
+        match_id = f"{platform.upper()}_{9000000000 + n}"
+        queue_id = rng.choice(queues)
+        duration = rng.randint(1200, 2400)
+        start = now - (match_count - n) * 3600 * 1000 // max(players // 10, 1)
+        lobby = rng.sample(pool, min(10, len(pool)))
+        participants = []
+        for slot, (puuid, summoner_id, game_name, tag_line) in enumerate(lobby):
+            participants.append({
+                "puuid": puuid,
+                "summonerId": summoner_id,
+                "riotIdGameName": game_name,
+                "riotIdTagline": tag_line,
+                "teamId": 100 if slot < 5 else 200,
+                "championName": rng.choice(champions),
+                "kills": rng.randint(0, 15),
+                "deaths": rng.randint(0, 12),
+                "assists": rng.randint(0, 20),
+                "totalMinionsKilled": rng.randint(20, 260),
+                "neutralMinionsKilled": rng.randint(0, 60),
+                "win": slot < 5 if n % 2 else slot >= 5,
+            })
+        store.save(
+            fixture_key(routing, f"/lol/match/v5/matches/{match_id}", []),
+            f"/lol/match/v5/matches/{match_id}", 200,
+            {
+                "metadata": {"matchId": match_id, "participants": [p["puuid"] for p in participants]},
+                "info": {
+                    "gameMode": "ARAM" if queue_id == 450 else "CLASSIC",
+                    "queueId": queue_id,
+                    "gameDuration": duration,
+                    "gameStartTimestamp": start,
+                    "gameEndTimestamp": start + duration * 1000,
+                    "participants": participants,
+                },
+            },
+        )
+    return match_count
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Serve recorded Riot API responses for benchmarks and offline runs.")
+    parser.add_argument("--fixtures", default=DEFAULT_FIXTURES_DIR, help="Directory of recorded responses.")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--latency-ms", type=float, default=0, help="Added delay per request.")
+    parser.add_argument("--jitter-ms", type=float, default=0, help="Random spread around the added delay.")
+    parser.add_argument("--app-rate-limit", default="", help="Enforced app rate limit per routing value, e.g. 20:1,100:120.")
+    parser.add_argument("--method-rate-limit", default="", help="Enforced limit per routing value and endpoint, e.g. 2000:10.")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="Share of requests answered with a 5xx error.")
+    parser.add_argument("--record", action="store_true", help="Forward unrecorded requests to the Riot API and save them.")
+    parser.add_argument("--generate", type=int, metavar="PLAYERS", help="Write synthetic fixtures for this many players and exit.")
+    parser.add_argument("--matches-per-player", type=int, default=60, help="Matches per player for --generate.")
+    args = parser.parse_args()
+
+    store = FixtureStore(args.fixtures)
+    if args.generate:
+        match_count = generate_fixtures(store, args.generate, args.matches_per_player)
+        print(f"Wrote fixtures for {args.generate} players and {match_count} matches to {args.fixtures}.")
+        return
+
+    server = FixtureServer(
+        (args.host, args.port), store,
+        latency_ms=args.latency_ms,
+        jitter_ms=args.jitter_ms,
+        app_rate_limit=args.app_rate_limit,
+        method_rate_limit=args.method_rate_limit,
+        error_rate=args.error_rate,
+        record=args.record,
+    )
+    print(f"Serving {len(store)} fixtures on http://{args.host}:{args.port}/{{region}}")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,218 @@
+"""
+End-to-end load test of the web app against the fixture server.
+
+Drives /search, /load_more, /refresh_matches and /ranked_graph at each concurrency
+level and reports p50/p95/p99 latency, throughput, errors and the Riot API calls the
+app made (read from the fixture server's /__stats), so performance changes show up
+as numbers. Refresh latency covers the whole background job: the request plus
+waiting on /jobs/<job_id>.
+
+Start the fixture server, then the app pointed at it, then the load test:
+
+    python bench/fixture_server.py --generate 50
+    python bench/fixture_server.py --latency-ms 80 --app-rate-limit 20:1,100:120
+    RIOT_API_BASE_URL=http://127.0.0.1:8765/{region} python main.py
+    python bench/load_test.py [--app http://127.0.0.1:5000] [--concurrency 1,8,32] [--requests 200]
+                              [--scenarios search,load_more,refresh_matches,ranked_graph] [--json results.json]
+
+The first search of a player ingests them, so run the suite twice (or pass
+--warmup) to separate cold from warm numbers.
+"""
+import argparse
+import json
+import random
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import requests
+
+SCENARIOS = ("search", "load_more", "refresh_matches", "ranked_graph")
+
+# Seconds the refresh scenario long-polls a job per /jobs request
+JOB_POLL_WAIT = 25
+
+_sessions = threading.local()
+
+
+def get_session():
+    """
+    Keep-alive session for the calling worker thread.
+    """
+    if not hasattr(_sessions, "session"):
+        _sessions.session = requests.Session()
+    return _sessions.session
+
+
+def percentile(sorted_values, fraction):
+    """
+    Nearest-rank percentile of an already sorted list.
+    """
+    if not sorted_values:
+        return None
+    index = min(max(int(round(fraction * len(sorted_values) + 0.5)) - 1, 0), len(sorted_values) - 1)
+    return sorted_values[index]
+
+
+class LoadTest:
+    def __init__(self, app_url, fixture_url, players, region):
+        self.app_url = app_url.rstrip("/")
+        self.fixture_url = fixture_url.rstrip("/")
+        self.players = players
+        self.region = region
+        self._cursors = {}  # Riot ID -> cursor of the next /load_more page
+        self._lock = threading.Lock()
+
+    def upstream_stats(self, reset=False):
+        response = requests.get(f"{self.fixture_url}/__stats", params={"reset": "1"} if reset else None, timeout=10)
+        response.raise_for_status()
+        return response.json()
+
+    def search(self, player):
+        response = get_session().post(f"{self.app_url}/search", data={
+            "game_name": player["game_name"],
+            "tag_line": player["tag_line"],
+            "region": self.region,
+        }, timeout=60)
+        return response.status_code == 200
+
+    def load_more(self, player):
+        """
+        Page through a player's matches, starting over after the last page.
+        """
+        riot_id = f"{player['game_name']}#{player['tag_line']}"
+        with self._lock:
+            cursor = self._cursors.get(riot_id)
+        response = get_session().post(f"{self.app_url}/load_more", json={
+            "user_id": riot_id,
+            "cursor": cursor,
+            "region": self.region,
+        }, timeout=60)
+        if response.status_code != 200:
+            return False
+        with self._lock:
+            self._cursors[riot_id] = response.json().get("next_cursor")
+        return True
+
+    def refresh_matches(self, player):
+        session = get_session()
+        response = session.post(f"{self.app_url}/refresh_matches", json={
+            "user_id": f"{player['game_name']}#{player['tag_line']}",
+            "region": self.region,
+        }, timeout=60)
+        if response.status_code != 202:
+            return False
+
+        job_id = response.json()["job_id"]
+        while True:
+            job = session.get(f"{self.app_url}/jobs/{job_id}", params={"wait": JOB_POLL_WAIT}, timeout=JOB_POLL_WAIT + 30)
+            if job.status_code != 200:
+                return False
+            status = job.json()["status"]
+            if status in ("done", "failed"):
+                return status == "done"
+
+    def ranked_graph(self, player):
+        response = get_session().get(f"{self.app_url}/ranked_graph", params={
+            "timeframe": random.choice(("day", "week")),
+            "user_id": f"{player['game_name']}#{player['tag_line']}",
+        }, timeout=60)
+        return response.status_code == 200
+
+    def timed(self, scenario, player):
+        start = time.perf_counter()
+        try:
+            ok = getattr(self, scenario)(player)
+        except requests.exceptions.RequestException as e:
+            print(f"{scenario} request failed: {e}")
+            ok = False
+        return time.perf_counter() - start, ok
+
+    def run(self, scenario, concurrency, total_requests):
+        """
+        Send `total_requests` requests of one scenario with `concurrency` in flight.
+
+        :return: Result dictionary with latency percentiles (ms), throughput and upstream calls.
+        """
+        self.upstream_stats(reset=True)
+        players = [self.players[i % len(self.players)] for i in range(total_requests)]
+        random.shuffle(players)
+
+        start = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=concurrency) as executor:
+            results = list(executor.map(lambda player: self.timed(scenario, player), players))
+        elapsed = time.perf_counter() - start
+        upstream = self.upstream_stats()
+
+        latencies = sorted(latency * 1000 for latency, _ in results)
+        return {
+            "scenario": scenario,
+            "concurrency": concurrency,
+            "requests": total_requests,
+            "errors": sum(1 for _, ok in results if not ok),
+            "throughput": total_requests / elapsed if elapsed else 0,
+            "p50_ms": percentile(latencies, 0.50),
+            "p95_ms": percentile(latencies, 0.95),
+            "p99_ms": percentile(latencies, 0.99),
+            "upstream_calls": upstream["requests"],
+            "upstream_by_endpoint": upstream["by_endpoint"],
+            "upstream_by_status": upstream["by_status"],
+        }
+
+
+def print_results(results):
+    print(f"{'scenario':<16}{'conc':>5}{'reqs':>6}{'errors':>7}{'req/s':>9}{'p50 ms':>9}{'p95 ms':>9}{'p99 ms':>9}"
+          f"{'upstream':>10}{'per req':>9}")
+    for result in results:
+        print(
+            f"{result['scenario']:<16}{result['concurrency']:>5}{result['requests']:>6}{result['errors']:>7}"
+            f"{result['throughput']:>9.1f}{result['p50_ms']:>9.1f}{result['p95_ms']:>9.1f}{result['p99_ms']:>9.1f}"
+            f"{result['upstream_calls']:>10}{result['upstream_calls'] / result['requests']:>9.2f}"
+        )
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Load test the web app against the Riot API fixture server.")
+    parser.add_argument("--app", default="http://127.0.0.1:5000", help="Base URL of the running app.")
+    parser.add_argument("--fixture-server", default="http://127.0.0.1:8765", help="Base URL of bench/fixture_server.py.")
+    parser.add_argument("--region", default="na1", help="Platform region sent with every request.")
+    parser.add_argument("--concurrency", default="1,8,32", help="Comma-separated concurrency levels.")
+    parser.add_argument("--requests", type=int, default=200, help="Requests per scenario and concurrency level.")
+    parser.add_argument("--scenarios", default=",".join(SCENARIOS), help="Comma-separated scenarios to run.")
+    parser.add_argument("--players", type=int, default=None, help="Use only the first N fixture players.")
+    parser.add_argument("--warmup", action="store_true", help="Search every player once before measuring.")
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--json", help="Also write the results to this file.")
+    args = parser.parse_args()
+
+    random.seed(args.seed)
+    scenarios = [scenario.strip() for scenario in args.scenarios.split(",") if scenario.strip()]
+    unknown = set(scenarios) - set(SCENARIOS)
+    if unknown:
+        parser.error(f"Unknown scenarios: {', '.join(sorted(unknown))}")
+
+    players = requests.get(f"{args.fixture_server.rstrip('/')}/__players", timeout=10).json()[:args.players]
+    if not players:
+        parser.error("The fixture server has no account fixtures; record some or run it with --generate.")
+    load_test = LoadTest(args.app, args.fixture_server, players, args.region)
+
+    if args.warmup:
+        print(f"Warming up {len(players)} players...")
+        load_test.run("search", 8, len(players))
+
+    results = []
+    for concurrency in [int(level) for level in args.concurrency.split(",")]:
+        for scenario in scenarios:
+            result = load_test.run(scenario, concurrency, args.requests)
+            results.append(result)
+            print(f"{scenario} x{concurrency}: p50 {result['p50_ms']:.1f} ms, {result['throughput']:.1f} req/s")
+
+    print()
+    print_results(results)
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump(results, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,191 @@
+"""
+Scheduled bulk refresh of tracked players.
+
+Walks every `users/*` record, orders the players by how stale their profile is and
+how recently they played, and syncs only their new matches. Players are grouped by
+routing region and every region is refreshed in parallel, so each region's rate limit
+budget is used at the same time. Run it from a scheduler (e.g. cron every 15 minutes)
+to keep profiles fresh without waiting for someone to press refresh.
+
+Usage:
+    python bulk_refresh.py [--dry-run] [--limit 500] [--min-age 30] [--workers-per-region 2] [--skip-lp]
+"""
+import argparse
+import math
+import os
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timezone
+from rate_limiter import DEFAULT_APP_RATE_LIMIT, parse_rate_limit_header
+from page_cache import new_page_version
+from storage import storage
+from riot_client import (
+    CURRENT_SEASON,
+    PLATFORM_TO_GLOBAL,
+    season_start_timestamp,
+    get_global_region,
+    get_ranked_stats_by_summoner_id,
+    sync_user_matches,
+)
+
+# Upper bound on the new matches projected for one player
+MAX_PROJECTED_MATCHES = 100
+
+MS_PER_HOUR = 3600 * 1000
+MS_PER_DAY = 24 * MS_PER_HOUR
+
+
+def region_from_matches(user_id):
+    """
+    Derive the platform of a profile saved before the region was stored from the prefix
+    of a stored match ID (e.g. "EUW1_..." -> "euw1").
+
+    :return: The platform, or None if it cannot be determined.
+    """
+    matches = storage.get_user_matches(user_id, limit=1)
+    match_id = matches[0].get("match_id", "") if matches else ""
+    platform = match_id.split("_", 1)[0].lower()
+    return platform if "_" in match_id and platform in PLATFORM_TO_GLOBAL else None
+
+
+def load_tracked_user(user_id):
+    """
+    Read the few profile fields the refresher needs, without loading the whole profile.
+    """
+    last_updated = storage.get_profile_field(user_id, "last_updated")
+    return {
+        "user_id": user_id,
+        "region": storage.get_profile_field(user_id, "region") or region_from_matches(user_id),
+        "last_updated": int(datetime.fromisoformat(last_updated).timestamp() * 1000) if last_updated else None,
+        "latest_timestamp": storage.get_profile_field(user_id, "sync_state/latest_timestamp"),
+        "summoner_id": storage.get_profile_field(user_id, "summoner_info/id"),
+        "season_matches": storage.get_profile_field(user_id, f"aggregates/{CURRENT_SEASON}/matches") or 0,
+    }
+
+
+def refresh_priority(user, now):
+    """
+    Rank a player for refreshing: hours since the profile was updated, discounted by
+    the days since their latest stored match, so stale and active players come first.
+    """
+    stale_hours = (now - (user["last_updated"] or season_start_timestamp)) / MS_PER_HOUR
+    idle_days = (now - (user["latest_timestamp"] or season_start_timestamp)) / MS_PER_DAY
+    return max(stale_hours, 0) / (1 + max(idle_days, 0))
+
+
+def projected_new_matches(user, now):
+    """
+    Estimate the player's new matches from their season match rate and profile staleness.
+    """
+    season_days = max((now - season_start_timestamp) / MS_PER_DAY, 1)
+    stale_days = max((now - (user["last_updated"] or season_start_timestamp)) / MS_PER_DAY, 0)
+    return min(math.ceil(user["season_matches"] / season_days * stale_days), MAX_PROJECTED_MATCHES)
+
+
+def projected_calls(user, now, snapshot_lp=True):
+    """
+    Estimate the Riot API calls one refresh will make: match ID pages, match details,
+    and the ranked lookup.
+    """
+    new_matches = projected_new_matches(user, now)
+    return 1 + new_matches // 20 + new_matches + (1 if snapshot_lp and user["summoner_id"] else 0)
+
+
+def refresh_user(user, snapshot_lp=True):
+    """
+    Refresh one player: snapshot their rank, then sync their new matches.
+
+    :return: Number of new matches stored.
+    """
+    if snapshot_lp and user["summoner_id"]:
+        ranked_stats = get_ranked_stats_by_summoner_id(user["summoner_id"], user["region"], use_cache=False)
+        solo_stats = next(
+            (stats for stats in ranked_stats or [] if stats.get("queueType") == "RANKED_SOLO_5x5"), None
+        )
+        if solo_stats:
+            storage.update_profile(user["user_id"], {"ranked_stats": solo_stats, "page_version": new_page_version()})
+
+    # The sync writes last_updated afterwards
+    sync_result = sync_user_matches(user["user_id"], user["region"])
+    return len(sync_result[0]) if sync_result else 0
+
+
+def refresh_region(routing, users, workers, snapshot_lp=True):
+    """
+    Refresh the players of one routing region, highest priority first.
+
+    :return: Tuple of (players refreshed, new matches stored).
+    """
+    refreshed = 0
+    new_matches = 0
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        futures = [(user, executor.submit(refresh_user, user, snapshot_lp)) for user in users]
+        for user, future in futures:
+            try:
+                new_matches += future.result()
+                refreshed += 1
+            except Exception as e:
+                print(f"Failed to refresh user {user['user_id']}: {e}")
+
+    print(f"[{routing}] Refreshed {refreshed} of {len(users)} players, {new_matches} new matches.")
+    return refreshed, new_matches
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Refresh tracked players' matches, most stale and active first.")
+    parser.add_argument("--dry-run", action="store_true", help="Report the projected API call budget without refreshing.")
+    parser.add_argument("--limit", type=int, default=None, help="Refresh at most this many players.")
+    parser.add_argument("--min-age", type=float, default=30, help="Skip profiles updated within this many minutes.")
+    parser.add_argument("--workers-per-region", type=int, default=2, help="Players refreshed at once per region.")
+    parser.add_argument("--skip-lp", action="store_true", help="Do not snapshot ranks into the LP history.")
+    args = parser.parse_args()
+    snapshot_lp = not args.skip_lp
+
+    now = int(datetime.now(timezone.utc).timestamp() * 1000)
+    user_ids = storage.list_user_ids()
+    with ThreadPoolExecutor(max_workers=16) as executor:
+        users = list(executor.map(load_tracked_user, user_ids))
+
+    # Refreshing with the wrong region would store it on the profile, so skip unknown ones
+    unknown_region = [user["user_id"] for user in users if not user["region"]]
+    if unknown_region:
+        print(f"Skipping {len(unknown_region)} players whose region is unknown: {', '.join(unknown_region[:10])}")
+    users = [user for user in users if user["region"]]
+
+    min_age_ms = args.min_age * 60 * 1000
+    users = [user for user in users if not user["last_updated"] or now - user["last_updated"] >= min_age_ms]
+    users.sort(key=lambda user: refresh_priority(user, now), reverse=True)
+    users = users[:args.limit]
+
+    # Group by routing region; each region has its own rate limit budget
+    groups = {}
+    for user in users:
+        groups.setdefault(get_global_region(user["region"]), []).append(user)
+
+    if args.dry_run:
+        app_limits = parse_rate_limit_header(os.getenv("RIOT_APP_RATE_LIMIT", DEFAULT_APP_RATE_LIMIT))
+        calls_per_second = min(limit / window for limit, window in app_limits)
+        total_calls = 0
+        for routing, region_users in sorted(groups.items()):
+            calls = sum(projected_calls(user, now, snapshot_lp) for user in region_users)
+            total_calls += calls
+            print(
+                f"[{routing}] {len(region_users)} players, ~{calls} API calls, "
+                f"~{math.ceil(calls / calls_per_second)}s at {calls_per_second:.2f} calls/s."
+            )
+        print(f"Would refresh {len(users)} of {len(user_ids)} players with ~{total_calls} API calls.")
+        return
+
+    with ThreadPoolExecutor(max_workers=max(len(groups), 1)) as executor:
+        results = list(executor.map(
+            lambda item: refresh_region(item[0], item[1], args.workers_per_region, snapshot_lp),
+            groups.items(),
+        ))
+
+    print(
+        f"Refreshed {sum(refreshed for refreshed, _ in results)} of {len(user_ids)} players, "
+        f"{sum(new_matches for _, new_matches in results)} new matches."
+    )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,96 @@
+import threading
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+# Transient upstream errors that riot_get retries with backoff (429s are handled by the rate limiter)
+RETRY_STATUS_CODES = (500, 502, 503, 504)
+
+# Seconds before the first retry of a transient error, doubled on every attempt
+RETRY_BACKOFF_FACTOR = 0.5
+
+
+class SessionPool:
+    """
+    Keeps one keep-alive `requests.Session` per routing host, so repeated Riot calls
+    reuse their TCP/TLS connections instead of handshaking on every request.
+
+    Each session's connection pool is sized to the number of concurrent workers and
+    retries failed connection attempts with exponential backoff. Requests that reached
+    Riot (5xx responses, read errors) are not retried here: every retry spends rate
+    limit budget, so riot_get retries them through the rate limiter instead.
+    """
+
+    def __init__(self, pool_size=10, max_retries=3, backoff_factor=RETRY_BACKOFF_FACTOR):
+        self.pool_size = pool_size
+        self.max_retries = max_retries
+        self.backoff_factor = backoff_factor
+        self._sessions = {}
+        self._lock = threading.Lock()
+
+    def _create_session(self):
+        retry = Retry(
+            total=self.max_retries,
+            connect=self.max_retries,
+            read=0,
+            status=0,
+            backoff_factor=self.backoff_factor,
+            allowed_methods=frozenset(["GET"]),
+            respect_retry_after_header=False,  # 429s wait in the rate limiter
+            raise_on_status=False,  # Hand the final response back so callers can raise_for_status()
+        )
+        adapter = HTTPAdapter(
+            pool_connections=1,
+            pool_maxsize=self.pool_size,
+            pool_block=True,  # Wait for a free connection rather than opening throwaway ones
+            max_retries=retry,
+        )
+        session = requests.Session()
+        session.mount("https://", adapter)
+        session.mount("http://", adapter)
+        return session
+
+    def get_session(self, host):
+        """
+        Return the shared session for a routing host, creating it on first use.
+        """
+        with self._lock:
+            session = self._sessions.get(host)
+            if session is None:
+                session = self._create_session()
+                self._sessions[host] = session
+            return session
+
+    def stats(self):
+        """
+        Report connection reuse per routing host.
+
+        :return: Dictionary of host -> {"requests", "connections_opened", "connections_reused"}.
+        """
+        with self._lock:
+            sessions = dict(self._sessions)
+
+        stats = {}
+        for host, session in sessions.items():
+            requests_sent = 0
+            connections_opened = 0
+            adapter = session.get_adapter("https://")
+            for key in adapter.poolmanager.pools.keys():
+                pool = adapter.poolmanager.pools.get(key)
+                if pool is None:
+                    continue
+                requests_sent += pool.num_requests
+                connections_opened += pool.num_connections
+
+            stats[host] = {
+                "requests": requests_sent,
+                "connections_opened": connections_opened,
+                "connections_reused": requests_sent - connections_opened,
+            }
+        return stats
+
+    def close(self):
+        with self._lock:
+            for session in self._sessions.values():
+                session.close()
+            self._sessions.clear()
@@ -0,0 +1,91 @@
+import os
+from cache_utils import LRUCache
+
+# Number of entries kept for each entity type
+IDENTITY_CACHE_SIZE = int(os.getenv("IDENTITY_CACHE_SIZE", "10000"))
+
+# Seconds each lookup is cached: Riot ID -> PUUID almost never changes, summoner data
+# changes with level and icon, and league entries change after every ranked game
+ACCOUNT_CACHE_TTL = float(os.getenv("ACCOUNT_CACHE_TTL", "86400"))
+SUMMONER_CACHE_TTL = float(os.getenv("SUMMONER_CACHE_TTL", "3600"))
+LEAGUE_CACHE_TTL = float(os.getenv("LEAGUE_CACHE_TTL", "600"))
+
+# Seconds a summoner's solo queue MMR is reused for lobby averages, which barely move
+# when one player's LP is a little out of date
+LOBBY_RANK_CACHE_TTL = float(os.getenv("LOBBY_RANK_CACHE_TTL", "86400"))
+
+# Seconds a Riot ID that does not exist is remembered, so repeated typos cost no lookups
+MISSING_ACCOUNT_TTL = float(os.getenv("MISSING_ACCOUNT_TTL", "300"))
+
+# Cached in place of the account of a Riot ID that does not exist
+MISSING = object()
+
+
+class IdentityCache:
+    """
+    Layered cache of the Riot ID -> account -> summoner -> league lookups, with a
+    separate TTL per layer. League entries are dropped when a summoner is seen in a
+    new match, since their LP has changed; the long-lived rank layer keeps each
+    summoner's solo queue MMR for lobby averages.
+    """
+
+    def __init__(self, capacity=IDENTITY_CACHE_SIZE, account_ttl=ACCOUNT_CACHE_TTL,
+                 summoner_ttl=SUMMONER_CACHE_TTL, league_ttl=LEAGUE_CACHE_TTL, rank_ttl=LOBBY_RANK_CACHE_TTL,
+                 missing_ttl=MISSING_ACCOUNT_TTL):
+        self.missing_ttl = missing_ttl
+        self.accounts = LRUCache(capacity, account_ttl)  # (game name, tag line) -> account or MISSING
+        self.summoners = LRUCache(capacity, summoner_ttl)  # (puuid, platform) -> summoner
+        self.leagues = LRUCache(capacity, league_ttl)  # summoner ID -> league entries
+        self.ranks = LRUCache(capacity * 10, rank_ttl)  # summoner ID -> solo queue MMR (0 when unranked)
+
+    @staticmethod
+    def _account_key(game_name, tag_line):
+        # Riot IDs are case-insensitive and the same on every routing value
+        return game_name.strip().lower(), tag_line.strip().lower()
+
+    def get_account(self, game_name, tag_line):
+        """
+        :return: The cached account, MISSING for a Riot ID known not to exist, or None.
+        """
+        return self.accounts.get(self._account_key(game_name, tag_line))
+
+    def put_account(self, game_name, tag_line, account):
+        self.accounts.put(self._account_key(game_name, tag_line), account)
+
+    def put_missing_account(self, game_name, tag_line):
+        self.accounts.put(self._account_key(game_name, tag_line), MISSING, ttl=self.missing_ttl)
+
+    def get_summoner(self, puuid, region):
+        return self.summoners.get((puuid, region))
+
+    def put_summoner(self, puuid, region, summoner):
+        self.summoners.put((puuid, region), summoner)
+
+    def get_league(self, summoner_id):
+        return self.leagues.get(summoner_id)
+
+    def put_league(self, summoner_id, ranked_stats):
+        self.leagues.put(summoner_id, ranked_stats)
+
+    def invalidate_league(self, summoner_id):
+        self.leagues.pop(summoner_id)
+
+    def get_rank_mmr(self, summoner_id):
+        return self.ranks.get(summoner_id)
+
+    def put_rank_mmr(self, summoner_id, mmr):
+        self.ranks.put(summoner_id, mmr)
+
+    def stats(self):
+        """
+        Hit and miss counts per layer.
+        """
+        return {
+            name: {"size": len(cache), "hits": cache.hits, "misses": cache.misses}
+            for name, cache in (
+                ("accounts", self.accounts), ("summoners", self.summoners), ("leagues", self.leagues), ("ranks", self.ranks)
+            )
+        }
+
+
+identity_cache = IdentityCache()
@@ -0,0 +1,412 @@
+import json
+import sqlite3
+import threading
+import time
+import uuid
+
+# Statuses of jobs that still have work to do; a new job with the same key joins these
+ACTIVE_STATUSES = ("queued", "running")
+
+# Seconds a finished job's result is kept for status lookups
+DEFAULT_RESULT_TTL = 600
+
+# Seconds a claimed job is leased to its worker; the worker renews the lease while the
+# job runs, so a job whose lease expires belonged to a worker that crashed or was killed
+DEFAULT_LEASE_SECONDS = 60
+
+# Times a job is claimed before a lost job is failed instead of queued again
+MAX_JOB_ATTEMPTS = 3
+
+# The job being run on each worker thread, for report_progress
+_current = threading.local()
+
+
+def report_progress(item):
+    """
+    Record a progress item (e.g. a partial result) for the job running on this thread,
+    readable with JobQueue.progress while the job runs. Does nothing outside a job.
+    """
+    job_id = getattr(_current, "job_id", None)
+    if job_id is None:
+        return
+    try:
+        _current.backend.add_progress(job_id, item)
+    except Exception as e:
+        print(f"Failed to report progress of job {job_id}: {e}")
+
+
+class MemoryBackend:
+    """
+    In-process job storage. Jobs are lost on restart and only visible to this process.
+    """
+
+    def __init__(self, result_ttl=DEFAULT_RESULT_TTL):
+        self.result_ttl = result_ttl
+        self._jobs = {}
+        self._queue = []
+        self._lock = threading.Lock()
+
+    def enqueue(self, kind, key, payload):
+        with self._lock:
+            self._prune()
+            for job in self._jobs.values():
+                if job["key"] == key and job["status"] in ACTIVE_STATUSES:
+                    return job["id"]
+
+            now = time.time()
+            job = {
+                "id": uuid.uuid4().hex, "kind": kind, "key": key, "payload": payload,
+                "status": "queued", "result": None, "error": None, "progress": [],
+                "created_at": now, "updated_at": now,
+            }
+            self._jobs[job["id"]] = job
+            self._queue.append(job["id"])
+            return job["id"]
+
+    def claim(self):
+        with self._lock:
+            while self._queue:
+                job = self._jobs.get(self._queue.pop(0))
+                if job and job["status"] == "queued":
+                    job["status"] = "running"
+                    job["updated_at"] = time.time()
+                    return dict(job)
+            return None
+
+    def finish(self, job_id, status, result=None, error=None):
+        with self._lock:
+            job = self._jobs.get(job_id)
+            if job:
+                job.update(status=status, result=result, error=error, updated_at=time.time())
+
+    def get(self, job_id):
+        with self._lock:
+            job = self._jobs.get(job_id)
+            return dict(job) if job else None
+
+    def renew(self, job_id):
+        # Jobs only run in this process and are lost with it, so they need no lease
+        pass
+
+    def add_progress(self, job_id, item):
+        with self._lock:
+            job = self._jobs.get(job_id)
+            if job:
+                job["progress"].append(item)
+
+    def get_progress(self, job_id, after=0):
+        with self._lock:
+            job = self._jobs.get(job_id)
+            return list(job["progress"][after:]) if job else []
+
+    def _prune(self):
+        cutoff = time.time() - self.result_ttl
+        for job_id in [
+            job_id for job_id, job in self._jobs.items()
+            if job["status"] not in ACTIVE_STATUSES and job["updated_at"] < cutoff
+        ]:
+            del self._jobs[job_id]
+
+
+class SQLiteBackend:
+    """
+    Job storage in a local SQLite file, shared by the web process and separate worker processes.
+
+    Claimed jobs are leased: a running job whose lease expired (its worker died) is
+    queued again, or failed after MAX_JOB_ATTEMPTS, so jobs with its key never wait on it.
+    """
+
+    def __init__(self, path="jobs.sqlite3", result_ttl=DEFAULT_RESULT_TTL, lease_seconds=DEFAULT_LEASE_SECONDS):
+        self.path = path
+        self.result_ttl = result_ttl
+        self.lease_seconds = lease_seconds
+        self._local = threading.local()
+        with self._connect() as conn:
+            conn.execute(
+                """
+                CREATE TABLE IF NOT EXISTS jobs (
+                    id TEXT PRIMARY KEY,
+                    kind TEXT NOT NULL,
+                    key TEXT NOT NULL,
+                    payload TEXT NOT NULL,
+                    status TEXT NOT NULL,
+                    result TEXT,
+                    error TEXT,
+                    created_at REAL NOT NULL,
+                    updated_at REAL NOT NULL,
+                    lease_expires_at REAL,
+                    attempts INTEGER NOT NULL DEFAULT 0
+                )
+                """
+            )
+            # Queue files created before jobs were leased
+            columns = {row["name"] for row in conn.execute("PRAGMA table_info(jobs)")}
+            if "lease_expires_at" not in columns:
+                conn.execute("ALTER TABLE jobs ADD COLUMN lease_expires_at REAL")
+            if "attempts" not in columns:
+                conn.execute("ALTER TABLE jobs ADD COLUMN attempts INTEGER NOT NULL DEFAULT 0")
+            conn.execute(
+                """
+                CREATE TABLE IF NOT EXISTS job_progress (
+                    job_id TEXT NOT NULL,
+                    seq INTEGER NOT NULL,
+                    data TEXT NOT NULL,
+                    PRIMARY KEY (job_id, seq)
+                )
+                """
+            )
+            conn.execute("CREATE INDEX IF NOT EXISTS jobs_status_created ON jobs (status, created_at)")
+            conn.execute("CREATE INDEX IF NOT EXISTS jobs_key_status ON jobs (key, status)")
+
+    def _connect(self):
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=30, isolation_level=None)
+            conn.row_factory = sqlite3.Row
+            conn.execute("PRAGMA journal_mode=WAL")
+            self._local.conn = conn
+        return conn
+
+    @staticmethod
+    def _recover_expired(conn, now):
+        """
+        Queue running jobs whose lease expired again, or fail them after MAX_JOB_ATTEMPTS.
+        Runs inside the caller's transaction.
+        """
+        conn.execute(
+            "UPDATE jobs SET status = 'failed', error = 'Worker lost the job', lease_expires_at = NULL, "
+            "updated_at = ? WHERE status = 'running' AND lease_expires_at < ? AND attempts >= ?",
+            (now, now, MAX_JOB_ATTEMPTS),
+        )
+        conn.execute(
+            "UPDATE jobs SET status = 'queued', lease_expires_at = NULL, updated_at = ? "
+            "WHERE status = 'running' AND lease_expires_at < ?",
+            (now, now),
+        )
+
+    def enqueue(self, kind, key, payload):
+        conn = self._connect()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            now = time.time()
+            conn.execute(
+                "DELETE FROM jobs WHERE status NOT IN (?, ?) AND updated_at < ?",
+                ACTIVE_STATUSES + (now - self.result_ttl,),
+            )
+            conn.execute("DELETE FROM job_progress WHERE job_id NOT IN (SELECT id FROM jobs)")
+            self._recover_expired(conn, now)
+            row = conn.execute(
+                "SELECT id FROM jobs WHERE key = ? AND status IN (?, ?) LIMIT 1",
+                (key,) + ACTIVE_STATUSES,
+            ).fetchone()
+            if row:
+                job_id = row["id"]
+            else:
+                job_id = uuid.uuid4().hex
+                conn.execute(
+                    "INSERT INTO jobs (id, kind, key, payload, status, created_at, updated_at) "
+                    "VALUES (?, ?, ?, ?, 'queued', ?, ?)",
+                    (job_id, kind, key, json.dumps(payload), now, now),
+                )
+            conn.execute("COMMIT")
+            return job_id
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+
+    def claim(self):
+        conn = self._connect()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            now = time.time()
+            self._recover_expired(conn, now)
+            row = conn.execute(
+                "SELECT * FROM jobs WHERE status = 'queued' ORDER BY created_at LIMIT 1"
+            ).fetchone()
+            if row:
+                conn.execute(
+                    "UPDATE jobs SET status = 'running', updated_at = ?, lease_expires_at = ?, "
+                    "attempts = attempts + 1 WHERE id = ?",
+                    (now, now + self.lease_seconds, row["id"]),
+                )
+            conn.execute("COMMIT")
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+
+        if not row:
+            return None
+        job = self._to_job(row)
+        job["status"] = "running"
+        return job
+
+    def finish(self, job_id, status, result=None, error=None):
+        self._connect().execute(
+            "UPDATE jobs SET status = ?, result = ?, error = ?, updated_at = ?, lease_expires_at = NULL WHERE id = ?",
+            (status, json.dumps(result), error, time.time(), job_id),
+        )
+
+    def renew(self, job_id):
+        """
+        Extend the lease of a running job.
+        """
+        now = time.time()
+        self._connect().execute(
+            "UPDATE jobs SET lease_expires_at = ?, updated_at = ? WHERE id = ? AND status = 'running'",
+            (now + self.lease_seconds, now, job_id),
+        )
+
+    def get(self, job_id):
+        row = self._connect().execute("SELECT * FROM jobs WHERE id = ?", (job_id,)).fetchone()
+        return self._to_job(row) if row else None
+
+    def add_progress(self, job_id, item):
+        self._connect().execute(
+            "INSERT INTO job_progress (job_id, seq, data) "
+            "SELECT ?, COALESCE(MAX(seq), 0) + 1, ? FROM job_progress WHERE job_id = ?",
+            (job_id, json.dumps(item), job_id),
+        )
+
+    def get_progress(self, job_id, after=0):
+        rows = self._connect().execute(
+            "SELECT data FROM job_progress WHERE job_id = ? AND seq > ? ORDER BY seq", (job_id, after)
+        )
+        return [json.loads(row["data"]) for row in rows]
+
+    @staticmethod
+    def _to_job(row):
+        job = dict(row)
+        job["payload"] = json.loads(job["payload"])
+        job["result"] = json.loads(job["result"]) if job["result"] else None
+        return job
+
+
+def create_backend(name="memory", path="jobs.sqlite3"):
+    """
+    Create a job backend by name ("memory" or "sqlite").
+    """
+    if name == "memory":
+        return MemoryBackend()
+    if name == "sqlite":
+        return SQLiteBackend(path)
+    raise ValueError(f"Unknown job queue backend: {name}")
+
+
+class JobQueue:
+    """
+    Queue of background jobs (e.g. match ingestion) run by worker threads.
+
+    Jobs are deduplicated by key: submitting a job while another job with the same
+    key is queued or running returns the existing job's ID instead.
+    """
+
+    def __init__(self, backend=None, poll_interval=0.5):
+        self.backend = backend or MemoryBackend()
+        self.poll_interval = poll_interval
+        self._handlers = {}
+        self._wakeup = threading.Event()
+        self._stopping = threading.Event()
+        self._workers = []
+
+    def register(self, kind, handler):
+        """
+        Register the function run for jobs of a kind. It is called with the job payload
+        as keyword arguments and its return value becomes the job result.
+        """
+        self._handlers[kind] = handler
+
+    def submit(self, kind, key, **payload):
+        """
+        Queue a job, or join the active job with the same key.
+
+        :return: The job ID.
+        """
+        job_id = self.backend.enqueue(kind, key, payload)
+        self._wakeup.set()
+        return job_id
+
+    def get(self, job_id):
+        return self.backend.get(job_id)
+
+    def progress(self, job_id, after=0):
+        """
+        Progress items reported by a job (see report_progress), skipping the first `after`.
+        """
+        return self.backend.get_progress(job_id, after)
+
+    def wait(self, job_id, timeout=None):
+        """
+        Wait for a job to finish (long-poll).
+
+        :return: The job, finished or not once the timeout expires, or None if unknown.
+        """
+        deadline = time.monotonic() + timeout if timeout else None
+        while True:
+            job = self.backend.get(job_id)
+            if not job or job["status"] not in ACTIVE_STATUSES:
+                return job
+            if deadline and time.monotonic() >= deadline:
+                return job
+            time.sleep(0.1)
+
+    def run_next(self):
+        """
+        Claim and run a single job.
+
+        :return: True if a job was run, False if the queue was empty.
+        """
+        job = self.backend.claim()
+        if not job:
+            return False
+
+        handler = self._handlers.get(job["kind"])
+        _current.job_id, _current.backend = job["id"], self.backend
+        done = threading.Event()
+        heartbeat = threading.Thread(target=self._heartbeat, args=(job["id"], done), daemon=True)
+        heartbeat.start()
+        try:
+            if not handler:
+                raise ValueError(f"No handler registered for job kind {job['kind']}")
+            result = handler(**job["payload"])
+            self.backend.finish(job["id"], "done", result=result)
+        except Exception as e:
+            print(f"Job {job['id']} ({job['kind']}) failed: {e}")
+            self.backend.finish(job["id"], "failed", error=str(e))
+        finally:
+            _current.job_id = None
+            done.set()
+            heartbeat.join()
+        return True
+
+    def _heartbeat(self, job_id, done):
+        """
+        Renew a running job's lease until it finishes.
+        """
+        interval = getattr(self.backend, "lease_seconds", DEFAULT_LEASE_SECONDS) / 3
+        while not done.wait(interval):
+            try:
+                self.backend.renew(job_id)
+            except Exception as e:
+                print(f"Failed to renew the lease of job {job_id}: {e}")
+
+    def _work(self):
+        while not self._stopping.is_set():
+            if not self.run_next():
+                self._wakeup.wait(self.poll_interval)
+                self._wakeup.clear()
+
+    def start_workers(self, count):
+        """
+        Start worker threads that run queued jobs in the background.
+        """
+        for _ in range(count):
+            worker = threading.Thread(target=self._work, daemon=True)
+            worker.start()
+            self._workers.append(worker)
+
+    def stop(self):
+        self._stopping.set()
+        self._wakeup.set()
+        for worker in self._workers:
+            worker.join()
+        self._workers = []
@@ -0,0 +1,117 @@
+"""
+Ranked LP history, stored per summoner under `lp_history/{summoner_id}`:
+
+    samples/{timestamp}   append-only log; each sample holds only what changed since the
+                          previous one (the LP change, or the new tier/division and LP)
+    last                  latest snapshot, used to compute the next delta
+    daily/{YYYY-MM-DD}    latest snapshot of each UTC day
+    weekly/{YYYY-MM-DD}   latest snapshot of each week, keyed by its Monday
+
+The graph reads a fixed number of daily or weekly rollups and never scans samples.
+"""
+from datetime import datetime, timedelta, timezone
+from storage import storage
+
+SOLO_QUEUE = "RANKED_SOLO_5x5"
+SNAPSHOT_FIELDS = ("tier", "rank", "lp")
+
+# Number of points shown per graph timeframe, and the rollup node and step behind each
+TIMEFRAMES = {
+    "day": (12, "daily", timedelta(days=1)),
+    "week": (10, "weekly", timedelta(weeks=1)),
+}
+
+
+def build_lp_snapshot(ranked_stats):
+    """
+    Extract the solo queue tier, division and LP from a league-v4 response.
+
+    :return: Snapshot dictionary, or None if the summoner has no solo queue rank.
+    """
+    entry = next((stats for stats in ranked_stats or [] if stats.get("queueType") == SOLO_QUEUE), None)
+    if not entry or not entry.get("tier"):
+        return None
+    return {"tier": entry["tier"], "rank": entry.get("rank", ""), "lp": entry.get("leaguePoints", 0)}
+
+
+def build_lp_sample(last, snapshot):
+    """
+    Build the sample appended after `last`: just the LP change within a division, or the
+    whole snapshot when the tier or division changed.
+
+    :return: The sample, or None if the rank is unchanged.
+    """
+    if all(last.get(field) == snapshot[field] for field in SNAPSHOT_FIELDS):
+        return None
+    if last and last.get("tier") == snapshot["tier"] and last.get("rank") == snapshot["rank"]:
+        return {"lp_delta": snapshot["lp"] - last.get("lp", 0)}
+    return dict(snapshot)
+
+
+def rollup_keys(timestamp):
+    """
+    Daily and weekly rollup keys for a timestamp (ms).
+    """
+    date = datetime.fromtimestamp(timestamp / 1000, tz=timezone.utc).date()
+    week_start = date - timedelta(days=date.weekday())
+    return date.isoformat(), week_start.isoformat()
+
+
+def record_lp_snapshot(summoner_id, ranked_stats, timestamp=None):
+    """
+    Append a summoner's current solo queue rank to their LP history if it changed.
+
+    The web app, workers and bulk refresh all record snapshots, so the comparison with
+    the last snapshot is made by storage atomically with the append.
+
+    :param summoner_id: Encrypted summoner ID.
+    :param ranked_stats: league-v4 entries for the summoner.
+    :param timestamp: Sample time in ms (defaults to now).
+    :return: True if a sample was written.
+    """
+    snapshot = build_lp_snapshot(ranked_stats)
+    if not summoner_id or snapshot is None:
+        return False
+
+    try:
+        timestamp = timestamp or int(datetime.now(timezone.utc).timestamp() * 1000)
+        day_key, week_key = rollup_keys(timestamp)
+        sample = storage.append_lp_sample(
+            summoner_id, timestamp, snapshot, {"daily": day_key, "weekly": week_key}, build_lp_sample
+        )
+        return sample is not None
+    except Exception as e:
+        print(f"Failed to record LP snapshot for {summoner_id}: {e}")
+        return False
+
+
+def get_lp_series(summoner_id, timeframe="day", now=None):
+    """
+    Read a summoner's LP history for the graph from the daily or weekly rollups.
+
+    Buckets without a sample carry the previous snapshot forward; buckets before the
+    first sample are None.
+
+    :param timeframe: "day" (last 12 days) or "week" (last 10 weeks).
+    :param now: Timestamp (ms) of the newest bucket (defaults to now).
+    :return: List of (bucket date, snapshot or None), oldest first.
+    """
+    points, node, step = TIMEFRAMES[timeframe]
+    now = now or int(datetime.now(timezone.utc).timestamp() * 1000)
+    key_index = 0 if timeframe == "day" else 1
+    step_ms = int(step.total_seconds() * 1000)
+    bucket_keys = [rollup_keys(now - step_ms * i)[key_index] for i in reversed(range(points))]
+
+    # The window's rollups plus the latest one before it, to carry into empty buckets
+    rollups = storage.get_lp_rollups(summoner_id, node, bucket_keys[-1], points + 1)
+
+    carried = None
+    for key in sorted(rollups):
+        if key < bucket_keys[0]:
+            carried = rollups[key]
+
+    series = []
+    for key in bucket_keys:
+        carried = rollups.get(key, carried)
+        series.append((key, carried))
+    return series
@@ -1,7 +1,8 @@
-from flask import Flask, request, jsonify, render_template, session
-from firebase_admin import credentials, db
+import os
+import json
+import time
+from flask import Flask, Response, request, jsonify, render_template, session, stream_with_context
 from datetime import datetime, timezone, timedelta
-import random
 from riot_client import (
     PLATFORM_TO_GLOBAL,
     get_account_by_riot_id,
@@ -21,17 +22,168 @@ from riot_client import (
     calculate_time_ago,
     generate_daily_dates,
     generate_weekly_dates,
-    roman_to_int
+    roman_to_int,
+    get_pool_stats,
+    get_identity_cache_stats,
+    sync_user_matches,
+    get_user_matches,
+    load_match_page,
+    encode_match_cursor,
+    InvalidCursorError,
+    register_ingestion_jobs
 )
+from job_queue import JobQueue, create_backend
+from singleflight import single_flight
+from page_cache import page_version, profile_pages
+from storage import storage
+from lp_history import TIMEFRAMES, get_lp_series
 
 app = Flask(__name__)
 app.secret_key = "supersecretkey"
 
+# Background ingestion jobs; set JOB_WORKERS=0 when separate worker.py processes run them
+job_queue = JobQueue(create_backend(
+    os.getenv("JOB_QUEUE_BACKEND", "memory"),
+    os.getenv("JOB_QUEUE_PATH", "jobs.sqlite3"),
+))
+register_ingestion_jobs(job_queue)
+job_queue.start_workers(int(os.getenv("JOB_WORKERS", "2")))
+
+# Seconds between progress checks of a streamed job, and how long a stream may stay open
+JOB_STREAM_POLL_INTERVAL = float(os.getenv("JOB_STREAM_POLL_INTERVAL", "0.1"))
+JOB_STREAM_TIMEOUT = float(os.getenv("JOB_STREAM_TIMEOUT", "120"))
+
 @app.route("/")
 def home():
     return render_template("home.html")
 
 
+@single_flight(lambda user_id, game_name, tag_line, region: (user_id, region))
+def start_new_user_ingestion(user_id, game_name, tag_line, region):
+    """
+    Resolve a new user's account, summoner and ranked stats, and queue the job that
+    fetches their matches. Concurrent searches for the same user and region share one call.
+
+    :return: Tuple of (summoner_info, ranked_stats, ingestion job ID).
+    """
+    account_info = get_account_by_riot_id(game_name, tag_line, region)
+    if not account_info or "puuid" not in account_info:
+        raise Exception("Failed to fetch valid account information.")
+
+    summoner_info = get_summoner_info_by_puuid(account_info["puuid"], region)
+    if not summoner_info or "id" not in summoner_info:
+        raise Exception("Failed to fetch valid summoner information.")
+
+    ranked_stats = next(
+        (
+            stats
+            for stats in get_ranked_stats_by_summoner_id(summoner_info["id"], region) or []
+            if stats["queueType"] == "RANKED_SOLO_5x5"
+        ),
+        None,
+    )
+
+    # Fetch the latest 20 ranked matches in the background; the page polls the job
+    puuid = account_info["puuid"]
+    job_id = job_queue.submit(
+        "ingest_user", f"ingest:{puuid}:{region}",
+        user_id=user_id,
+        puuid=puuid,
+        region=region,
+        summoner_info=summoner_info,
+        ranked_stats=ranked_stats,
+    )
+    return summoner_info, ranked_stats, job_id
+
+
+def build_cached_profile(user_id, user_data, game_name, tag_line, region):
+    """
+    Build the result.html context for a user whose profile is already stored.
+    """
+    # Parse the last updated time
+    last_updated_str = user_data.get("last_updated")
+    last_updated = None
+    if last_updated_str:
+        try:
+            last_updated = datetime.fromisoformat(last_updated_str)
+        except ValueError:
+            print(f"Invalid last_updated format: {last_updated_str}")
+
+    # Calculate "time ago" for last updated
+    last_updated_text = "Never"
+    if last_updated:
+        last_updated_text = calculate_time_ago(int(last_updated.timestamp() * 1000))
+
+    match_history = get_user_matches(user_id, limit=20)  # Get only the latest 20 matches
+
+    for match in match_history:
+        if "game_start_timestamp" in match:
+            match["game_time_ago"] = calculate_time_ago(match["game_start_timestamp"])
+
+    return dict(
+        riot_id={"gameName": game_name, "tagLine": tag_line},
+        summoner_info=user_data.get("summoner_info", {}),
+        ranked_stats=user_data.get("ranked_stats", {}),
+        user_match_details=match_history,
+        most_played_champions=user_data.get("most_played_champions", []),
+        region=region,
+        mmr_data=user_data.get("mmr_data", {}),
+        rank=get_rank_by_mmr(user_data.get("mmr_data", {}).get("estimated_mmr", 0)),
+        last_updated = last_updated_text,
+        last_updated_timestamp=int(last_updated.timestamp() * 1000) if last_updated else None,
+        next_cursor=encode_match_cursor(match_history[-1]) if match_history else None,
+    )
+
+
+def build_new_profile(game_name, tag_line, region, summoner_info, ranked_stats, job_id):
+    """
+    Build the result.html context for a new user whose matches are still being fetched.
+    """
+    return dict(
+        riot_id={"gameName": game_name, "tagLine": tag_line},
+        summoner_info=summoner_info,
+        ranked_stats=ranked_stats,
+        user_match_details=[],
+        most_played_champions=[],
+        region=region,
+        mmr_data=None,
+        rank=None,
+        next_cursor=None,
+        job_id=job_id,
+    )
+
+
+def get_cached_profile_page(user_id, game_name, tag_line, region):
+    """
+    Return the rendered profile page cached for the user's current page version, or None.
+
+    Lobby ranks fill in over several jobs, so serving a page that still lacks some
+    queues the next job, as rendering it did.
+    """
+    version = storage.get_profile_field(user_id, "page_version") or storage.get_profile_field(user_id, "last_updated")
+    if not version:
+        return None
+    entry = profile_pages.get(user_id, version, (game_name, tag_line, region))
+    if entry is None:
+        return None
+
+    page, lobby_ranks_pending = entry
+    if lobby_ranks_pending:
+        submit_lobby_rank_job(user_id, region)
+    return page
+
+
+def cache_profile_page(user_id, user_data, game_name, tag_line, region, page, lobby_ranks_pending=False):
+    """
+    Cache a rendered profile page under the page version it was rendered from.
+
+    :param lobby_ranks_pending: Whether matches on the page still lack a lobby rank.
+    """
+    version = page_version(user_data)
+    if version:
+        profile_pages.put(user_id, version, (game_name, tag_line, region), (page, lobby_ranks_pending))
+
+
 @app.route("/search", methods=["POST"])
 def search():
     game_name = request.form["game_name"]
@@ -40,92 +192,28 @@ def search():
 
     try:
         user_id = sanitize_user_id(f"{game_name}#{tag_line}")
-        ref = db.reference(f"users/{user_id}")
-        user_data = ref.get()
+
+        # Hot profiles are served as rendered while their page version is unchanged
+        page = get_cached_profile_page(user_id, game_name, tag_line, region)
+        if page is not None:
+            return page
+
+        user_data = storage.get_profile(user_id)
 
         if user_data:
-            # Parse the last updated time
-            last_updated_str = user_data.get("last_updated")
-            last_updated = None
-            if last_updated_str:
-                try:
-                    last_updated = datetime.fromisoformat(last_updated_str)
-                except ValueError:
-                    print(f"Invalid last_updated format: {last_updated_str}")
-
-            # Calculate "time ago" for last updated
-            last_updated_text = "Never"
-            if last_updated:
-                last_updated_text = calculate_time_ago(int(last_updated.timestamp() * 1000))
-            
             # Existing user: Load matches from the database
             print(f"User {user_id} already exists. Loading from database.")
-            match_history = user_data.get("match_history", [])[:20]  # Get only the latest 20 matches
-            
-            for match in match_history:
-                if "game_start_timestamp" in match:
-                    match["game_time_ago"] = calculate_time_ago(match["game_start_timestamp"])
-                    
-            return render_template(
-                "result.html",
-                riot_id={"gameName": game_name, "tagLine": tag_line},
-                summoner_info=user_data.get("summoner_info", {}),
-                ranked_stats=user_data.get("ranked_stats", {}),
-                user_match_details=match_history,
-                most_played_champions=user_data.get("most_played_champions", []),
-                region=region,
-                mmr_data=user_data.get("mmr_data", {}),
-                rank=get_rank_by_mmr(user_data.get("mmr_data", {}).get("estimated_mmr", 0)),
-                last_updated = last_updated_text,
-            )
-
-        # New user: Fetch matches from Riot API
-        account_info = get_account_by_riot_id(game_name, tag_line, region)
-        if not account_info or "puuid" not in account_info:
-            raise Exception("Failed to fetch valid account information.")
-
-        summoner_info = get_summoner_info_by_puuid(account_info["puuid"], region)
-        if not summoner_info or "id" not in summoner_info:
-            raise Exception("Failed to fetch valid summoner information.")
-
-        ranked_stats = next(
-            (
-                stats
-                for stats in get_ranked_stats_by_summoner_id(summoner_info["id"], region)
-                if stats["queueType"] == "RANKED_SOLO_5x5"
-            ),
-            None,
-        )
+            context = build_cached_profile(user_id, user_data, game_name, tag_line, region)
+            page = render_template("result.html", **context)
+            lobby_ranks_pending = submit_lobby_rank_job(user_id, region, context["user_match_details"])
+            cache_profile_page(user_id, user_data, game_name, tag_line, region, page, lobby_ranks_pending)
+            return page
 
-        # Fetch the latest 20 ranked matches
-        puuid = account_info["puuid"]
-        ranked_match_details, stored_match_ids = fetch_initial_matches(puuid, region)
-
-        # Update the "time played ago" for each match
-        for match in ranked_match_details:
-            if "game_start_timestamp" in match:
-                match["game_time_ago"] = calculate_time_ago(match["game_start_timestamp"])
-
-        save_user_data_to_realtime_db(
-            user_id=user_id,
-            mmr_data=None,
-            match_history=ranked_match_details,
-            stored_match_ids=stored_match_ids,
-            summoner_info=summoner_info,
-            ranked_stats=ranked_stats,
-            most_played_champions=get_most_played_champions(ranked_match_details, puuid),
-        )
+        # New user: Fetch matches from Riot API (concurrent searches share one lookup)
+        summoner_info, ranked_stats, job_id = start_new_user_ingestion(user_id, game_name, tag_line, region)
 
         return render_template(
-            "result.html",
-            riot_id={"gameName": game_name, "tagLine": tag_line},
-            summoner_info=summoner_info,
-            ranked_stats=ranked_stats,
-            user_match_details=ranked_match_details,
-            most_played_champions=get_most_played_champions(ranked_match_details, puuid),
-            region=region,
-            mmr_data=None,
-            rank=None,
+            "result.html", **build_new_profile(game_name, tag_line, region, summoner_info, ranked_stats, job_id)
         )
     except Exception as e:
         print("Error in search:", e)
@@ -136,38 +224,58 @@ def search():
 def load_more_matches():
     try:
         user_id = request.json.get("user_id")
-        start = int(request.json.get("start", 0))
+        cursor = request.json.get("cursor")
+        region = request.json.get("region", "na1")
 
         if not user_id:
             raise ValueError("User ID is required.")
 
-        ref = db.reference(f"users/{sanitize_user_id(user_id)}/match_history")
-        match_history = ref.get() or []
-
-        # Validate the start index and fetch matches
-        if start >= len(match_history):
-            return jsonify({"message": "No more matches to load!"}), 200
-
-        # Fetch matches starting from the given index
-        next_matches = match_history[start:start + 20]
+        # Read only the page after the cursor; older matches are fetched once storage runs out
+        next_matches, next_cursor = load_match_page(user_id, cursor=cursor, region=region)
 
-        # Validate matches
-        validated_matches = [
-            match for match in next_matches
-            if match and isinstance(match, dict) and "user_data" in match and match["user_data"]
-        ]
-
-        if not validated_matches:
+        if not next_matches:
             return jsonify({"message": "No more matches to load!"}), 200
 
-        return jsonify({"matches": validated_matches})
+        return jsonify({"matches": next_matches, "next_cursor": next_cursor})
 
+    except InvalidCursorError as e:
+        return jsonify({"error": str(e)}), 400
     except Exception as e:
         print("Error in load_more_matches:", e)
         return jsonify({"error": str(e)}), 500
 
 
 
+def submit_refresh_job(user_id, region):
+    """
+    Queue an incremental sync of a stored user's matches.
+
+    :return: The refresh job ID.
+    """
+    return job_queue.submit(
+        "refresh_user", f"refresh:{sanitize_user_id(user_id)}",
+        user_id=user_id,
+        region=region,
+    )
+
+
+def submit_lobby_rank_job(user_id, region, matches=None):
+    """
+    Queue the job that fills in lobby average ranks, if any shown match still lacks one
+    (or without checking when `matches` is None). The ranks appear on the next load.
+
+    :return: True if a job was queued or an active one joined.
+    """
+    if matches is not None and all("lobby_rank" in match for match in matches):
+        return False
+    job_queue.submit(
+        "lobby_ranks", f"lobby_ranks:{sanitize_user_id(user_id)}",
+        user_id=user_id,
+        region=region,
+    )
+    return True
+
+
 @app.route("/refresh_matches", methods=["POST"])
 def refresh_matches():
     try:
@@ -175,68 +283,96 @@ def refresh_matches():
         if not user_id:
             return jsonify({"error": "User ID is required."}), 400
 
-        ref = db.reference(f"users/{sanitize_user_id(user_id)}")
-        user_data = ref.get()
-
-        if not user_data:
-            return jsonify({"error": "User not found. Please search first."}), 400
-
-        stored_match_ids = set(user_data.get("stored_match_ids", []))
-        puuid = user_data.get("summoner_info", {}).get("puuid")
-        if not puuid:
-            return jsonify({"error": "PUUID not found in user data."}), 400
-
-        # Fetch recent matches from Riot API
-        match_history = get_match_history_paged(puuid, count=20, region=PLATFORM_TO_GLOBAL.get(request.json.get("region", "na1")))
-
-        # Fetch recent matches
-        new_match_ids = []
-        new_match_details = []
-        for match_id in match_history:
-            if match_id in stored_match_ids:
-                continue  # Skip if match is already stored
-            match_details = get_user_match_details(puuid, match_id, PLATFORM_TO_GLOBAL[request.json.get("region", "na1")])
-            if match_details and match_details.get("game_mode") == "CLASSIC":
-                match_details["game_time_ago"] = calculate_time_ago(match_details.get("game_start_timestamp"))
-                new_match_ids.append(match_id)
-                new_match_details.append(match_details)
-
-        # Combine new matches with existing match history
-        last_updated = datetime.now(timezone.utc).isoformat()
-        ref.child("last_updated").set(last_updated)
-
-        if new_match_ids:
-            stored_match_ids.update(new_match_ids)
-            combined_match_history = new_match_details + user_data.get("match_history", [])
-            combined_match_history = sorted(
-                combined_match_history,
-                key=lambda x: x.get("game_start_timestamp", 0),
-                reverse=True
-            )  # Sort by timestamp, latest first
-            ref.child("stored_match_ids").set(list(stored_match_ids))
-            ref.child("match_history").set(combined_match_history)
-
-            # Send the latest 20 matches to the frontend
-            latest_20_matches = combined_match_history[:20]
-
-            return jsonify({
-                "message": f"{len(new_match_ids)} new matches added!",
-                "new_matches": latest_20_matches,
-                "last_updated": "just now"
-            })
-
-        # No new matches
-        return jsonify({
-            "message": "No new matches",
-            "last_updated": "just now",
-            "updated_matches": user_data.get("match_history", [])[:20]  # Latest 20 matches for frontend
-        })
+        # Sync in the background; the page polls /jobs/<job_id> for the result
+        job_id = submit_refresh_job(user_id, request.json.get("region", "na1"))
+        return jsonify({"job_id": job_id, "status": "queued"}), 202
     except Exception as e:
         print("Error in refresh_matches:", e)
         return jsonify({"error": str(e)}), 500
 
 
 
+@app.route("/jobs/<job_id>", methods=["GET"])
+def job_status(job_id):
+    """
+    Report the status of a background job, optionally waiting for it to finish.
+
+    Query Parameters:
+        wait (float): Seconds to long-poll for the job to finish (at most 25).
+    """
+    try:
+        wait = min(float(request.args.get("wait", 0)), 25)
+    except ValueError:
+        return jsonify({"error": "wait must be a number of seconds."}), 400
+
+    job = job_queue.wait(job_id, timeout=wait) if wait > 0 else job_queue.get(job_id)
+    if not job:
+        return jsonify({"error": "Job not found."}), 404
+
+    return jsonify({
+        "job_id": job["id"],
+        "status": job["status"],
+        "result": job["result"],
+        "error": job["error"],
+    })
+
+
+def read_job_stream(job_id, sent):
+    """
+    Read the next step of a job stream: the progress items after the first `sent`, and
+    the final status line once the job has finished.
+
+    :return: Tuple of (NDJSON lines, number of progress items sent, whether the job is done),
+        or None if the job does not exist.
+    """
+    # Read the status before the progress, so a finished job's last items are never missed
+    job = job_queue.get(job_id)
+    if not job:
+        return None
+
+    items = job_queue.progress(job_id, after=sent)
+    lines = [json.dumps({"progress": item}) + "\n" for item in items]
+    done = job["status"] not in ("queued", "running")
+    if done:
+        lines.append(json.dumps({
+            "job_id": job["id"],
+            "status": job["status"],
+            "result": job["result"],
+            "error": job["error"],
+        }) + "\n")
+    return lines, sent + len(items), done
+
+
+@app.route("/jobs/<job_id>/stream", methods=["GET"])
+def job_stream(job_id):
+    """
+    Stream a background job as newline-delimited JSON: one {"progress": ...} line per
+    item the job reports (e.g. each match as it is fetched), then a final line with the
+    job's status and result, like /jobs/<job_id>.
+    """
+    step = read_job_stream(job_id, 0)
+    if step is None:
+        return jsonify({"error": "Job not found."}), 404
+
+    def generate(step):
+        deadline = time.monotonic() + JOB_STREAM_TIMEOUT
+        while True:
+            lines, sent, done = step
+            yield from lines
+            if done or time.monotonic() > deadline:
+                return
+            time.sleep(JOB_STREAM_POLL_INTERVAL)
+            step = read_job_stream(job_id, sent)
+            if step is None:
+                return
+
+    return Response(
+        stream_with_context(generate(step)),
+        mimetype="application/x-ndjson",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+
 @app.route('/ranked_graph', methods=['GET'])
 def ranked_graph():
     """
@@ -245,26 +381,24 @@ def ranked_graph():
 
     Query Parameters:
         timeframe (str): "day" or "week" to determine the data interval.
+        user_id (str): Riot ID of the user (e.g., "name#tag").
     """
-    # Get the timeframe from the query parameters
+    # Get the timeframe and user from the query parameters
     timeframe = request.args.get('timeframe', 'day')
+    user_id = request.args.get('user_id')
 
-    # Define rank tiers for demonstration
-    rank_tiers = ["Iron", "Bronze", "Silver", "Gold", "Platinum", "Diamond", "Master", "Grandmaster", "Challenger"]
-    divisions = ["IV", "III", "II", "I"]
-
-    if timeframe == 'day':
-        # Generate data for the last 12 days
-        labels = generate_daily_dates()
-        points = [random.randint(0, 100) for _ in range(12)]  # Random LP values
-        ranks = [f"{random.choice(rank_tiers)} {random.choice(divisions)}" for _ in range(12)]
-    elif timeframe == 'week':
-        # Generate data for the last 10 weeks
-        labels = generate_weekly_dates()
-        points = [random.randint(0, 100) for _ in range(10)]  # Random LP values
-        ranks = [f"{random.choice(rank_tiers)} {random.choice(divisions)}" for _ in range(10)]
-    else:
+    if timeframe not in TIMEFRAMES:
         return jsonify({"error": "Invalid timeframe. Use 'day' or 'week'."}), 400
+    if not user_id:
+        return jsonify({"error": "User ID is required."}), 400
+
+    # Read the fixed number of daily or weekly rollups from the user's LP history
+    summoner_id = storage.get_profile_field(sanitize_user_id(user_id), "summoner_info/id")
+    series = get_lp_series(summoner_id, timeframe) if summoner_id else []
+
+    labels = [datetime.fromisoformat(bucket).strftime('%m.%d') for bucket, _ in series]
+    points = [snapshot["lp"] if snapshot else None for _, snapshot in series]
+    ranks = [f"{snapshot['tier'].title()} {snapshot['rank']}" if snapshot else "" for _, snapshot in series]
 
     # Shorten rank format (e.g., "Diamond IV" -> "D4")
     shortened_ranks = []
@@ -283,5 +417,19 @@ def ranked_graph():
         "ranks": shortened_ranks
     })
 
+@app.route("/stats/http_pool", methods=["GET"])
+def http_pool_stats():
+    """
+    Report how many Riot API connections were opened vs. reused per routing host.
+    """
+    return jsonify(get_pool_stats())
+
+@app.route("/stats/identity_cache", methods=["GET"])
+def identity_cache_stats():
+    """
+    Report hit and miss counts of the account, summoner and league caches.
+    """
+    return jsonify(get_identity_cache_stats())
+
 if __name__ == "__main__":
     app.run(debug=True)
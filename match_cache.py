@@ -0,0 +1,49 @@
+from cache_utils import LRUCache
+
+
+class MatchCache:
+    """
+    Two-tier cache of match payloads keyed by match ID.
+
+    Finished matches never change, so a payload is downloaded once and then served
+    from an in-process LRU tier, backed by a persistent tier shared by every process
+    (e.g. the `matches/{match_id}` node in the Realtime Database).
+    """
+
+    def __init__(self, capacity=2000, load=None, store=None):
+        """
+        :param capacity: Number of payloads kept in memory.
+        :param load: Callable(match_id) returning a persisted payload or None.
+        :param store: Callable(match_id, payload) persisting a payload.
+        """
+        self._memory = LRUCache(capacity)
+        self._load = load
+        self._store = store
+
+    def get(self, match_id):
+        payload = self._memory.get(match_id)
+        if payload is not None or not self._load:
+            return payload
+
+        try:
+            payload = self._load(match_id)
+        except Exception as e:
+            print(f"Failed to load cached match {match_id}: {e}")
+            return None
+
+        if payload is not None:
+            self._memory.put(match_id, payload)
+        return payload
+
+    def put(self, match_id, payload):
+        self._memory.put(match_id, payload)
+        if not self._store:
+            return
+
+        try:
+            self._store(match_id, payload)
+        except Exception as e:
+            print(f"Failed to persist match {match_id}: {e}")
+
+    def stats(self):
+        return {"size": len(self._memory), "hits": self._memory.hits, "misses": self._memory.misses}
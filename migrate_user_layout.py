@@ -0,0 +1,107 @@
+"""
+One-shot migration of users/{id} records to the split storage layout.
+
+Older records keep every match inside the profile document (`match_history`,
+`stored_match_ids` and `matches`). This moves each match to
+`user_matches/{id}/{match key}` and leaves only the profile summary under `users/{id}`.
+Records without running aggregates get them built once from their stored matches.
+
+Usage:
+    python migrate_user_layout.py [--dry-run] [--user USER_ID]
+"""
+import argparse
+from firebase_admin import db
+from riot_client import (
+    CURRENT_SEASON,
+    add_matches_to_aggregates,
+    build_sync_state,
+    match_sort_key,
+    most_played_from_aggregates,
+    sanitize_user_id,
+)
+
+LEGACY_FIELDS = ("match_history", "stored_match_ids", "matches")
+
+
+def collect_legacy_matches(user_data):
+    """
+    Gather the full match details kept in a legacy record, deduplicated by match ID.
+    """
+    matches = {}
+    for match in user_data.get("match_history") or []:
+        if isinstance(match, dict) and match.get("match_id") and match.get("user_data"):
+            matches[match["match_id"]] = match
+
+    # The matches node may also hold {"stored": True} placeholders, which carry no details
+    for match_id, match in (user_data.get("matches") or {}).items():
+        if isinstance(match, dict) and match.get("user_data"):
+            matches.setdefault(match_id, {**match, "match_id": match_id})
+
+    return list(matches.values())
+
+
+def migrate_user(user_id, dry_run=False):
+    """
+    Migrate a single user record.
+
+    :return: Number of matches moved, or None if the record was already migrated.
+    """
+    ref = db.reference(f"users/{user_id}")
+    user_data = ref.get() or {}
+    has_legacy_fields = any(field in user_data for field in LEGACY_FIELDS)
+    if not has_legacy_fields and "aggregates" in user_data:
+        return None
+
+    matches = []
+    updates = {}
+    if has_legacy_fields:
+        matches = collect_legacy_matches(user_data)
+        updates.update({f"users/{user_id}/{field}": None for field in LEGACY_FIELDS})  # None deletes the node
+        for match in matches:
+            updates[f"user_matches/{user_id}/{match_sort_key(match)}"] = match
+        if not user_data.get("sync_state"):
+            updates[f"users/{user_id}/sync_state"] = build_sync_state(matches)
+
+    if "aggregates" not in user_data:
+        # Build the running aggregates from the whole stored history
+        stored_matches = list((db.reference(f"user_matches/{user_id}").get() or {}).values())
+        aggregates = add_matches_to_aggregates({}, stored_matches + matches)
+        updates[f"users/{user_id}/aggregates"] = aggregates
+        updates[f"users/{user_id}/most_played_champions"] = most_played_from_aggregates(aggregates.get(CURRENT_SEASON))
+
+    if not dry_run:
+        db.reference().update(updates)
+    return len(matches)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Split legacy user records into profile and match nodes and build aggregates.")
+    parser.add_argument("--dry-run", action="store_true", help="Report what would be migrated without writing.")
+    parser.add_argument("--user", help="Migrate a single user ID instead of every user.")
+    args = parser.parse_args()
+
+    if args.user:
+        user_ids = [sanitize_user_id(args.user)]
+    else:
+        user_ids = list((db.reference("users").get(shallow=True) or {}).keys())
+
+    migrated = 0
+    for user_id in user_ids:
+        try:
+            moved = migrate_user(user_id, dry_run=args.dry_run)
+        except Exception as e:
+            print(f"Failed to migrate user {user_id}: {e}")
+            continue
+
+        if moved is None:
+            print(f"User {user_id} already migrated.")
+            continue
+
+        migrated += 1
+        print(f"{'Would move' if args.dry_run else 'Moved'} {moved} matches for user {user_id}.")
+
+    print(f"Migrated {migrated} of {len(user_ids)} users.")
+
+
+if __name__ == "__main__":
+    main()
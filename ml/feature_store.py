@@ -0,0 +1,214 @@
+import os
+import threading
+from contextlib import contextmanager
+import numpy as np
+
+try:
+    import fcntl
+except ImportError:  # Windows: appends are only serialized within one process
+    fcntl = None
+
+# One fixed-width binary file per column; a row is one (match_id, puuid) pair
+FEATURE_COLUMNS = {
+    "match_id": "S32",
+    "puuid": "S80",
+    "game_start_timestamp": "<i8",
+    "kills": "<i4",
+    "deaths": "<i4",
+    "assists": "<i4",
+    "totalCS": "<i4",
+    "win": "i1",
+    "game_duration": "<i4",
+}
+
+
+class FeatureSelection:
+    """
+    A subset of feature store rows. Columns are read from the memory-mapped files on
+    access; a contiguous selection is returned as a view without copying.
+    """
+
+    def __init__(self, columns, index):
+        self._columns = columns
+        self.index = index  # slice or array of row numbers
+
+    def __getitem__(self, name):
+        return self._columns[name][self.index]
+
+    def __len__(self):
+        if isinstance(self.index, slice):
+            return len(range(*self.index.indices(len(self._columns["kills"]))))
+        return len(self.index)
+
+    def row_numbers(self):
+        if isinstance(self.index, slice):
+            return np.arange(*self.index.indices(len(self._columns["kills"])))
+        return self.index
+
+    def subset(self, row_numbers):
+        """
+        Narrow the selection to the given row numbers (as returned by row_numbers()).
+        """
+        return FeatureSelection(self._columns, np.asarray(row_numbers))
+
+
+class FeatureStore:
+    """
+    Append-only columnar store of per-match features, kept as memory-mapped NumPy
+    column files on local disk. Rows are appended as matches are ingested and read
+    back zero-copy for training and analytics.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        os.makedirs(path, exist_ok=True)
+        self._lock = threading.Lock()
+        self._keys = None  # (match_id, puuid) pairs already stored, loaded on first append
+        self._keys_rows = 0  # Rows on disk that self._keys covers
+        with self._file_lock():
+            self._repair()
+
+    def _column_path(self, name):
+        return os.path.join(self.path, f"{name}.bin")
+
+    def _row_counts(self):
+        counts = {}
+        for name, dtype in FEATURE_COLUMNS.items():
+            column_path = self._column_path(name)
+            size = os.path.getsize(column_path) if os.path.exists(column_path) else 0
+            counts[name] = size // np.dtype(dtype).itemsize
+        return counts
+
+    def _repair(self):
+        """
+        Truncate every column to the shortest one, dropping a partially written append.
+        Call with the file lock held.
+
+        :return: Number of complete rows.
+        """
+        counts = self._row_counts()
+        rows = min(counts.values())
+        for name, dtype in FEATURE_COLUMNS.items():
+            if counts[name] != rows or not os.path.exists(self._column_path(name)):
+                with open(self._column_path(name), "ab") as column_file:
+                    column_file.truncate(rows * np.dtype(dtype).itemsize)
+        return rows
+
+    def _read_keys(self, start, stop):
+        """
+        Read the (match_id, puuid) pairs of rows [start, stop) from disk.
+        """
+        key_columns = []
+        for name in ("match_id", "puuid"):
+            dtype = np.dtype(FEATURE_COLUMNS[name])
+            key_columns.append(np.fromfile(
+                self._column_path(name), dtype=dtype, count=stop - start, offset=start * dtype.itemsize
+            ).tolist())
+        return zip(*key_columns)
+
+    def _sync_keys(self, rows):
+        """
+        Bring self._keys up to date with the rows on disk, including rows other
+        processes appended since this one last looked. Call with the file lock held.
+        """
+        if self._keys is None or rows < self._keys_rows:
+            self._keys = set(self._read_keys(0, rows))
+        elif rows > self._keys_rows:
+            self._keys.update(self._read_keys(self._keys_rows, rows))
+        self._keys_rows = rows
+
+    @contextmanager
+    def _file_lock(self):
+        with open(os.path.join(self.path, ".lock"), "w") as lock_file:
+            if fcntl:
+                fcntl.flock(lock_file, fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                if fcntl:
+                    fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+    def __len__(self):
+        return min(self._row_counts().values())
+
+    def columns(self):
+        """
+        Memory-map every column (read-only).
+
+        :return: Dictionary of column name -> numpy array backed by the column file.
+        """
+        rows = len(self)
+        columns = {}
+        for name, dtype in FEATURE_COLUMNS.items():
+            if rows:
+                columns[name] = np.memmap(self._column_path(name), dtype=dtype, mode="r", shape=(rows,))
+            else:
+                columns[name] = np.empty(0, dtype=dtype)
+        return columns
+
+    def append(self, match_details):
+        """
+        Append one row per (match_id, puuid) for matches not already stored.
+
+        :param match_details: Match details as built by riot_client (with user_data).
+        :return: Number of rows appended.
+        """
+        with self._lock, self._file_lock():
+            # Other processes append to the same files, and an append may have failed halfway
+            self._sync_keys(self._repair())
+
+            rows = []
+            for match in match_details:
+                user_stats = match.get("user_data") or {}
+                key = (str(match.get("match_id", "")).encode(), str(user_stats.get("puuid", "")).encode())
+                if not key[0] or key in self._keys:
+                    continue
+
+                self._keys.add(key)
+                rows.append({
+                    "match_id": key[0],
+                    "puuid": key[1],
+                    "game_start_timestamp": match.get("game_start_timestamp") or 0,
+                    "kills": user_stats.get("kills", 0),
+                    "deaths": user_stats.get("deaths", 0),
+                    "assists": user_stats.get("assists", 0),
+                    "totalCS": user_stats.get("totalCS", 0),
+                    "win": 1 if user_stats.get("win", False) else 0,
+                    "game_duration": match.get("game_duration", 0),
+                })
+
+            if not rows:
+                return 0
+
+            try:
+                for name, dtype in FEATURE_COLUMNS.items():
+                    with open(self._column_path(name), "ab") as column_file:
+                        np.array([row[name] for row in rows], dtype=dtype).tofile(column_file)
+            except Exception:
+                # Reload the keys next time; the next append also truncates the partial rows
+                self._keys = None
+                raise
+            self._keys_rows += len(rows)
+            return len(rows)
+
+    def select(self, puuids=None, start_time=None, end_time=None):
+        """
+        Select the rows of some users and/or a time range.
+
+        :param puuids: Only include these PUUIDs (None for every user).
+        :param start_time: Only include matches started at or after this timestamp (ms).
+        :param end_time: Only include matches started before this timestamp (ms).
+        :return: FeatureSelection over the memory-mapped columns.
+        """
+        columns = self.columns()
+        if puuids is None and start_time is None and end_time is None:
+            return FeatureSelection(columns, slice(None))
+
+        mask = np.ones(len(columns["kills"]), dtype=bool)
+        if puuids is not None:
+            mask &= np.isin(columns["puuid"], np.array([str(p).encode() for p in puuids], dtype=FEATURE_COLUMNS["puuid"]))
+        if start_time is not None:
+            mask &= columns["game_start_timestamp"] >= start_time
+        if end_time is not None:
+            mask &= columns["game_start_timestamp"] < end_time
+        return FeatureSelection(columns, np.flatnonzero(mask))
@@ -1,16 +1,53 @@
+import os
+import sys
+
+# Import the project's modules from the repository root, also when run as a script
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
 import numpy as np
 from sklearn.model_selection import train_test_split
 from sklearn.ensemble import RandomForestRegressor
 from sklearn.metrics import mean_squared_error, r2_score
-import firebase_admin
-from firebase_admin import credentials, db
+from ml.feature_store import FeatureSelection
+from ml.ranks import mmr_for_rank
 
 # Initialize Firebase Admin if not already initialized
-if not firebase_admin._apps:
-    cred = credentials.Certificate("C:/Users/Brandon/OneDrive - University of North Georgia/Desktop/RiftIQ/config/serviceAccountKey.json")
-    firebase_admin.initialize_app(cred, {
-        "databaseURL": "https://riftiq-d9da8-default-rtdb.firebaseio.com"
-    })
+if os.getenv("STORAGE_BACKEND", "firebase") != "sqlite":
+    import firebase_admin
+    from firebase_admin import credentials
+    if not firebase_admin._apps:
+        cred = credentials.Certificate("C:/Users/Brandon/OneDrive - University of North Georgia/Desktop/RiftIQ/config/serviceAccountKey.json")
+        firebase_admin.initialize_app(cred, {
+            "databaseURL": "https://riftiq-d9da8-default-rtdb.firebaseio.com"
+        })
+
+from storage import storage
+
+# Per-match targets used by the performance score
+PERFORMANCE_THRESHOLDS = {
+    "kills": 6,
+    "deaths": 5,
+    "assists": 7,
+    "cs_per_minute": 6.5,
+}
+
+# Points for each metric as (threshold met, threshold missed)
+PERFORMANCE_WEIGHTS = {
+    "kills": (4, -2),
+    "deaths": (4, -4),
+    "assists": (2, 0),
+    "cs_per_minute": (2, -2),
+    "win": (6, 0),
+}
+
+# MMR adjustment per point of average performance score
+MMR_PER_PERFORMANCE_POINT = 10
+
+# Columns of the array-backed match table used by the batch functions
+MATCH_TABLE_COLUMNS = ("kills", "deaths", "assists", "totalCS", "win", "game_duration", "user_index")
+
+# Feature store columns used as model features, in the order of extract_features_and_labels
+FEATURE_COLUMNS_FOR_TRAINING = ("kills", "deaths", "assists", "totalCS", "win")
 
 def get_user_data_from_database(user_id):
     """
@@ -19,21 +56,28 @@ def get_user_data_from_database(user_id):
     :param user_id: The ID of the user (e.g., Riot ID or unique key).
     :return: Dictionary containing user match history and MMR data.
     """
-    ref = db.reference(f"users/{user_id}")
-    user_data = ref.get()
+    user_data = storage.get_profile(user_id)
 
     if not user_data:
         raise ValueError(f"No data found for user {user_id}")
 
+    # Matches are stored separately from the profile, keyed by start timestamp
+    user_data["match_history"] = storage.get_user_matches(user_id)
+
     return user_data
 
-def extract_features_and_labels(user_data):
+def extract_features_and_labels(user_data, labels_by_puuid=None):
     """
     Extract features and labels from user match data.
 
-    :param user_data: Dictionary containing user match history and mmr data.
+    :param user_data: Dictionary containing user match history and mmr data, or a
+        FeatureSelection read from the feature store (see FeatureStore.select).
+    :param labels_by_puuid: For a FeatureSelection, the estimated MMR of each PUUID.
     :return: Features (X) and labels (y) as numpy arrays.
     """
+    if isinstance(user_data, FeatureSelection):
+        return extract_features_and_labels_from_store(user_data, labels_by_puuid or {})
+
     match_history = user_data.get("match_history", [])
     mmr_data = user_data.get("mmr_data", {})
 
@@ -59,80 +103,167 @@ def extract_features_and_labels(user_data):
     # Convert to numpy arrays
     return np.array(features), np.array(labels)
 
-def split_data(X, y, test_size=0.2, random_state=42):
+def extract_features_and_labels_from_store(selection, labels_by_puuid):
+    """
+    Build features and labels straight from the memory-mapped feature store columns.
+
+    :param selection: FeatureSelection of the rows to use.
+    :param labels_by_puuid: Estimated MMR of each PUUID; rows of other users get NaN.
+    :return: Features (X) and labels (y) as numpy arrays.
+    """
+    X = np.column_stack([selection[column] for column in FEATURE_COLUMNS_FOR_TRAINING])
+
+    # Look labels up once per user rather than once per row
+    puuids, user_index = np.unique(selection["puuid"], return_inverse=True)
+    user_labels = np.array(
+        [labels_by_puuid.get(puuid.decode(), np.nan) for puuid in puuids], dtype=np.float64
+    )
+    return X, user_labels[user_index]
+
+def split_data(X, y=None, test_size=0.2, random_state=42):
     """
     Split features and labels into training and testing sets.
 
-    :param X: Features.
-    :param y: Labels.
+    A FeatureSelection is split by row number instead, returning training and testing
+    selections whose columns are only read from disk when used.
+
+    :param X: Features, or a FeatureSelection.
+    :param y: Labels (unused for a FeatureSelection).
     :param test_size: Proportion of data to reserve for testing.
     :param random_state: Random seed for reproducibility.
     :return: Training and testing sets.
     """
+    if isinstance(X, FeatureSelection):
+        train_rows, test_rows = train_test_split(X.row_numbers(), test_size=test_size, random_state=random_state)
+        return X.subset(np.sort(train_rows)), X.subset(np.sort(test_rows))
+
     X_train, X_test, y_train, y_test = train_test_split(X, y, test_size=test_size, random_state=random_state)
     return X_train, X_test, y_train, y_test
 
-def calculate_performance_score(user_stats, game_duration):
+def calculate_performance_score(user_stats, game_duration, thresholds=None, weights=None):
     """
     Calculate a performance score based on user match statistics.
 
     :param user_stats: Dictionary containing match metrics (kills, deaths, assists, CS, win).
     :param game_duration: Duration of the match in minutes.
+    :param thresholds: Optional overrides for PERFORMANCE_THRESHOLDS.
+    :param weights: Optional overrides for PERFORMANCE_WEIGHTS.
     :return: Weighted performance score.
     """
-    THRESHOLDS = {
-        "kills": 6,
-        "deaths": 5,
-        "assists": 7,
-        "cs_per_minute": 6.5,
-    }
+    THRESHOLDS = {**PERFORMANCE_THRESHOLDS, **(thresholds or {})}
+    WEIGHTS = {**PERFORMANCE_WEIGHTS, **(weights or {})}
 
     score = 0
 
     # Calculate CS/min
     cs_per_minute = user_stats.get("totalCS", 0) / max(game_duration, 1)  # Avoid division by zero
 
-    # Weighted contributions
-    if user_stats.get("kills", 0) >= THRESHOLDS["kills"]:
-        score += 4  # Good kills add 4 points
-    else:
-        score -= 2  # Low kills subtract 2 points
+    # Weighted contributions: (points when the threshold is met, points when it is missed)
+    met = {
+        "kills": user_stats.get("kills", 0) >= THRESHOLDS["kills"],
+        "deaths": user_stats.get("deaths", 0) <= THRESHOLDS["deaths"],
+        "assists": user_stats.get("assists", 0) >= THRESHOLDS["assists"],
+        "cs_per_minute": cs_per_minute >= THRESHOLDS["cs_per_minute"],
+        "win": bool(user_stats.get("win", False)),
+    }
+    for metric, (met_points, missed_points) in WEIGHTS.items():
+        score += met_points if met[metric] else missed_points
+
+    return score
+
+def matches_to_table(match_histories):
+    """
+    Flatten the match histories of several users into an array-backed match table.
+
+    :param match_histories: List of match history lists, one per user.
+    :return: Dictionary of column name -> numpy array, with user_index pointing into match_histories.
+    """
+    rows = [
+        (
+            user_stats.get("kills", 0),
+            user_stats.get("deaths", 0),
+            user_stats.get("assists", 0),
+            user_stats.get("totalCS", 0),
+            1 if user_stats.get("win", False) else 0,
+            match.get("game_duration", 1),
+            user_index,
+        )
+        for user_index, match_history in enumerate(match_histories)
+        for match in match_history
+        for user_stats in [match.get("user_data", {})]
+    ]
+    columns = np.array(rows, dtype=np.float64).reshape(-1, len(MATCH_TABLE_COLUMNS)).T
+    table = dict(zip(MATCH_TABLE_COLUMNS, columns))
+    table["user_index"] = table["user_index"].astype(np.int64)
+    return table
+
+def calculate_performance_scores_batch(matches, thresholds=None, weights=None):
+    """
+    Calculate the performance scores of many matches in one vectorized pass.
+
+    Gives the same scores as calculate_performance_score, match by match.
+
+    :param matches: Match table (dictionary of arrays or structured array) with kills, deaths,
+        assists, totalCS, win and game_duration columns.
+    :param thresholds: Optional overrides for PERFORMANCE_THRESHOLDS.
+    :param weights: Optional overrides for PERFORMANCE_WEIGHTS.
+    :return: Numpy array of performance scores.
+    """
+    THRESHOLDS = {**PERFORMANCE_THRESHOLDS, **(thresholds or {})}
+    WEIGHTS = {**PERFORMANCE_WEIGHTS, **(weights or {})}
+
+    cs_per_minute = np.asarray(matches["totalCS"], dtype=np.float64) / np.maximum(matches["game_duration"], 1)
+    met = {
+        "kills": np.asarray(matches["kills"]) >= THRESHOLDS["kills"],
+        "deaths": np.asarray(matches["deaths"]) <= THRESHOLDS["deaths"],
+        "assists": np.asarray(matches["assists"]) >= THRESHOLDS["assists"],
+        "cs_per_minute": cs_per_minute >= THRESHOLDS["cs_per_minute"],
+        "win": np.asarray(matches["win"]).astype(bool),
+    }
 
-    if user_stats.get("deaths", 0) <= THRESHOLDS["deaths"]:
-        score += 4  # Few deaths add 4 points
-    else:
-        score -= 4  # High deaths subtract 4 points
+    scores = np.zeros(len(cs_per_minute))
+    for metric, (met_points, missed_points) in WEIGHTS.items():
+        scores += np.where(met[metric], met_points, missed_points)
+    return scores
 
-    if user_stats.get("assists", 0) >= THRESHOLDS["assists"]:
-        score += 2  # High assists add 2 points
+def calculate_precise_mmr_batch(matches, displayed_ranks, thresholds=None, weights=None,
+                                mmr_per_point=MMR_PER_PERFORMANCE_POINT):
+    """
+    Calculate precise MMR values for many users at once.
+
+    Performance scores are computed for every match, averaged per user with grouped
+    reductions over user_index, and applied to each user's baseline MMR.
+
+    :param matches: Match table with the calculate_performance_scores_batch columns and user_index.
+    :param displayed_ranks: Displayed rank of each user, indexed by user_index (e.g., "DIAMOND IV").
+    :param thresholds: Optional overrides for PERFORMANCE_THRESHOLDS.
+    :param weights: Optional overrides for PERFORMANCE_WEIGHTS.
+    :param mmr_per_point: MMR adjustment per point of average performance score.
+    :return: Tuple of (performance score per match, precise MMR per user). Users with an
+        invalid rank get NaN and users without matches keep their baseline MMR.
+    """
+    scores = calculate_performance_scores_batch(matches, thresholds, weights)
 
-    if cs_per_minute >= THRESHOLDS["cs_per_minute"]:
-        score += 2  # Good CS/min adds 2 points
-    else:
-        score -= 2  # Poor CS/min subtracts 2 points
+    baseline_mmrs = np.array([
+        get_baseline_mmr(rank.replace("(", "").replace(")", "").strip()) if rank else None
+        for rank in displayed_ranks
+    ], dtype=np.float64)  # None becomes NaN
 
-    if user_stats.get("win", False):
-        score += 6  # Winning adds 6 points
+    user_index = np.asarray(matches["user_index"], dtype=np.int64)
+    score_sums = np.bincount(user_index, weights=scores, minlength=len(baseline_mmrs))
+    match_counts = np.bincount(user_index, minlength=len(baseline_mmrs))
+    avg_scores = np.divide(score_sums, match_counts, out=np.zeros(len(baseline_mmrs)), where=match_counts > 0)
 
-    return score
+    return scores, np.round(baseline_mmrs + avg_scores * mmr_per_point)
 
 def get_baseline_mmr(displayed_rank):
     """
     Get the baseline MMR for a user's displayed rank.
 
     :param displayed_rank: User's displayed rank (e.g., "DIAMOND IV").
-    :return: Baseline MMR value.
-    """
-    RANK_TO_MMR = {
-        "IRON IV": 100, "IRON III": 200, "IRON II": 300, "IRON I": 400,
-        "BRONZE IV": 500, "BRONZE III": 600, "BRONZE II": 700, "BRONZE I": 800,
-        "SILVER IV": 900, "SILVER III": 1000, "SILVER II": 1100, "SILVER I": 1200,
-        "GOLD IV": 1300, "GOLD III": 1400, "GOLD II": 1500, "GOLD I": 1600,
-        "PLATINUM IV": 1700, "PLATINUM III": 1800, "PLATINUM II": 1900, "PLATINUM I": 2000,
-        "DIAMOND IV": 2100, "DIAMOND III": 2200, "DIAMOND II": 2300, "DIAMOND I": 2400,
-        "MASTER": 2500, "GRANDMASTER": 2800, "CHALLENGER": 3200
-    }
-    return RANK_TO_MMR.get(displayed_rank.upper(), None)
+    :return: Baseline MMR value (the bottom of the rank on the shared ladder).
+    """
+    return mmr_for_rank(displayed_rank)
 
 def calculate_precise_mmr(displayed_rank, performance_scores):
     """
@@ -152,7 +283,7 @@ def calculate_precise_mmr(displayed_rank, performance_scores):
     avg_performance_score = sum(performance_scores) / len(performance_scores)
 
     # Fine-tune MMR (adjust by 10 points per performance score unit)
-    precise_mmr = baseline_mmr + (avg_performance_score * 10)
+    precise_mmr = baseline_mmr + (avg_performance_score * MMR_PER_PERFORMANCE_POINT)
     return round(precise_mmr)
 
 if __name__ == "__main__":
@@ -162,15 +293,12 @@ if __name__ == "__main__":
     # Fetch user data from the database
     user_data = get_user_data_from_database(user_id)
 
-    # Extract features and calculate performance scores
-    performance_scores = []
-    for match in user_data["match_history"]:
-        stats = match["user_data"]
-        game_duration = stats.pop("game_duration", 1)  # Extract and remove game duration
-        performance_scores.append(calculate_performance_score(stats, game_duration))
-
-    # Calculate precise MMR
+    # Score every match and calculate the precise MMR in one vectorized pass
+    matches = matches_to_table([user_data["match_history"]])
     displayed_rank = user_data["mmr_data"]["rank_label"]
-    precise_mmr = calculate_precise_mmr(displayed_rank, performance_scores)
+    performance_scores, precise_mmrs = calculate_precise_mmr_batch(matches, [displayed_rank])
+    if np.isnan(precise_mmrs[0]):
+        raise ValueError(f"Invalid displayed rank: {displayed_rank}")
+    precise_mmr = int(precise_mmrs[0])
 
     print(f"Precise MMR for {user_id}: {precise_mmr}")
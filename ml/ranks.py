@@ -0,0 +1,91 @@
+import bisect
+import numpy as np
+
+TIERS = ("IRON", "BRONZE", "SILVER", "GOLD", "PLATINUM", "EMERALD", "DIAMOND")
+DIVISIONS = ("IV", "III", "II", "I")
+
+# Tiers without divisions, with the MMR width of each
+APEX_TIERS = (("MASTER", 400), ("GRANDMASTER", 400), ("CHALLENGER", 400))
+
+# MMR width of each tier division
+DIVISION_MMR = 100
+
+
+def _build_rank_ladder():
+    """
+    Build the ladder of (rank, lowest MMR, highest MMR), from IRON IV upwards.
+    """
+    ladder = []
+    lower = 1
+    for tier in TIERS:
+        for division in DIVISIONS:
+            ladder.append((f"{tier} {division}", lower, lower + DIVISION_MMR - 1))
+            lower += DIVISION_MMR
+    for tier, width in APEX_TIERS:
+        ladder.append((tier, lower, lower + width - 1))
+        lower += width
+    return tuple(ladder)
+
+
+RANK_LADDER = _build_rank_ladder()
+RANK_NAMES = tuple(rank for rank, _, _ in RANK_LADDER)
+RANK_RANGES = {rank: (lower, upper) for rank, lower, upper in RANK_LADDER}
+MIN_MMR = RANK_LADDER[0][1]
+MAX_MMR = RANK_LADDER[-1][2]
+
+# Sorted lower bounds, searched with bisect (one value) or searchsorted (arrays)
+_LOWER_BOUNDS = [lower for _, lower, _ in RANK_LADDER]
+RANK_LOWER_BOUNDS = np.array(_LOWER_BOUNDS, dtype=np.float64)
+_RANK_NAMES_OR_NONE = np.array(RANK_NAMES + (None,), dtype=object)
+
+
+def normalize_rank(rank):
+    """
+    Normalize a displayed rank (e.g., "gold ii", "(GOLD II)" or "MASTER I") to a ladder name.
+
+    :return: The ladder name, or None if the rank is not on the ladder.
+    """
+    rank = " ".join(rank.replace("(", "").replace(")", "").upper().split())
+    tier = rank.split(" ", 1)[0]
+    if any(tier == apex_tier for apex_tier, _ in APEX_TIERS):
+        rank = tier  # Apex tiers are reported with a division ("MASTER I") but have none
+    return rank if rank in RANK_RANGES else None
+
+
+def rank_for_mmr(mmr):
+    """
+    Find the rank of an MMR value.
+
+    :return: Ladder name (e.g., "GOLD II"), or None if the MMR is off the ladder.
+    """
+    if mmr is None or not MIN_MMR <= mmr <= MAX_MMR:
+        return None
+    return RANK_NAMES[bisect.bisect_right(_LOWER_BOUNDS, mmr) - 1]
+
+
+def ranks_for_mmrs(mmrs):
+    """
+    Find the ranks of many MMR values in one vectorized search.
+
+    :param mmrs: Array-like of MMR values.
+    :return: Numpy object array of ladder names, with None for MMRs off the ladder.
+    """
+    mmrs = np.asarray(mmrs, dtype=np.float64)
+    index = np.searchsorted(RANK_LOWER_BOUNDS, mmrs, side="right") - 1
+    index[~((mmrs >= MIN_MMR) & (mmrs <= MAX_MMR))] = -1  # Also catches NaN
+    return _RANK_NAMES_OR_NONE[index]
+
+
+def mmr_for_rank(rank, lp=0):
+    """
+    Map a rank and LP to an MMR value inside that rank's range.
+
+    :param rank: Displayed rank (e.g., "DIAMOND IV" or "MASTER I").
+    :param lp: League points, clamped to the width of the rank.
+    :return: MMR value, or None if the rank is not on the ladder.
+    """
+    rank = normalize_rank(rank)
+    if rank is None:
+        return None
+    lower, upper = RANK_RANGES[rank]
+    return lower + min(max(int(lp or 0), 0), upper - lower)
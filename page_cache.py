@@ -0,0 +1,58 @@
+import os
+import uuid
+from cache_utils import LRUCache
+
+# Number of users whose rendered profile pages are kept, and how long a page may be served
+PROFILE_PAGE_CACHE_SIZE = int(os.getenv("PROFILE_PAGE_CACHE_SIZE", "500"))
+PROFILE_PAGE_CACHE_TTL = float(os.getenv("PROFILE_PAGE_CACHE_TTL", "60"))
+
+
+def new_page_version():
+    """
+    New value for a profile's `page_version` field. Every write that changes what the
+    profile page shows (matches, ranks, aggregates, lobby ranks) stores a new one.
+    """
+    return uuid.uuid4().hex
+
+
+def page_version(profile):
+    """
+    Version stamp of a profile's page: its `page_version`, or `last_updated` for
+    profiles saved before page versions were stored.
+    """
+    profile = profile or {}
+    return profile.get("page_version") or profile.get("last_updated")
+
+
+class PageCache:
+    """
+    Rendered pages per user, each valid only while the user's version stamp (see
+    page_version) is unchanged. Writers in this process invalidate a user directly;
+    writes from other processes (e.g. worker.py) are picked up by the version check,
+    since every writer stores a new page_version.
+    """
+
+    def __init__(self, capacity=PROFILE_PAGE_CACHE_SIZE, ttl=PROFILE_PAGE_CACHE_TTL):
+        self._pages = LRUCache(capacity, ttl)  # user_id -> (version, {variant: page})
+
+    def get(self, user_id, version, variant):
+        """
+        Return the cached page for a user and variant (e.g., Riot ID spelling and region),
+        or None if it is missing or was rendered for another version.
+        """
+        entry = self._pages.get(user_id)
+        if entry is None or entry[0] != version:
+            return None
+        return entry[1].get(variant)
+
+    def put(self, user_id, version, variant, page):
+        entry = self._pages.get(user_id)
+        variants = dict(entry[1]) if entry is not None and entry[0] == version else {}
+        variants[variant] = page
+        self._pages.put(user_id, (version, variants))
+
+    def invalidate(self, user_id):
+        self._pages.pop(user_id)
+
+
+profile_pages = PageCache()
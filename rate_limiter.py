@@ -0,0 +1,157 @@
+import threading
+import time
+from collections import deque
+
+# Limits applied until Riot tells us otherwise (development key defaults)
+DEFAULT_APP_RATE_LIMIT = "20:1,100:120"
+
+# Wait used after a 429 that did not include a Retry-After header
+DEFAULT_RETRY_AFTER = 1
+
+
+def parse_rate_limit_header(value):
+    """
+    Parse a Riot rate limit header (e.g. "20:1,100:120") into (limit, window_seconds) pairs.
+    """
+    limits = []
+    for part in (value or "").split(","):
+        try:
+            limit, window = part.strip().split(":")
+            limits.append((int(limit), int(window)))
+        except ValueError:
+            continue
+    return limits
+
+
+class RateWindow:
+    """
+    Tracks the requests sent inside one rate limit window (e.g. 100 requests per 120 seconds).
+
+    Request times are kept as a sliding log rather than a refilling bucket, since a
+    bucket that refills continuously can overshoot Riot's fixed windows.
+    """
+
+    def __init__(self, limit, window):
+        self.limit = limit
+        self.window = window
+        self.sent = deque()  # Request times, oldest first
+
+    def _expire(self, now):
+        cutoff = now - self.window
+        while self.sent and self.sent[0] <= cutoff:
+            self.sent.popleft()
+
+    def wait_time(self, now):
+        """Seconds until another request fits in this window."""
+        self._expire(now)
+        if len(self.sent) < self.limit:
+            return 0
+        return self.sent[len(self.sent) - self.limit] + self.window - now
+
+    def record(self, now):
+        self.sent.append(now)
+
+    def sync_count(self, count, now):
+        """Account for requests Riot has seen that this process did not send (other workers)."""
+        self._expire(now)
+        missing = min(count, self.limit) - len(self.sent)
+        if missing > 0:
+            # `now` is the newest time seen, so appending keeps the log sorted
+            self.sent.extend([now] * missing)
+
+
+class RateLimiter:
+    """
+    Schedules Riot API requests so they stay inside the app and method rate limits.
+
+    Limits are tracked separately for every routing value (americas, europe, asia,
+    sea and each platform such as na1 or euw1), since Riot enforces them per routing
+    host. The advertised limits are read from each response and 429 responses block
+    the routing value (or just the method) for the Retry-After duration.
+    """
+
+    def __init__(self, app_rate_limit=DEFAULT_APP_RATE_LIMIT):
+        self._lock = threading.Lock()
+        self._default_app_limits = parse_rate_limit_header(app_rate_limit)
+        self._app_windows = {}  # routing -> [RateWindow]
+        self._method_windows = {}  # (routing, method) -> [RateWindow]
+        self._blocked_until = {}  # routing or (routing, method) -> monotonic time
+
+    def _windows_for(self, routing, method):
+        app_windows = self._app_windows.setdefault(
+            routing, [RateWindow(limit, window) for limit, window in self._default_app_limits]
+        )
+        return app_windows + self._method_windows.get((routing, method), [])
+
+    def try_acquire(self, routing, method):
+        """
+        Reserve a request slot if one is free.
+
+        :return: 0 if the request may be sent now, otherwise the number of seconds to wait.
+        """
+        with self._lock:
+            now = time.monotonic()
+            blocked_until = max(
+                self._blocked_until.get(routing, 0),
+                self._blocked_until.get((routing, method), 0),
+            )
+            wait = max([blocked_until - now] + [w.wait_time(now) for w in self._windows_for(routing, method)])
+            if wait > 0:
+                return wait
+
+            for window in self._windows_for(routing, method):
+                window.record(now)
+            return 0
+
+    def acquire(self, routing, method):
+        """
+        Block until a request to the given routing value and method is allowed.
+        """
+        while True:
+            wait = self.try_acquire(routing, method)
+            if not wait:
+                return
+            time.sleep(wait)
+
+    def update_from_response(self, routing, method, response):
+        """
+        Apply the rate limit headers of a Riot response to the routing value and method.
+        """
+        headers = response.headers
+        with self._lock:
+            now = time.monotonic()
+            self._apply_limits(self._app_windows, routing, headers.get("X-App-Rate-Limit"),
+                               headers.get("X-App-Rate-Limit-Count"), now)
+            self._apply_limits(self._method_windows, (routing, method), headers.get("X-Method-Rate-Limit"),
+                               headers.get("X-Method-Rate-Limit-Count"), now)
+
+            if response.status_code == 429:
+                try:
+                    retry_after = float(headers.get("Retry-After", DEFAULT_RETRY_AFTER))
+                except ValueError:
+                    retry_after = DEFAULT_RETRY_AFTER
+
+                # Method limits only block that method; app and service limits block the whole host
+                key = (routing, method) if headers.get("X-Rate-Limit-Type") == "method" else routing
+                self._blocked_until[key] = max(self._blocked_until.get(key, 0), now + retry_after)
+                return retry_after
+        return 0
+
+    @staticmethod
+    def _apply_limits(windows_by_key, key, limit_header, count_header, now):
+        limits = parse_rate_limit_header(limit_header)
+        if not limits:
+            return
+
+        existing = {w.window: w for w in windows_by_key.get(key, [])}
+        windows = []
+        for limit, window in limits:
+            rate_window = existing.get(window) or RateWindow(limit, window)
+            rate_window.limit = limit
+            windows.append(rate_window)
+        windows_by_key[key] = windows
+
+        counts = dict((window, count) for count, window in parse_rate_limit_header(count_header))
+        for rate_window in windows:
+            if rate_window.window in counts:
+                rate_window.sync_count(counts[rate_window.window], now)
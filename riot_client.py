@@ -2,11 +2,22 @@ import os
 import requests
 from dotenv import load_dotenv
 from datetime import datetime, timezone, timedelta
-from collections import Counter
-from firebase_admin import db 
-from config import firebase_config # import to initialize db
 import re
-from flask import session
+import base64
+import time
+from collections import deque
+from concurrent.futures import Future, ThreadPoolExecutor
+from rate_limiter import RateLimiter
+from http_pool import RETRY_BACKOFF_FACTOR, RETRY_STATUS_CODES, SessionPool
+from match_cache import MatchCache
+from singleflight import single_flight
+from ml.feature_store import FeatureStore
+from ml.ranks import mmr_for_rank, rank_for_mmr
+from page_cache import new_page_version, profile_pages
+from identity_cache import MISSING, identity_cache
+from lp_history import record_lp_snapshot
+from job_queue import report_progress
+from storage import storage, match_sort_key
 
 PLATFORM_TO_GLOBAL = {
     "na1": "americas",
@@ -26,6 +37,13 @@ PLATFORM_TO_GLOBAL = {
 season_start_date = datetime(2024, 9, 25)
 season_start_timestamp = int(season_start_date.timestamp() * 1000)
 
+# Ranked Solo/Duo queue; ingestion only lists match IDs from this queue
+RANKED_SOLO_QUEUE_ID = 420
+
+# Aggregate keys for matches in the tracked season and before it
+CURRENT_SEASON = season_start_date.strftime("%Y-%m-%d")
+EARLIER_SEASONS = "earlier"
+
 # Load environment variables
 load_dotenv()
 RIOT_API_KEY = os.getenv("RIOT_API_KEY")
@@ -33,19 +51,135 @@ RIOT_API_KEY = os.getenv("RIOT_API_KEY")
 if not RIOT_API_KEY:
     raise Exception("Riot API key not found. Please add it to your .env file as RIOT_API_KEY.")
 
+# Base URL for Riot endpoints; point this at a local stub server for testing
+RIOT_API_BASE_URL = os.getenv("RIOT_API_BASE_URL", "https://{region}.api.riotgames.com")
+
+# Number of match-detail requests allowed in flight at once
+MATCH_FETCH_WORKERS = int(os.getenv("MATCH_FETCH_WORKERS", "8"))
+
+# How many times a request is retried after being rate limited (429)
+MAX_RATE_LIMIT_RETRIES = int(os.getenv("MAX_RATE_LIMIT_RETRIES", "3"))
+
+# Number of match payloads kept in memory, and whether they are also persisted under matches/
+MATCH_CACHE_SIZE = int(os.getenv("MATCH_CACHE_SIZE", "2000"))
+MATCH_CACHE_PERSIST = os.getenv("MATCH_CACHE_PERSIST", "1") == "1"
+
+# Seconds to wait for a Riot response before giving up
+REQUEST_TIMEOUT = float(os.getenv("RIOT_REQUEST_TIMEOUT", "10"))
+
+# Shared scheduler that keeps every Riot call inside the app and method rate limits
+rate_limiter = RateLimiter(os.getenv("RIOT_APP_RATE_LIMIT", "20:1,100:120"))
+
+# Keep-alive sessions per routing host, sized so every fetch worker can hold a connection
+session_pool = SessionPool(pool_size=MATCH_FETCH_WORKERS)
+
+# Index the match details of all ten participants of every downloaded ranked match under
+# puuid_matches/, so lobby-mates searched later need no detail downloads
+LOBBY_INGESTION = os.getenv("LOBBY_INGESTION", "1") == "1"
+
+# Most recent indexed matches read for a player when fetching their match details
+LOBBY_INDEX_READ_LIMIT = int(os.getenv("LOBBY_INDEX_READ_LIMIT", "100"))
+
+# League lookups allowed per lobby rank job; lobbies left incomplete are finished by the next job
+LOBBY_RANK_LOOKUP_BUDGET = int(os.getenv("LOBBY_RANK_LOOKUP_BUDGET", "40"))
+
+# Number of the latest matches whose lobby ranks a job fills in
+LOBBY_RANK_MATCHES = 20
+
+# Local columnar store of per-match features for training; disabled when unset
+FEATURE_STORE_DIR = os.getenv("FEATURE_STORE_DIR")
+feature_store = FeatureStore(FEATURE_STORE_DIR) if FEATURE_STORE_DIR else None
+
+
+def get_global_region(region):
+    """
+    Resolve a platform region (e.g. "euw1") or a regional routing value (e.g. "europe")
+    to the regional routing value used by the account and match endpoints.
+    """
+    if region in PLATFORM_TO_GLOBAL.values():
+        return region
+    return PLATFORM_TO_GLOBAL.get(region, "americas")  # Default to americas if region is not mapped
+
+
+def build_api_url(region, path):
+    """
+    Build a Riot API URL for the given routing value (platform or regional).
+    """
+    return f"{RIOT_API_BASE_URL.format(region=region)}{path}"
+
+
+def riot_get(region, path, method, params=None):
+    """
+    Send a GET request to the Riot API through the shared rate limiter.
+
+    Requests wait for a free slot in the app and method limits of the routing value,
+    reuse the routing host's pooled connection, and 429 responses are retried after
+    the Retry-After delay and 5xx responses with exponential backoff. Every attempt
+    takes its own rate limiter slot, since Riot counts it against the limits.
+
+    :param region: Routing value the request is sent to (e.g. "americas" or "na1").
+    :param path: Endpoint path, starting with "/".
+    :param method: Name of the endpoint, used for the per-method limits.
+    :param params: Optional query parameters.
+    :return: The final `requests.Response`.
+    """
+    url = build_api_url(region, path)
+    headers = {"X-Riot-Token": RIOT_API_KEY}
+
+    for attempt in range(MAX_RATE_LIMIT_RETRIES + 1):
+        rate_limiter.acquire(region, method)
+        session = session_pool.get_session(region)
+        response = session.get(url, headers=headers, params=params, timeout=REQUEST_TIMEOUT)
+        retry_after = rate_limiter.update_from_response(region, method, response)
+        if response.status_code == 429:
+            print(f"Rate limited on {region} ({method}), retrying in {retry_after}s (attempt {attempt + 1}).")
+            continue
+        if response.status_code in RETRY_STATUS_CODES and attempt < MAX_RATE_LIMIT_RETRIES:
+            time.sleep(RETRY_BACKOFF_FACTOR * 2 ** attempt)
+            continue
+        break
+    return response
+
+
+def get_pool_stats():
+    """
+    Connection reuse statistics for each Riot routing host.
+    """
+    return session_pool.stats()
+
+
+def get_identity_cache_stats():
+    """
+    Hit and miss counts of the account, summoner and league caches.
+    """
+    return identity_cache.stats()
+
 
+@single_flight(lambda game_name, tag_line, region="na1": ("account", game_name.lower(), tag_line.lower(), region))
 def get_account_by_riot_id(game_name, tag_line, region="na1"):
     """
     Fetch account information using Riot ID (gameName + tagLine).
+
+    Accounts are served from the identity cache, and Riot IDs that do not exist are
+    remembered for a while so repeated lookups of them cost no calls.
     """
-    global_region = PLATFORM_TO_GLOBAL.get(region, "americas")  # Default to americas if region is not mapped
-    url = f"https://{global_region}.api.riotgames.com/riot/account/v1/accounts/by-riot-id/{game_name}/{tag_line}"
-    headers = {"X-Riot-Token": RIOT_API_KEY}
+    account_data = identity_cache.get_account(game_name, tag_line)
+    if account_data is MISSING:
+        print(f"Riot ID {game_name}#{tag_line} not found (cached).")
+        return None
+    if account_data is not None:
+        return account_data
+
+    global_region = get_global_region(region)
+    path = f"/riot/account/v1/accounts/by-riot-id/{game_name}/{tag_line}"
 
     try:
-        response = requests.get(url, headers=headers)
+        response = riot_get(global_region, path, "account-v1.by-riot-id")
+        if response.status_code == 404:
+            identity_cache.put_missing_account(game_name, tag_line)
         response.raise_for_status()
         account_data = response.json()
+        identity_cache.put_account(game_name, tag_line, account_data)
         return account_data
     except requests.exceptions.HTTPError as http_err:
         print(f"HTTP error occurred: {http_err} - {response.text}")
@@ -54,17 +188,41 @@ def get_account_by_riot_id(game_name, tag_line, region="na1"):
     return None
 
 
-def get_match_history_paged(puuid, start=0, count=20, region="americas"):
+def build_match_history_params(start, count, start_time=None, end_time=None, queue=None, match_type=None):
     """
-    Fetch paged match history for the user.
+    Build the query parameters of a match ID list request, leaving out unset filters.
     """
-    global_region = PLATFORM_TO_GLOBAL.get(region, "americas")
-    url = f"https://{global_region}.api.riotgames.com/lol/match/v5/matches/by-puuid/{puuid}/ids"
-    headers = {"X-Riot-Token": RIOT_API_KEY}
     params = {"start": start, "count": count}
+    if start_time is not None:
+        params["startTime"] = start_time
+    if end_time is not None:
+        params["endTime"] = end_time
+    if queue is not None:
+        params["queue"] = queue
+    if match_type is not None:
+        params["type"] = match_type
+    return params
+
+
+def get_match_history_paged(puuid, start=0, count=20, region="americas", start_time=None, end_time=None,
+                            queue=None, match_type=None):
+    """
+    Fetch paged match history for the user.
+
+    The filters are applied by the Riot API, so matches outside them are never listed
+    and their details never downloaded.
+
+    :param start_time: Only list matches played at or after this epoch time (seconds).
+    :param end_time: Only list matches played before this epoch time (seconds).
+    :param queue: Only list matches from this queue ID (e.g. RANKED_SOLO_QUEUE_ID).
+    :param match_type: Only list matches of this type (e.g. "ranked" or "normal").
+    """
+    global_region = get_global_region(region)
+    path = f"/lol/match/v5/matches/by-puuid/{puuid}/ids"
+    params = build_match_history_params(start, count, start_time, end_time, queue, match_type)
 
     try:
-        response = requests.get(url, headers=headers, params=params)
+        response = riot_get(global_region, path, "match-v5.ids", params=params)
         response.raise_for_status()
         return response.json()
     except requests.exceptions.HTTPError as http_err:
@@ -74,69 +232,59 @@ def get_match_history_paged(puuid, start=0, count=20, region="americas"):
     return []
 
 
-def get_user_match_details(puuid, match_id, region="na1"):
+def load_match_payload(match_id):
     """
-    Fetch detailed match information for a specific match filtered by the user's PUUID,
-    and calculate the average rank of the lobby.
+    Load a persisted match payload from the shared `matches/{match_id}` node.
     """
-    global_region = PLATFORM_TO_GLOBAL.get(region, "americas")  # Use regional routing for match details
-    platform_region = region 
-    url = f"https://{global_region}.api.riotgames.com/lol/match/v5/matches/{match_id}"
-    headers = {"X-Riot-Token": RIOT_API_KEY}
+    return storage.get_match_payload(match_id)
+
+
+def store_match_payload(match_id, payload):
+    """
+    Persist a match payload to the shared `matches/{match_id}` node.
+    """
+    storage.put_match_payload(match_id, payload)
+
+
+match_cache = MatchCache(
+    capacity=MATCH_CACHE_SIZE,
+    load=load_match_payload if MATCH_CACHE_PERSIST else None,
+    store=store_match_payload if MATCH_CACHE_PERSIST else None,
+)
+
+
+@single_flight(lambda match_id, region="na1": ("match", match_id))
+def get_match_payload(match_id, region="na1"):
+    """
+    Fetch the match payload (game info and raw participants) for a match, served from the
+    match cache when it has been downloaded before.
+
+    :return: Dictionary with gameMode, gameDuration, timestamps and participants, or None on error.
+    """
+    payload = match_cache.get(match_id)
+    if payload is not None:
+        return payload
+
+    global_region = get_global_region(region)  # Use regional routing for match details
+    path = f"/lol/match/v5/matches/{match_id}"
 
     try:
-        response = requests.get(url, headers=headers)
+        response = riot_get(global_region, path, "match-v5.match")
         response.raise_for_status()
-        match_data = response.json()
-
-        # Filter out non-Ranked Solo/Duo matches
-        game_mode = match_data["info"].get("gameMode", "")
-        if game_mode != "CLASSIC":
-            print(f"Skipping non-Ranked Solo/Duo match: {match_id} with gameMode: {game_mode}")
-            return None
-
-        # Locate the participant data for the given PUUID
-        participants = match_data["info"]["participants"]
-        user_participant = next((p for p in participants if p["puuid"] == puuid), None)
-
-        if not user_participant:
-            print(f"No participant found for PUUID {puuid} in match {match_id}.")
-            return None
-
-        # Format champion name and retrieve champion icon URL
-        champion_name = user_participant.get("championName", "Unknown")
-        champion_icon = get_champion_icon(champion_name)
-
-        # Safe access to game_start_timestamp and game_end_timestamp
-        game_start_timestamp = match_data["info"].get("gameStartTimestamp", None)
-        game_end_timestamp = match_data["info"].get("gameEndTimestamp", None)
-        game_time_ago = calculate_time_ago(game_end_timestamp)
-
-        total_minions_killed = user_participant.get("totalMinionsKilled", 0)
-        neutral_minions_killed = user_participant.get("neutralMinionsKilled", 0)
-
-        # Sum lane minions and neutral minions for total CS
-        total_cs = total_minions_killed + neutral_minions_killed
-
-        # Construct match details
-        match_details = {
-            "match_id": match_id,
-            "game_mode": game_mode,
-            "game_duration": match_data["info"].get("gameDuration", 0) // 60,  # Convert seconds to minutes
-            "game_start_timestamp": game_start_timestamp,  # Include gameStartTimestamp
-            "game_time_ago": game_time_ago,
-            "user_data": {
-                "championName": champion_name,
-                "champion_icon": champion_icon,
-                "puuid" : puuid,
-                "kills": user_participant.get("kills", 0),
-                "deaths": user_participant.get("deaths", 0),
-                "assists": user_participant.get("assists", 0),
-                "totalCS": total_cs,  # Corrected CS calculation
-                "win": user_participant.get("win", False),
-            },
+        match_info = response.json()["info"]
+
+        payload = {
+            "gameMode": match_info.get("gameMode", ""),
+            "queueId": match_info.get("queueId"),
+            "gameDuration": match_info.get("gameDuration", 0),
+            "gameStartTimestamp": match_info.get("gameStartTimestamp"),
+            "gameEndTimestamp": match_info.get("gameEndTimestamp"),
+            "participants": match_info.get("participants", []),
         }
-        return match_details
+        match_cache.put(match_id, payload)
+        invalidate_lobby_leagues(payload)
+        index_lobby_match(match_id, payload)
+        return payload
 
     except requests.exceptions.HTTPError as http_err:
         print(f"HTTP error occurred: {http_err} - {response.text}")
@@ -145,49 +293,253 @@ def get_user_match_details(puuid, match_id, region="na1"):
     return None
 
 
+def build_user_match_details(match_id, payload, puuid):
+    """
+    Derive the match details shown for one player from a match payload.
+
+    :return: Match details with the player's `user_data`, or None if they did not play in it.
+    """
+    # Locate the participant data for the given PUUID
+    participants = payload.get("participants") or []
+    user_participant = next((p for p in participants if p.get("puuid") == puuid), None)
+
+    if not user_participant:
+        print(f"No participant found for PUUID {puuid} in match {match_id}.")
+        return None
+
+    # Format champion name and retrieve champion icon URL
+    champion_name = user_participant.get("championName", "Unknown")
+    champion_icon = get_champion_icon(champion_name)
+
+    # Safe access to game_start_timestamp and game_end_timestamp
+    game_start_timestamp = payload.get("gameStartTimestamp", None)
+    game_end_timestamp = payload.get("gameEndTimestamp", None)
+    game_time_ago = calculate_time_ago(game_end_timestamp)
+
+    total_minions_killed = user_participant.get("totalMinionsKilled", 0)
+    neutral_minions_killed = user_participant.get("neutralMinionsKilled", 0)
+
+    # Sum lane minions and neutral minions for total CS
+    total_cs = total_minions_killed + neutral_minions_killed
+
+    # Construct match details
+    return {
+        "match_id": match_id,
+        "game_mode": payload.get("gameMode", ""),
+        "game_duration": payload.get("gameDuration", 0) // 60,  # Convert seconds to minutes
+        "game_start_timestamp": game_start_timestamp,  # Include gameStartTimestamp
+        "game_time_ago": game_time_ago,
+        "user_data": {
+            "championName": champion_name,
+            "champion_icon": champion_icon,
+            "puuid" : puuid,
+            "kills": user_participant.get("kills", 0),
+            "deaths": user_participant.get("deaths", 0),
+            "assists": user_participant.get("assists", 0),
+            "totalCS": total_cs,  # Corrected CS calculation
+            "win": user_participant.get("win", False),
+        },
+    }
+
+
+def invalidate_lobby_leagues(payload):
+    """
+    Drop the cached league entries of everyone in a newly downloaded match, since their
+    LP changed with it.
+    """
+    for participant in payload.get("participants") or []:
+        if participant.get("summonerId"):
+            identity_cache.invalidate_league(participant["summonerId"])
+
+
+def index_lobby_match(match_id, payload):
+    """
+    Store the match details of every participant of a freshly downloaded Ranked Solo/Duo
+    match in the per-PUUID match index, in one batch.
+    """
+    if not LOBBY_INGESTION or payload.get("queueId") != RANKED_SOLO_QUEUE_ID:
+        return
+
+    entries = []
+    for participant in payload.get("participants") or []:
+        puuid = participant.get("puuid")
+        match_details = build_user_match_details(match_id, payload, puuid) if puuid else None
+        if match_details:
+            entries.append((puuid, match_sort_key(match_details), match_details))
+
+    try:
+        if entries:
+            storage.save_puuid_matches(entries)
+    except Exception as e:
+        print(f"Failed to index lobby of match {match_id}: {e}")
+
+
+def load_indexed_matches(puuid):
+    """
+    Read a player's current-season matches from the per-PUUID match index.
+
+    :return: Dictionary of match ID to match details.
+    """
+    if not LOBBY_INGESTION:
+        return {}
+
+    try:
+        indexed_matches = storage.get_puuid_matches(
+            puuid, limit=LOBBY_INDEX_READ_LIMIT, start_at=f"{season_start_timestamp:013d}"
+        )
+    except Exception as e:
+        print(f"Failed to read indexed matches for {puuid}: {e}")
+        return {}
+
+    for match in indexed_matches:
+        match["game_time_ago"] = calculate_time_ago(match.get("game_start_timestamp"))
+    return {match["match_id"]: match for match in indexed_matches}
+
+
+def get_user_match_details(puuid, match_id, region="na1"):
+    """
+    Fetch detailed match information for a specific match filtered by the user's PUUID.
+    The average rank of the lobby is filled in later by `compute_lobby_ranks_job`.
+    """
+    payload = get_match_payload(match_id, region)
+    if not payload:
+        return None
+
+    # Filter out non-Ranked Solo/Duo matches
+    game_mode = payload.get("gameMode", "")
+    if game_mode != "CLASSIC":
+        print(f"Skipping non-Ranked Solo/Duo match: {match_id} with gameMode: {game_mode}")
+        return None
+
+    return build_user_match_details(match_id, payload, puuid)
+
+
 def get_most_played_champions(match_details, puuid):
     """
     Calculate the most played champions with win rates based on the match details.
     This will return the top 6 champions by games played, considering only the current season.
     """
+    aggregates = add_matches_to_aggregates({}, match_details)
+    return most_played_from_aggregates(aggregates.get(CURRENT_SEASON))
+
+
+def season_key(game_start_timestamp):
+    """
+    Aggregate key of the season a match was played in: the season's start date, or
+    EARLIER_SEASONS for matches before the tracked season.
+    """
+    if game_start_timestamp and game_start_timestamp >= season_start_timestamp:
+        return CURRENT_SEASON
+    return EARLIER_SEASONS
+
+
+def add_matches_to_aggregates(aggregates, matches):
+    """
+    Fold matches into a user's running aggregates.
 
-    champion_stats = Counter()
-    champion_wins = Counter()
+    Aggregates cover one contiguous range of match keys (`counted_range`), which grows
+    as newer and older matches are ingested, so matches inside it are never counted twice.
 
-    # Filter out matches before the current season (Sept 25, 2024)
-    for match in match_details:
-        match_start_timestamp = match.get("game_start_timestamp")  # gameStartTimestamp is used here
-        if match_start_timestamp and match_start_timestamp >= season_start_timestamp:  # Filter by season start
-            participant = match.get("user_data", {})
-            if participant:
-                champion_name = participant.get("championName")
-                champion_stats[champion_name] += 1
-                if participant.get("win"):
-                    champion_wins[champion_name] += 1
+    :param aggregates: Current aggregates (None for a new user); updated in place.
+    :param matches: Match details with user_data.
+    :return: The updated aggregates.
+    """
+    aggregates = aggregates or {}
+    counted_range = aggregates.get("counted_range")
+    new_keys = set()
+
+    for match in matches:
+        user_stats = match.get("user_data")
+        if not user_stats:
+            continue
+        key = match_sort_key(match)
+        if key in new_keys or (counted_range and counted_range["oldest"] <= key <= counted_range["newest"]):
+            continue
+        new_keys.add(key)
+
+        season = aggregates.setdefault(season_key(match.get("game_start_timestamp")), {})
+        win = 1 if user_stats.get("win") else 0
+        season["matches"] = season.get("matches", 0) + 1
+        season["wins"] = season.get("wins", 0) + win
+        for stat, field in (("kills", "kills"), ("deaths", "deaths"), ("assists", "assists"), ("cs", "totalCS")):
+            season[stat] = season.get(stat, 0) + user_stats.get(field, 0)
 
-    # Get the top 6 champions by games played
-    most_played = [
+        champion_name = user_stats.get("championName")
+        if champion_name:
+            champion = season.setdefault("champions", {}).setdefault(champion_name, {"games": 0, "wins": 0})
+            champion["games"] += 1
+            champion["wins"] += win
+
+    if new_keys:
+        if counted_range:
+            new_keys.update((counted_range["oldest"], counted_range["newest"]))
+        aggregates["counted_range"] = {"oldest": min(new_keys), "newest": max(new_keys)}
+    return aggregates
+
+
+def most_played_from_aggregates(season_aggregates, count=6):
+    """
+    Get the top champions by games played, with win rates, from a season's aggregates.
+    """
+    champions = (season_aggregates or {}).get("champions", {})
+    top_champions = sorted(champions.items(), key=lambda item: item[1]["games"], reverse=True)[:count]
+    return [
         {
             "champion": champ,
-            "games_played": count,
-            "winrate": f"{round((champion_wins[champ] / count) * 100, 2)}%" if count > 0 else "0%"
+            "games_played": stats["games"],
+            "winrate": f"{round((stats['wins'] / stats['games']) * 100, 2)}%" if stats["games"] > 0 else "0%"
         }
-        for champ, count in champion_stats.most_common(6)
+        for champ, stats in top_champions
     ]
-    return most_played
 
 
-def get_ranked_stats_by_summoner_id(summoner_id, platform_region="na1"):
+def record_user_aggregates(user_id, matches):
+    """
+    Add newly ingested matches to the user's aggregates and refresh their most played champions.
+
+    :return: The updated aggregates, or None if nothing was recorded.
+    """
+    if not matches:
+        return None
+
+    user_id = sanitize_user_id(user_id)
+    try:
+        aggregates = storage.update_aggregates(user_id, lambda current: add_matches_to_aggregates(current, matches))
+        storage.update_profile(user_id, {
+            "most_played_champions": most_played_from_aggregates(aggregates.get(CURRENT_SEASON)),
+            "page_version": new_page_version(),
+        })
+        profile_pages.invalidate(user_id)
+        return aggregates
+    except Exception as e:
+        print(f"Failed to update aggregates for user {user_id}: {e}")
+        return None
+
+
+def get_ranked_stats_by_summoner_id(summoner_id, platform_region="na1", use_cache=True, record_history=True):
     """
     Fetch ranked stats for a summoner by their encrypted summoner ID.
+
+    :param use_cache: Serve the entries from the identity cache when present; pass False
+        to always read the current entries (e.g. for scheduled LP snapshots).
+    :param record_history: Add the fetched rank to the summoner's LP history; pass False
+        for summoners who are not tracked (e.g. lobby-mates looked up for lobby ranks).
     """
-    url = f"https://{platform_region}.api.riotgames.com/lol/league/v4/entries/by-summoner/{summoner_id}"
-    headers = {"X-Riot-Token": RIOT_API_KEY}
+    if use_cache:
+        ranked_stats = identity_cache.get_league(summoner_id)
+        if ranked_stats is not None:
+            return ranked_stats
+
+    path = f"/lol/league/v4/entries/by-summoner/{summoner_id}"
 
     try:
-        response = requests.get(url, headers=headers)
+        response = riot_get(platform_region, path, "league-v4.by-summoner")
         response.raise_for_status()
         ranked_stats = response.json()
+        identity_cache.put_league(summoner_id, ranked_stats)
+        identity_cache.put_rank_mmr(summoner_id, solo_queue_mmr(ranked_stats))
+        if record_history:
+            record_lp_snapshot(summoner_id, ranked_stats)
         return ranked_stats
     except requests.exceptions.HTTPError as http_err:
         print(f"HTTP error occurred: {http_err} - {response.text}")
@@ -196,17 +548,22 @@ def get_ranked_stats_by_summoner_id(summoner_id, platform_region="na1"):
     return None
 
 
+@single_flight(lambda puuid, region="na1": ("summoner", puuid, region))
 def get_summoner_info_by_puuid(puuid, region="na1"):
     """
     Fetch summoner information using PUUID.
     """
-    url = f"https://{region}.api.riotgames.com/lol/summoner/v4/summoners/by-puuid/{puuid}"
-    headers = {"X-Riot-Token": RIOT_API_KEY}
+    summoner_data = identity_cache.get_summoner(puuid, region)
+    if summoner_data is not None:
+        return summoner_data
+
+    path = f"/lol/summoner/v4/summoners/by-puuid/{puuid}"
 
     try:
-        response = requests.get(url, headers=headers)
+        response = riot_get(region, path, "summoner-v4.by-puuid")
         response.raise_for_status()
         summoner_data = response.json()
+        identity_cache.put_summoner(puuid, region, summoner_data)
         return summoner_data
     except requests.exceptions.HTTPError as http_err:
         print(f"HTTP error occurred: {http_err} - {response.text}")
@@ -271,12 +628,10 @@ def get_mmr_estimate(game_name, tag_line, region="na1"):
     # Estimate MMR from rank and LP
     estimated_mmr = estimate_mmr_from_rank_and_lp(rank, lp)
     
-    # Calculate performance metrics (win rate, KDA, CS)
-    match_history = session.get("match_history", [])
-    print("Match History Retrieved in get_mmr_estimate:", match_history)
-    print("Match History Passed to Metrics Calculation:", match_history)
-    performance_metrics = calculate_performance_metrics(match_history, summoner_puuid, region)
-    print("Calculated Performance Metrics:", performance_metrics)
+    # Performance metrics (win rate, KDA, CS) from the stored running aggregates
+    user_id = sanitize_user_id(f"{game_name}#{tag_line}")
+    aggregates = storage.get_profile_field(user_id, f"aggregates/{CURRENT_SEASON}")
+    performance_metrics = calculate_performance_metrics(aggregates)
     
     return {
         "estimated_mmr": estimated_mmr,
@@ -289,35 +644,20 @@ def get_mmr_estimate(game_name, tag_line, region="na1"):
 
 def get_match_history(puuid, region="americas", count=20):
     """Fetch match history"""
-    url = f"https://{region}.api.riotgames.com/lol/match/v5/matches/by-puuid/{puuid}/ids"
-    headers = {"X-Riot-Token": RIOT_API_KEY}
-    response = requests.get(url, headers=headers, params={"count": count})
+    path = f"/lol/match/v5/matches/by-puuid/{puuid}/ids"
+    response = riot_get(get_global_region(region), path, "match-v5.ids", params={"count": count})
     return response.json() if response.status_code == 200 else []
 
 
-def calculate_performance_metrics(match_ids, puuid, region="americas"):
-    """Calculate win rate, KDA, and CS from the user's matches."""
-    wins = 0
-    total_kills = 0
-    total_deaths = 0
-    total_assists = 0
-    total_cs = 0
-    total_matches = 0
-
-    for match_id in match_ids:
-        match_details = get_user_match_details(puuid, match_id, region)
-        if not match_details or "user_data" not in match_details:
-            print(f"Skipping invalid or irrelevant match: {match_id}")
-            continue
-
-        user_data = match_details["user_data"]
-        total_matches += 1
-        if user_data["win"]:
-            wins += 1
-        total_kills += user_data.get("kills", 0)
-        total_deaths += user_data.get("deaths", 0)
-        total_assists += user_data.get("assists", 0)
-        total_cs += user_data.get("totalCS", 0)
+def calculate_performance_metrics(season_aggregates):
+    """Calculate win rate, KDA, and CS from a season's running aggregates."""
+    season_aggregates = season_aggregates or {}
+    wins = season_aggregates.get("wins", 0)
+    total_kills = season_aggregates.get("kills", 0)
+    total_deaths = season_aggregates.get("deaths", 0)
+    total_assists = season_aggregates.get("assists", 0)
+    total_cs = season_aggregates.get("cs", 0)
+    total_matches = season_aggregates.get("matches", 0)
 
     win_rate = (wins / total_matches) * 100 if total_matches > 0 else 0
     kda = (total_kills + total_assists) / total_deaths if total_deaths > 0 else total_kills + total_assists
@@ -330,116 +670,136 @@ def calculate_performance_metrics(match_ids, puuid, region="americas"):
     }
 
 
+def solo_queue_mmr(ranked_stats):
+    """
+    MMR of a summoner's solo queue rank, from their league-v4 entries.
+
+    :return: MMR value, or 0 if the summoner is unranked in solo queue.
+    """
+    entry = next((stats for stats in ranked_stats or [] if stats.get("queueType") == "RANKED_SOLO_5x5"), None)
+    if not entry:
+        return 0
+    return mmr_for_rank(f"{entry.get('tier', '')} {entry.get('rank', '')}", entry.get("leaguePoints", 0)) or 0
+
+
+def fetch_summoner_mmrs(summoner_ids, region, max_workers=None):
+    """
+    Look up the solo queue MMR of several summoners concurrently on a bounded thread pool.
+
+    :return: Dictionary of summoner ID to MMR (0 when unranked); failed lookups are left out.
+    """
+    if not summoner_ids:
+        return {}
+
+    with ThreadPoolExecutor(max_workers=max_workers or MATCH_FETCH_WORKERS) as executor:
+        results = list(executor.map(
+            lambda summoner_id: get_ranked_stats_by_summoner_id(summoner_id, region, record_history=False),
+            summoner_ids,
+        ))
+    return {
+        summoner_id: solo_queue_mmr(ranked_stats)
+        for summoner_id, ranked_stats in zip(summoner_ids, results)
+        if ranked_stats is not None
+    }
+
+
+def compute_lobby_ranks_job(user_id, region="na1"):
+    """
+    Background job: fill in the average rank of the lobby of the user's latest matches.
+
+    Each lobby is averaged over all of its players except the user. League lookups are
+    deduplicated across matches, fetched concurrently and capped at
+    LOBBY_RANK_LOOKUP_BUDGET per job, spent on the newest lobbies first. Ranks found for
+    a lobby that is still incomplete are saved with the match (lobby_mmrs), so the next
+    job carries on where this one stopped.
+
+    :return: Number of matches updated.
+    """
+    user_id = sanitize_user_id(user_id)
+    matches = [
+        match for match in get_user_matches(user_id, limit=LOBBY_RANK_MATCHES)
+        if match and match.get("match_id") and "lobby_rank" not in match
+    ]
+
+    lobbies = {}
+    mmrs = {}  # summoner ID -> MMR (0 when unranked, None when the lookup failed)
+    for match in matches:
+        payload = get_match_payload(match["match_id"], region)
+        if not payload:
+            continue
+        user_puuid = (match.get("user_data") or {}).get("puuid")
+        lobbies[match["match_id"]] = set(
+            participant["summonerId"] for participant in payload.get("participants") or []
+            if participant.get("summonerId") and participant.get("puuid") != user_puuid
+        )
+        mmrs.update(match.get("lobby_mmrs") or {})
+    if not lobbies:
+        return 0
+
+    for summoner_id in set().union(*lobbies.values()) - set(mmrs):
+        mmr = identity_cache.get_rank_mmr(summoner_id)
+        if mmr is not None:
+            mmrs[summoner_id] = mmr
+
+    # Spend the budget on the newest lobbies first
+    lookups = []
+    for match in matches:
+        for summoner_id in sorted(lobbies.get(match["match_id"], ())):
+            if summoner_id not in mmrs and summoner_id not in lookups and len(lookups) < LOBBY_RANK_LOOKUP_BUDGET:
+                lookups.append(summoner_id)
+    found = fetch_summoner_mmrs(lookups, region)
+    # Left out of the average rather than retried forever (e.g. a summoner that no longer exists)
+    mmrs.update({summoner_id: found.get(summoner_id) for summoner_id in lookups})
+
+    updated_matches = []
+    for match in matches:
+        lobby = lobbies.get(match["match_id"])
+        if lobby is None:
+            continue
+
+        known = {summoner_id: mmrs[summoner_id] for summoner_id in lobby if summoner_id in mmrs}
+        if len(known) < len(lobby):
+            if known != (match.get("lobby_mmrs") or {}):
+                match["lobby_mmrs"] = known
+                updated_matches.append(match)
+            continue
+
+        ranked_mmrs = [mmr for mmr in known.values() if mmr]
+        average_mmr = round(sum(ranked_mmrs) / len(ranked_mmrs)) if ranked_mmrs else None
+        match.pop("lobby_mmrs", None)
+        match["lobby_rank"] = {
+            "mmr": average_mmr,
+            "rank": rank_for_mmr(average_mmr),
+            "players": len(ranked_mmrs),
+        }
+        updated_matches.append(match)
+
+    if updated_matches:
+        storage.save_user_matches(
+            user_id, [(match_sort_key(match), match) for match in updated_matches], {"page_version": new_page_version()}
+        )
+        profile_pages.invalidate(user_id)
+    return len(updated_matches)
+
+
 def estimate_mmr_from_rank_and_lp(rank, lp):
     """Estimate MMR based on rank and LP"""
-    rank_to_mmr = {
-        'IRON IV': (1, 100),
-        'IRON III': (101, 200),
-        'IRON II': (201, 300),
-        'IRON I': (301, 400),
-        
-        'BRONZE IV': (401, 500),
-        'BRONZE III': (501, 600),
-        'BRONZE II': (601, 700),
-        'BRONZE I': (701, 800),
-        
-        'SILVER IV': (801, 900),
-        'SILVER III': (901, 1000),
-        'SILVER II': (1001, 1100),
-        'SILVER I': (1101, 1200),
-        
-        'GOLD IV': (1201, 1300),
-        'GOLD III': (1301, 1400),
-        'GOLD II': (1401, 1500),
-        'GOLD I': (1501, 1600),
-        
-        'PLATINUM IV': (1601, 1700),
-        'PLATINUM III': (1701, 1800),
-        'PLATINUM II': (1801, 1900),
-        'PLATINUM I': (1901, 2000),
-        
-        'EMERALD IV': (2001, 2100),
-        'EMERALD III': (2101, 2200),
-        'EMERALD II': (2201, 2300),
-        'EMERALD I': (2301, 2400),
-        
-        'DIAMOND IV': (2401, 2500),
-        'DIAMOND III': (2501, 2600),
-        'DIAMOND II': (2601, 2700),
-        'DIAMOND I': (2701, 2800),
-        
-        'MASTER': (2801, 3200),
-        
-        'GRANDMASTER': (3201, 3600),
-        
-        'CHALLENGER': (3601, 4000)
-    }
+    estimated_mmr = mmr_for_rank(rank, lp)
 
-    # Retrieve rank range from the dictionary
-    rank_lower, rank_upper = rank_to_mmr.get(rank.upper(), (None, None))
-    
-    # Check if the rank exists in the dictionary, if not return an error
-    if rank_lower is None or rank_upper is None:
-        print(f"Error: Rank {rank} not found in rank_to_mmr dictionary.")
+    # Check if the rank is on the ladder, if not return an error
+    if estimated_mmr is None:
+        print(f"Error: Rank {rank} not found in the rank ladder.")
         return 0  # Return 0 for invalid rank
-    
-    # Correctly calculate MMR from LP within the rank range
-    estimated_mmr = rank_lower + (lp // 100)
-    
+
     return estimated_mmr
 
 
 def get_rank_by_mmr(mmr):
     """Find the rank based on MMR value"""
-    rank_to_mmr = {
-        'IRON IV': (1, 100),
-        'IRON III': (101, 200),
-        'IRON II': (201, 300),
-        'IRON I': (301, 400),
-        
-        'BRONZE IV': (401, 500),
-        'BRONZE III': (501, 600),
-        'BRONZE II': (601, 700),
-        'BRONZE I': (701, 800),
-        
-        'SILVER IV': (801, 900),
-        'SILVER III': (901, 1000),
-        'SILVER II': (1001, 1100),
-        'SILVER I': (1101, 1200),
-        
-        'GOLD IV': (1201, 1300),
-        'GOLD III': (1301, 1400),
-        'GOLD II': (1401, 1500),
-        'GOLD I': (1501, 1600),
-        
-        'PLATINUM IV': (1601, 1700),
-        'PLATINUM III': (1701, 1800),
-        'PLATINUM II': (1801, 1900),
-        'PLATINUM I': (1901, 2000),
-        
-        'EMERALD IV': (2001, 2100),
-        'EMERALD III': (2101, 2200),
-        'EMERALD II': (2201, 2300),
-        'EMERALD I': (2301, 2400),
-        
-        'DIAMOND IV': (2401, 2500),
-        'DIAMOND III': (2501, 2600),
-        'DIAMOND II': (2601, 2700),
-        'DIAMOND I': (2701, 2800),
-        
-        'MASTER': (2801, 3200),
-        
-        'GRANDMASTER': (3201, 3600),
-        
-        'CHALLENGER': (3601, 4000)
-    }
-
-    # Iterate through the rank_to_mmr dictionary to find the correct division
-    for rank, (min_mmr, max_mmr) in rank_to_mmr.items():
-        if min_mmr <= mmr <= max_mmr:
-            return f"({rank})"
-    
-    return "Unranked"  # Return Unranked if MMR doesn't match any rank
+    rank = rank_for_mmr(mmr)
+    if rank is None:
+        return "Unranked"  # Return Unranked if MMR doesn't match any rank
+    return f"({rank})"
 
 
 def sanitize_user_id(user_id):
@@ -449,86 +809,486 @@ def sanitize_user_id(user_id):
     return re.sub(r'[.#$[\]]', '_', user_id)
 
 
+def get_user_matches(user_id, limit=20, end_at=None):
+    """
+    Read a page of a user's stored matches, newest first.
+
+    :param user_id: The unique user ID.
+    :param limit: Number of matches to read.
+    :param end_at: Only read matches whose storage key sorts at or before this key.
+    :return: List of match details, newest first.
+    """
+    return storage.get_user_matches(sanitize_user_id(user_id), limit=limit, end_at=end_at)
+
+
+def encode_match_cursor(match):
+    """
+    Build the opaque pagination cursor pointing at a match (its start timestamp and match ID).
+    """
+    return base64.urlsafe_b64encode(match_sort_key(match).encode()).decode()
+
+
+class InvalidCursorError(ValueError):
+    """
+    Raised for a pagination cursor that was not issued by encode_match_cursor.
+    """
+
+
+def decode_match_cursor(cursor):
+    """
+    Decode a pagination cursor back into the storage key of the match it points at.
+
+    :raises InvalidCursorError: If the cursor is malformed or was tampered with.
+    """
+    try:
+        match_key = base64.urlsafe_b64decode(cursor.encode()).decode()
+        timestamp, match_id = match_key.split("_", 1)
+    except (AttributeError, ValueError):  # Not a string, bad base64 or UTF-8, or no separator
+        raise InvalidCursorError("Invalid cursor.")
+    if not timestamp.isdigit() or not match_id:
+        raise InvalidCursorError("Invalid cursor.")
+    return match_key
+
+
 def save_user_data_to_realtime_db(
-    user_id, mmr_data=None, match_history=None, stored_match_ids=None, 
-    summoner_info=None, ranked_stats=None, most_played_champions=None
+    user_id, mmr_data=None, match_history=None,
+    summoner_info=None, ranked_stats=None, most_played_champions=None, region=None
 ):
     """
-    Save user data, including MMR, match history, and stored match IDs, to Realtime Database.
+    Save user data, including the profile summary and new matches, to Realtime Database.
+
+    The profile summary is stored under `users/{id}` and every match under its own
+    `user_matches/{id}/{match key}` node, so neither has to be rewritten as history grows.
     """
     try:
-        ref = db.reference(f"users/{sanitize_user_id(user_id)}")
+        user_id = sanitize_user_id(user_id)
+        new_match_history = match_history or []
 
-        # Retrieve existing data to preserve fields like stored_match_ids
-        existing_data = ref.get() or {}
+        # Only the provided fields are written, so the rest of the profile is kept
+        # without reading it first
+        profile_fields = {}
+        for field, value in (
+            ("summoner_info", summoner_info),
+            ("ranked_stats", ranked_stats),
+            ("most_played_champions", most_played_champions),
+            ("mmr_data", mmr_data),
+            ("region", region),
+        ):
+            if value:
+                profile_fields[field] = value
 
         # Ensure summoner_info includes PUUID if available
-        if match_history and "puuid" in match_history[0].get("user_data", {}):
-            summoner_info = summoner_info or existing_data.get("summoner_info", {})
-            summoner_info["puuid"] = match_history[0]["user_data"]["puuid"]
-
-        # Default to existing data if parameters are not provided
-        ranked_stats = ranked_stats or existing_data.get("ranked_stats", {})
-        most_played_champions = most_played_champions or existing_data.get("most_played_champions", [])
-        
-        # Update match history with deduplication
-        existing_match_history = existing_data.get("match_history", [])
-        new_match_history = match_history or []
-        combined_match_history = new_match_history + existing_match_history
-        # Sort and limit to the 20 most recent matches
-        combined_match_history = sorted(
-            combined_match_history,
-            key=lambda x: x.get("game_start_timestamp", 0),
-            reverse=True
-        )[:20]
-
-        # Update stored match IDs
-        existing_stored_ids = set(existing_data.get("stored_match_ids", []))
-        new_stored_ids = set(stored_match_ids or [])
-        updated_stored_ids = list(existing_stored_ids.union(new_stored_ids))
-
-        # Update user data
-        user_data = {
-            "summoner_info": summoner_info or existing_data.get("summoner_info", {}),
-            "ranked_stats": ranked_stats,
-            "most_played_champions": most_played_champions,
-            "mmr_data": mmr_data or existing_data.get("mmr_data", {}),
-            "match_history": combined_match_history,
-            "stored_match_ids": updated_stored_ids,
-            "last_updated": datetime.now(timezone.utc).isoformat(),
-        }
-
-        # Save data to the database
-        ref.set(user_data)
+        if new_match_history and "puuid" in new_match_history[0].get("user_data", {}):
+            profile_fields["summoner_info/puuid"] = new_match_history[0]["user_data"]["puuid"]
+
+        if new_match_history:
+            previous_state = storage.get_profile_field(user_id, "sync_state")
+            profile_fields["sync_state"] = build_sync_state(new_match_history, previous_state)
+        profile_fields["last_updated"] = datetime.now(timezone.utc).isoformat()
+        profile_fields["page_version"] = new_page_version()
+
+        # Save the summary fields and the new matches in one atomic write
+        storage.save_user_matches(
+            user_id, [(match_sort_key(match), match) for match in new_match_history], profile_fields
+        )
+        profile_pages.invalidate(user_id)
+        record_match_features(new_match_history)
         print(f"Data saved successfully for user: {user_id}")
     except Exception as e:
         print(f"Failed to save data to Realtime Database: {e}")
 
 
-def fetch_initial_matches(puuid, region):
+def fetch_match_details(puuid, match_ids, region, limit=None, max_workers=None, indexed=None, on_match=None):
+    """
+    Download the details of several matches concurrently on a bounded thread pool.
+
+    Results are consumed in match-ID order, and no new requests are issued once
+    `limit` CLASSIC matches have been collected.
+
+    :param puuid: The user's PUUID.
+    :param match_ids: Match IDs to fetch, newest first.
+    :param region: Platform or regional routing value.
+    :param limit: Maximum number of CLASSIC matches to collect (None for all).
+    :param max_workers: Maximum detail requests in flight (defaults to MATCH_FETCH_WORKERS).
+    :param indexed: Match details already in the per-PUUID match index, by match ID;
+        these are used as they are instead of being downloaded.
+    :param on_match: Called with each collected match as soon as it is available.
+    :return: List of CLASSIC match details in match-ID order.
+    """
+    indexed = indexed or {}
+    max_workers = max_workers or MATCH_FETCH_WORKERS
+    limit = len(match_ids) if limit is None else limit
+    global_region = get_global_region(region)
     ranked_match_details = []
-    stored_match_ids = []
-    start = 0
 
-    while len(ranked_match_details) < 20:
-        match_history = get_match_history_paged(puuid, start=start, count=20, region=PLATFORM_TO_GLOBAL[region])
-        if not match_history:
-            break
-
-        for match_id in match_history:
-            match_details = get_user_match_details(puuid, match_id, PLATFORM_TO_GLOBAL[region])
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        remaining_ids = deque(match_ids)
+        pending = deque()
+        while (remaining_ids or pending) and len(ranked_match_details) < limit:
+            # Keep the pool busy, but never ask for more matches than are still needed
+            needed = limit - len(ranked_match_details)
+            while remaining_ids and len(pending) < min(max_workers, needed):
+                match_id = remaining_ids.popleft()
+                if match_id in indexed:
+                    future = Future()
+                    future.set_result(indexed[match_id])
+                    pending.append(future)
+                else:
+                    pending.append(executor.submit(get_user_match_details, puuid, match_id, global_region))
+
+            # Consume results in match-ID order so the newest matches are kept
+            match_details = pending.popleft().result()
             if match_details and match_details.get("game_mode") == "CLASSIC":
                 ranked_match_details.append(match_details)
-                stored_match_ids.append(match_id)
+                if on_match:
+                    on_match(match_details)
+
+        for future in pending:
+            future.cancel()
+
+    return ranked_match_details
+
+
+@single_flight(lambda puuid, region, target_count=20, max_workers=None, on_match=None: ("initial", puuid, target_count))
+def fetch_initial_matches(puuid, region, target_count=20, max_workers=None, on_match=None):
+    """
+    Fetch the user's latest ranked matches, downloading match details concurrently.
+
+    Only Ranked Solo/Duo match IDs from the current season are listed, 20 at a time,
+    and their details are fetched with `fetch_match_details` until `target_count`
+    matches have been collected. Matches already indexed from a lobby-mate's search
+    are not downloaded again.
+
+    :param puuid: The user's PUUID.
+    :param region: Platform region of the user (e.g. "na1").
+    :param target_count: Number of ranked matches to collect.
+    :param max_workers: Maximum detail requests in flight (defaults to MATCH_FETCH_WORKERS).
+    :param on_match: Called with each match as soon as its details are available, for
+        streaming them to the page.
+    :return: Tuple of (match details sorted newest first, their match IDs).
+    """
+    global_region = get_global_region(region)
+    indexed = load_indexed_matches(puuid)
+    ranked_match_details = []
+    start = 0
 
-                if len(ranked_match_details) == 20:
-                    break
+    while len(ranked_match_details) < target_count:
+        match_history = get_match_history_paged(
+            puuid, start=start, count=20, region=global_region,
+            start_time=season_start_timestamp // 1000, queue=RANKED_SOLO_QUEUE_ID,
+        )
+        if not match_history:
+            break
 
+        ranked_match_details += fetch_match_details(
+            puuid, match_history, global_region,
+            limit=target_count - len(ranked_match_details), max_workers=max_workers, indexed=indexed,
+            on_match=on_match,
+        )
+        if len(match_history) < 20:
+            break
         start += 20
 
+    ranked_match_details.sort(key=lambda match: match.get("game_start_timestamp") or 0, reverse=True)
+    stored_match_ids = [match["match_id"] for match in ranked_match_details]
     return ranked_match_details, stored_match_ids
 
 
+def build_sync_state(match_details, previous_state=None):
+    """
+    Compute a user's sync high-water mark (newest stored match ID and its start timestamp).
+
+    :param match_details: Newly stored match details.
+    :param previous_state: The current sync state, kept if no newer match was stored.
+    :return: Dictionary with latest_match_id and latest_timestamp.
+    """
+    previous_state = previous_state or {}
+    latest = max(match_details or [], key=lambda match: match.get("game_start_timestamp") or 0, default=None)
+    if not latest or (latest.get("game_start_timestamp") or 0) <= previous_state.get("latest_timestamp", 0):
+        return previous_state
+
+    return {
+        "latest_match_id": latest["match_id"],
+        "latest_timestamp": latest.get("game_start_timestamp") or 0,
+    }
+
+
+def fetch_new_matches(puuid, region, sync_state=None):
+    """
+    Fetch the ranked matches played since the user's last sync.
+
+    Ranked Solo/Duo match IDs are paged backwards from the newest (no older than the
+    high-water timestamp, or the season start when unknown) until the last synced
+    match ID is reached, so only unseen matches are downloaded. The walk is not capped:
+    the sync state then moves past every listed match, so stopping early would leave
+    matches that are never stored or counted. The start time bounds it instead.
+
+    :param puuid: The user's PUUID.
+    :param region: Platform region of the user (e.g. "na1").
+    :param sync_state: The user's sync state from `build_sync_state`.
+    :return: Tuple of (new match details newest first, updated sync state).
+    """
+    sync_state = sync_state or {}
+    known_match_id = sync_state.get("latest_match_id")
+    known_timestamp = sync_state.get("latest_timestamp")
+    start_time = (known_timestamp or season_start_timestamp) // 1000
+    global_region = get_global_region(region)
+
+    new_match_ids = []
+    page = 0
+    while True:
+        match_ids = get_match_history_paged(
+            puuid, start=page * 20, count=20, region=global_region,
+            start_time=start_time, queue=RANKED_SOLO_QUEUE_ID,
+        )
+        if known_match_id in match_ids:
+            new_match_ids += match_ids[:match_ids.index(known_match_id)]
+            break
+
+        new_match_ids += match_ids
+        # Without a high-water mark only the latest page is checked
+        if len(match_ids) < 20 or not known_match_id:
+            break
+        page += 1
+
+    indexed = load_indexed_matches(puuid) if new_match_ids else {}
+    new_match_details = fetch_match_details(puuid, new_match_ids, global_region, indexed=indexed)
+    new_match_details.sort(key=lambda match: match.get("game_start_timestamp") or 0, reverse=True)
+    return new_match_details, build_sync_state(new_match_details, sync_state)
+
+
+def fetch_older_matches(puuid, region, before_timestamp, count=20, max_pages=5):
+    """
+    Fetch ranked matches played before a given time, for paging past the stored history.
+
+    :param puuid: The user's PUUID.
+    :param region: Platform region of the user (e.g. "na1").
+    :param before_timestamp: Start timestamp (ms) of the oldest match already shown.
+    :param count: Number of ranked matches to collect.
+    :param max_pages: Maximum pages of 20 match IDs to walk back through.
+    :return: List of match details, newest first.
+    """
+    global_region = get_global_region(region)
+    end_time = before_timestamp // 1000
+    older_match_details = []
+
+    for page in range(max_pages):
+        match_ids = get_match_history_paged(
+            puuid, start=page * 20, count=20, region=global_region,
+            end_time=end_time, queue=RANKED_SOLO_QUEUE_ID,
+        )
+        if not match_ids:
+            break
+
+        older_match_details += [
+            match for match in fetch_match_details(
+                puuid, match_ids, global_region, limit=count - len(older_match_details)
+            )
+            if (match.get("game_start_timestamp") or 0) < before_timestamp
+        ]
+        if len(older_match_details) >= count or len(match_ids) < 20:
+            break
+
+    older_match_details.sort(key=lambda match: match.get("game_start_timestamp") or 0, reverse=True)
+    return older_match_details[:count]
+
+
+def read_match_page(user_id, cursor=None, page_size=20):
+    """
+    Read the stored matches that follow a cursor with an ordered range query.
+
+    :return: Tuple of (matches newest first, storage key of the oldest match seen or None).
+    """
+    end_at = decode_match_cursor(cursor) if cursor else None
+
+    # end_at is inclusive, so read one extra match and drop the one the cursor points at
+    matches = [
+        match for match in get_user_matches(user_id, limit=page_size + 1, end_at=end_at)
+        if match and match.get("user_data") and match_sort_key(match) != end_at
+    ][:page_size]
+
+    oldest_key = match_sort_key(matches[-1]) if matches else end_at
+    return matches, oldest_key
+
+
+def record_match_features(matches):
+    """
+    Append ingested matches to the local feature store, if one is configured.
+    """
+    if feature_store is None or not matches:
+        return
+    try:
+        feature_store.append(matches)
+    except Exception as e:
+        print(f"Failed to record match features: {e}")
+
+
+def store_user_matches(user_id, matches):
+    """
+    Store match details under the user's match nodes in one multi-path update.
+    """
+    if matches:
+        storage.save_user_matches(sanitize_user_id(user_id), [(match_sort_key(match), match) for match in matches])
+        record_user_aggregates(user_id, matches)
+        record_match_features(matches)
+
+
+def load_match_page(user_id, cursor=None, region="na1", page_size=20):
+    """
+    Load the page of matches that follows a cursor.
+
+    The page is read from storage with an ordered range query. When storage runs
+    out, older matches are fetched from the Riot API, stored, and returned, so
+    every page costs the same regardless of how much history is stored.
+
+    :param user_id: The unique user ID.
+    :param cursor: Cursor returned with the previous page (None for the first page).
+    :param region: Platform region of the user (e.g. "na1").
+    :param page_size: Number of matches per page.
+    :return: Tuple of (matches newest first, cursor for the next page or None).
+    """
+    user_id = sanitize_user_id(user_id)
+    matches, oldest_key = read_match_page(user_id, cursor, page_size)
+
+    if len(matches) < page_size and oldest_key:
+        puuid = storage.get_profile_field(user_id, "summoner_info/puuid")
+        if puuid:
+            before_timestamp = int(oldest_key.split("_", 1)[0])
+            older_matches = fetch_older_matches(puuid, region, before_timestamp, page_size - len(matches))
+            for match in older_matches:
+                match["game_time_ago"] = calculate_time_ago(match.get("game_start_timestamp"))
+            store_user_matches(user_id, older_matches)
+            matches += older_matches
+
+    next_cursor = encode_match_cursor(matches[-1]) if matches else None
+    return matches, next_cursor
+
+
+def sync_user_matches(user_id, region="na1"):
+    """
+    Incrementally sync a stored user's matches with the Riot API.
+
+    Only the user's PUUID, sync state and latest 20 matches are read, and the new
+    matches are written in a single delta update.
+
+    :param user_id: The unique user ID.
+    :param region: Platform region of the user (e.g. "na1").
+    :return: Tuple of (new match details, latest 20 matches), or None if the user is not stored.
+    """
+    user_id = sanitize_user_id(user_id)
+    puuid = storage.get_profile_field(user_id, "summoner_info/puuid")
+    if not puuid:
+        return None
+
+    recent_matches = get_user_matches(user_id, limit=20)
+    sync_state = storage.get_profile_field(user_id, "sync_state") or build_sync_state(recent_matches)
+
+    new_match_details, sync_state = fetch_new_matches(puuid, region, sync_state)
+    if new_match_details:
+        # New games mean new LP; the next rank lookup must not be served from the cache
+        summoner_id = storage.get_profile_field(user_id, "summoner_info/id")
+        if summoner_id:
+            identity_cache.invalidate_league(summoner_id)
+    for match in new_match_details:
+        match["game_time_ago"] = calculate_time_ago(match.get("game_start_timestamp"))
+    storage.save_user_matches(
+        user_id,
+        [(match_sort_key(match), match) for match in new_match_details],
+        {
+            "last_updated": datetime.now(timezone.utc).isoformat(),
+            "page_version": new_page_version(),
+            "sync_state": sync_state,
+            "region": region,
+        },
+    )
+    profile_pages.invalidate(user_id)
+    record_user_aggregates(user_id, new_match_details)
+    record_match_features(new_match_details)
+
+    latest_matches = sorted(
+        new_match_details + recent_matches,
+        key=lambda x: x.get("game_start_timestamp", 0),
+        reverse=True
+    )[:20]
+    return new_match_details, latest_matches
+
+
+def ingest_user_job(user_id, puuid, region, summoner_info=None, ranked_stats=None):
+    """
+    Background job: fetch a new user's latest ranked matches and save their profile.
+
+    Each match is reported as job progress as soon as it is fetched, so the page can
+    stream the match cards from /jobs/<job_id>/stream before the job finishes.
+
+    :return: The saved matches, most played champions and the cursor for the next page.
+    """
+    def stream_match(match):
+        # Update the "time played ago" before the match is shown
+        if "game_start_timestamp" in match:
+            match["game_time_ago"] = calculate_time_ago(match["game_start_timestamp"])
+        report_progress({"match": match})
+
+    ranked_match_details, _ = fetch_initial_matches(puuid, region, on_match=stream_match)
+
+    # Matches shared with a concurrent fetch were not streamed through this job
+    for match in ranked_match_details:
+        if "game_start_timestamp" in match and "game_time_ago" not in match:
+            match["game_time_ago"] = calculate_time_ago(match["game_start_timestamp"])
+
+    save_user_data_to_realtime_db(
+        user_id=user_id,
+        mmr_data=None,
+        match_history=ranked_match_details,
+        summoner_info=summoner_info,
+        ranked_stats=ranked_stats,
+        region=region,
+    )
+    aggregates = record_user_aggregates(user_id, ranked_match_details) or {}
+    most_played_champions = most_played_from_aggregates(aggregates.get(CURRENT_SEASON))
+    return {
+        "matches": ranked_match_details,
+        "most_played_champions": most_played_champions,
+        "next_cursor": encode_match_cursor(ranked_match_details[-1]) if ranked_match_details else None,
+    }
+
+
+def refresh_user_job(user_id, region="na1"):
+    """
+    Background job: incrementally sync a stored user's matches.
+
+    :return: The response body shown by the refresh button.
+    """
+    sync_result = sync_user_matches(user_id, region)
+    if sync_result is None:
+        raise ValueError("User not found. Please search first.")
+
+    new_match_details, latest_20_matches = sync_result
+    next_cursor = encode_match_cursor(latest_20_matches[-1]) if latest_20_matches else None
+    if new_match_details:
+        return {
+            "message": f"{len(new_match_details)} new matches added!",
+            "new_matches": latest_20_matches,
+            "next_cursor": next_cursor,
+            "last_updated": "just now"
+        }
+
+    return {
+        "message": "No new matches",
+        "last_updated": "just now",
+        "updated_matches": latest_20_matches,  # Latest 20 matches for frontend
+        "next_cursor": next_cursor
+    }
+
+
+def register_ingestion_jobs(job_queue):
+    """
+    Register the match ingestion job handlers on a job queue.
+    """
+    job_queue.register("ingest_user", ingest_user_job)
+    job_queue.register("refresh_user", refresh_user_job)
+    job_queue.register("lobby_ranks", compute_lobby_ranks_job)
+
+
 def initialize_user_portfolio(user_id, match_history):
     """
     Initialize the user's match portfolio in the database with the latest 20 matches.
@@ -536,10 +1296,8 @@ def initialize_user_portfolio(user_id, match_history):
     :param user_id: The unique user ID.
     :param match_history: List of match IDs to store initially.
     """
-    ref = db.reference(f"users/{user_id}/matches")
     try:
-        for match_id in match_history:
-            ref.child(match_id).set({"stored": True})
+        storage.update_profile(user_id, {f"matches/{match_id}": {"stored": True} for match_id in match_history})
         print(f"Initialized portfolio for user {user_id} with {len(match_history)} matches.")
     except Exception as e:
         print(f"Failed to initialize portfolio for user {user_id}: {e}")
@@ -552,8 +1310,7 @@ def get_new_matches(user_id, fetched_match_history):
     :param fetched_match_history: List of match IDs fetched from the Riot API.
     :return: List of new match IDs.
     """
-    ref = db.reference(f"users/{user_id}/matches")
-    stored_matches = ref.get() or {}
+    stored_matches = storage.get_profile_field(user_id, "matches") or {}
 
     # Find matches that are not already stored
     new_matches = [match_id for match_id in fetched_match_history if match_id not in stored_matches]
@@ -566,10 +1323,8 @@ def append_new_matches(user_id, new_matches):
     :param user_id: The unique user ID.
     :param new_matches: List of new match IDs to add.
     """
-    ref = db.reference(f"users/{user_id}/matches")
     try:
-        for match_id in new_matches:
-            ref.child(match_id).set({"stored": True})
+        storage.update_profile(user_id, {f"matches/{match_id}": {"stored": True} for match_id in new_matches})
         print(f"Appended {len(new_matches)} new matches to user {user_id}'s portfolio.")
     except Exception as e:
         print(f"Failed to append new matches for user {user_id}: {e}")
@@ -579,8 +1334,8 @@ def save_match_to_database(user_id, match_id, match_details):
     Save match details to the database.
     """
     try:
-        ref = db.reference(f"users/{sanitize_user_id(user_id)}/matches/{match_id}")
-        ref.set(match_details)
+        match_key = match_sort_key({**match_details, "match_id": match_id})
+        storage.save_user_matches(sanitize_user_id(user_id), [(match_key, match_details)])
         print(f"Match {match_id} saved successfully for user {user_id}.")
     except Exception as e:
         print(f"Failed to save match {match_id} for user {user_id}: {e}")
@@ -589,9 +1344,8 @@ def get_stored_match_ids(user_id):
     """
     Retrieve stored match IDs for a user.
     """
-    ref = db.reference(f"users/{sanitize_user_id(user_id)}/matches")
-    stored_matches = ref.get() or {}
-    return set(stored_matches.keys())
+    stored_keys = storage.get_stored_match_keys(sanitize_user_id(user_id))
+    return set(key.split("_", 1)[1] for key in stored_keys)
 
 def generate_weekly_dates():
     today = datetime.now()
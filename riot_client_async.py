@@ -0,0 +1,353 @@
+"""
+Non-blocking versions of the riot_client fetch functions, built on httpx.
+
+They share riot_client's rate limiter, match cache and parsing helpers, so the
+async serving mode (asgi.py) and the synchronous app and scripts stay consistent.
+"""
+import asyncio
+import weakref
+from collections import deque
+import httpx
+from http_pool import RETRY_BACKOFF_FACTOR, RETRY_STATUS_CODES
+from singleflight import async_single_flight
+from lp_history import record_lp_snapshot
+from identity_cache import MISSING, identity_cache
+from storage import storage
+from riot_client import (
+    RIOT_API_KEY,
+    MATCH_FETCH_WORKERS,
+    MAX_RATE_LIMIT_RETRIES,
+    REQUEST_TIMEOUT,
+    RANKED_SOLO_QUEUE_ID,
+    season_start_timestamp,
+    rate_limiter,
+    match_cache,
+    build_api_url,
+    build_match_history_params,
+    get_global_region,
+    build_user_match_details,
+    index_lobby_match,
+    invalidate_lobby_leagues,
+    solo_queue_mmr,
+    load_indexed_matches,
+    calculate_time_ago,
+    encode_match_cursor,
+    read_match_page,
+    store_user_matches,
+    sanitize_user_id,
+)
+
+# One client (and connection pool) per event loop
+_clients = weakref.WeakKeyDictionary()
+
+
+def get_async_client():
+    """
+    Return the keep-alive httpx client for the running event loop.
+    """
+    loop = asyncio.get_running_loop()
+    client = _clients.get(loop)
+    if client is None:
+        client = httpx.AsyncClient(
+            timeout=REQUEST_TIMEOUT,
+            limits=httpx.Limits(max_connections=MATCH_FETCH_WORKERS * 4, max_keepalive_connections=MATCH_FETCH_WORKERS * 4),
+            transport=httpx.AsyncHTTPTransport(retries=2),  # Retry failed connection attempts
+        )
+        _clients[loop] = client
+    return client
+
+
+async def riot_get(region, path, method, params=None):
+    """
+    Send a GET request to the Riot API without blocking the event loop.
+
+    Requests wait (asynchronously) for the shared rate limiter, 429 responses are
+    retried after Retry-After and 5xx responses with exponential backoff.
+
+    :return: The final `httpx.Response`.
+    """
+    url = build_api_url(region, path)
+    headers = {"X-Riot-Token": RIOT_API_KEY}
+    client = get_async_client()
+
+    for attempt in range(MAX_RATE_LIMIT_RETRIES + 1):
+        wait = rate_limiter.try_acquire(region, method)
+        while wait:
+            await asyncio.sleep(wait)
+            wait = rate_limiter.try_acquire(region, method)
+
+        response = await client.get(url, headers=headers, params=params)
+        retry_after = rate_limiter.update_from_response(region, method, response)
+        if response.status_code == 429:
+            print(f"Rate limited on {region} ({method}), retrying in {retry_after}s (attempt {attempt + 1}).")
+            continue
+        if response.status_code in RETRY_STATUS_CODES and attempt < MAX_RATE_LIMIT_RETRIES:
+            await asyncio.sleep(RETRY_BACKOFF_FACTOR * 2 ** attempt)
+            continue
+        break
+    return response
+
+
+async def get_json(region, path, method, params=None, default=None):
+    """
+    Fetch a Riot endpoint and decode its JSON body, printing and returning `default` on errors.
+    """
+    try:
+        response = await riot_get(region, path, method, params=params)
+        response.raise_for_status()
+        return response.json()
+    except httpx.HTTPStatusError as http_err:
+        print(f"HTTP error occurred: {http_err} - {http_err.response.text}")
+    except Exception as err:
+        print(f"An error occurred: {err}")
+    return default
+
+
+@async_single_flight(lambda game_name, tag_line, region="na1": ("account", game_name.lower(), tag_line.lower(), region))
+async def get_account_by_riot_id(game_name, tag_line, region="na1"):
+    """
+    Fetch account information using Riot ID (gameName + tagLine), through the identity cache.
+    """
+    account_data = identity_cache.get_account(game_name, tag_line)
+    if account_data is MISSING:
+        return None
+    if account_data is not None:
+        return account_data
+
+    path = f"/riot/account/v1/accounts/by-riot-id/{game_name}/{tag_line}"
+    try:
+        response = await riot_get(get_global_region(region), path, "account-v1.by-riot-id")
+        if response.status_code == 404:
+            identity_cache.put_missing_account(game_name, tag_line)
+        response.raise_for_status()
+        account_data = response.json()
+        identity_cache.put_account(game_name, tag_line, account_data)
+        return account_data
+    except httpx.HTTPStatusError as http_err:
+        print(f"HTTP error occurred: {http_err} - {http_err.response.text}")
+    except Exception as err:
+        print(f"An error occurred: {err}")
+    return None
+
+
+@async_single_flight(lambda puuid, region="na1": ("summoner", puuid, region))
+async def get_summoner_info_by_puuid(puuid, region="na1"):
+    """
+    Fetch summoner information using PUUID, through the identity cache.
+    """
+    summoner_data = identity_cache.get_summoner(puuid, region)
+    if summoner_data is not None:
+        return summoner_data
+
+    path = f"/lol/summoner/v4/summoners/by-puuid/{puuid}"
+    summoner_data = await get_json(region, path, "summoner-v4.by-puuid")
+    if summoner_data:
+        identity_cache.put_summoner(puuid, region, summoner_data)
+    return summoner_data
+
+
+@async_single_flight(
+    lambda summoner_id, platform_region="na1", use_cache=True, record_history=True:
+        ("league", summoner_id, platform_region, use_cache, record_history)
+)
+async def get_ranked_stats_by_summoner_id(summoner_id, platform_region="na1", use_cache=True, record_history=True):
+    """
+    Fetch ranked stats for a summoner by their encrypted summoner ID, through the
+    identity cache unless `use_cache` is False.
+
+    :param record_history: Add the fetched rank to the summoner's LP history; pass False
+        for summoners who are not tracked (e.g. lobby-mates looked up for lobby ranks).
+    """
+    if use_cache:
+        ranked_stats = identity_cache.get_league(summoner_id)
+        if ranked_stats is not None:
+            return ranked_stats
+
+    path = f"/lol/league/v4/entries/by-summoner/{summoner_id}"
+    ranked_stats = await get_json(platform_region, path, "league-v4.by-summoner")
+    if ranked_stats is not None:
+        identity_cache.put_league(summoner_id, ranked_stats)
+        identity_cache.put_rank_mmr(summoner_id, solo_queue_mmr(ranked_stats))
+    if ranked_stats and record_history:
+        await asyncio.to_thread(record_lp_snapshot, summoner_id, ranked_stats)
+    return ranked_stats
+
+
+async def get_match_history_paged(puuid, start=0, count=20, region="americas", start_time=None, end_time=None,
+                                  queue=None, match_type=None):
+    """
+    Fetch paged match history for the user, filtered by the Riot API.
+    """
+    params = build_match_history_params(start, count, start_time, end_time, queue, match_type)
+    path = f"/lol/match/v5/matches/by-puuid/{puuid}/ids"
+    return await get_json(get_global_region(region), path, "match-v5.ids", params=params, default=[])
+
+
+@async_single_flight(lambda match_id, region="na1": ("match", match_id))
+async def get_match_payload(match_id, region="na1"):
+    """
+    Fetch the match payload for a match, served from the shared match cache when possible.
+    """
+    payload = await asyncio.to_thread(match_cache.get, match_id)
+    if payload is not None:
+        return payload
+
+    path = f"/lol/match/v5/matches/{match_id}"
+    match_data = await get_json(get_global_region(region), path, "match-v5.match")
+    if not match_data:
+        return None
+
+    match_info = match_data["info"]
+    payload = {
+        "gameMode": match_info.get("gameMode", ""),
+        "queueId": match_info.get("queueId"),
+        "gameDuration": match_info.get("gameDuration", 0),
+        "gameStartTimestamp": match_info.get("gameStartTimestamp"),
+        "gameEndTimestamp": match_info.get("gameEndTimestamp"),
+        "participants": match_info.get("participants", []),
+    }
+    await asyncio.to_thread(match_cache.put, match_id, payload)
+    invalidate_lobby_leagues(payload)
+    await asyncio.to_thread(index_lobby_match, match_id, payload)
+    return payload
+
+
+async def get_user_match_details(puuid, match_id, region="na1"):
+    """
+    Fetch detailed match information for a specific match filtered by the user's PUUID.
+    """
+    payload = await get_match_payload(match_id, region)
+    if not payload:
+        return None
+
+    # Filter out non-Ranked Solo/Duo matches
+    if payload.get("gameMode", "") != "CLASSIC":
+        return None
+
+    return build_user_match_details(match_id, payload, puuid)
+
+
+async def indexed_match_details(match_details):
+    return match_details
+
+
+async def fetch_match_details(puuid, match_ids, region, limit=None, max_workers=None, indexed=None):
+    """
+    Download the details of several matches concurrently, at most `max_workers` at a time.
+    Matches in `indexed` (match ID to details) are used without being downloaded.
+
+    :return: List of CLASSIC match details in match-ID order.
+    """
+    indexed = indexed or {}
+    max_workers = max_workers or MATCH_FETCH_WORKERS
+    limit = len(match_ids) if limit is None else limit
+    global_region = get_global_region(region)
+    ranked_match_details = []
+
+    remaining_ids = deque(match_ids)
+    pending = deque()
+    while (remaining_ids or pending) and len(ranked_match_details) < limit:
+        # Keep requests in flight, but never ask for more matches than are still needed
+        needed = limit - len(ranked_match_details)
+        while remaining_ids and len(pending) < min(max_workers, needed):
+            match_id = remaining_ids.popleft()
+            if match_id in indexed:
+                pending.append(asyncio.ensure_future(indexed_match_details(indexed[match_id])))
+            else:
+                pending.append(asyncio.ensure_future(get_user_match_details(puuid, match_id, global_region)))
+
+        # Consume results in match-ID order so the newest matches are kept
+        match_details = await pending.popleft()
+        if match_details and match_details.get("game_mode") == "CLASSIC":
+            ranked_match_details.append(match_details)
+
+    for task in pending:
+        task.cancel()
+
+    return ranked_match_details
+
+
+async def fetch_initial_matches(puuid, region, target_count=20, max_workers=None):
+    """
+    Fetch the user's latest Ranked Solo/Duo matches from the current season.
+
+    :return: Tuple of (match details sorted newest first, their match IDs).
+    """
+    global_region = get_global_region(region)
+    indexed = await asyncio.to_thread(load_indexed_matches, puuid)
+    ranked_match_details = []
+    start = 0
+
+    while len(ranked_match_details) < target_count:
+        match_history = await get_match_history_paged(
+            puuid, start=start, count=20, region=global_region,
+            start_time=season_start_timestamp // 1000, queue=RANKED_SOLO_QUEUE_ID,
+        )
+        if not match_history:
+            break
+
+        ranked_match_details += await fetch_match_details(
+            puuid, match_history, global_region,
+            limit=target_count - len(ranked_match_details), max_workers=max_workers, indexed=indexed,
+        )
+        if len(match_history) < 20:
+            break
+        start += 20
+
+    ranked_match_details.sort(key=lambda match: match.get("game_start_timestamp") or 0, reverse=True)
+    return ranked_match_details, [match["match_id"] for match in ranked_match_details]
+
+
+async def fetch_older_matches(puuid, region, before_timestamp, count=20, max_pages=5):
+    """
+    Fetch ranked matches played before a given time, for paging past the stored history.
+
+    :return: List of match details, newest first.
+    """
+    global_region = get_global_region(region)
+    end_time = before_timestamp // 1000
+    older_match_details = []
+
+    for page in range(max_pages):
+        match_ids = await get_match_history_paged(
+            puuid, start=page * 20, count=20, region=global_region,
+            end_time=end_time, queue=RANKED_SOLO_QUEUE_ID,
+        )
+        if not match_ids:
+            break
+
+        older_match_details += [
+            match for match in await fetch_match_details(
+                puuid, match_ids, global_region, limit=count - len(older_match_details)
+            )
+            if (match.get("game_start_timestamp") or 0) < before_timestamp
+        ]
+        if len(older_match_details) >= count or len(match_ids) < 20:
+            break
+
+    older_match_details.sort(key=lambda match: match.get("game_start_timestamp") or 0, reverse=True)
+    return older_match_details[:count]
+
+
+async def load_match_page(user_id, cursor=None, region="na1", page_size=20):
+    """
+    Load the page of matches that follows a cursor, fetching older matches from the
+    Riot API once storage runs out.
+
+    :return: Tuple of (matches newest first, cursor for the next page or None).
+    """
+    user_id = sanitize_user_id(user_id)
+    matches, oldest_key = await asyncio.to_thread(read_match_page, user_id, cursor, page_size)
+
+    if len(matches) < page_size and oldest_key:
+        puuid = await asyncio.to_thread(storage.get_profile_field, user_id, "summoner_info/puuid")
+        if puuid:
+            before_timestamp = int(oldest_key.split("_", 1)[0])
+            older_matches = await fetch_older_matches(puuid, region, before_timestamp, page_size - len(matches))
+            for match in older_matches:
+                match["game_time_ago"] = calculate_time_ago(match.get("game_start_timestamp"))
+            await asyncio.to_thread(store_user_matches, user_id, older_matches)
+            matches += older_matches
+
+    next_cursor = encode_match_cursor(matches[-1]) if matches else None
+    return matches, next_cursor
@@ -0,0 +1,121 @@
+import asyncio
+import functools
+import threading
+
+
+class _Call:
+    def __init__(self):
+        self.done = threading.Event()
+        self.result = None
+        self.error = None
+
+
+class SingleFlight:
+    """
+    Coalesces concurrent calls that share a key: the first caller runs the function
+    and every caller that arrives while it is in flight waits for and shares its result.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._calls = {}
+
+    def do(self, key, fn, *args, **kwargs):
+        with self._lock:
+            call = self._calls.get(key)
+            leader = call is None
+            if leader:
+                call = _Call()
+                self._calls[key] = call
+
+        if not leader:
+            call.done.wait()
+            if call.error is not None:
+                raise call.error
+            return call.result
+
+        try:
+            call.result = fn(*args, **kwargs)
+            return call.result
+        except Exception as e:
+            call.error = e
+            raise
+        finally:
+            with self._lock:
+                del self._calls[key]
+            call.done.set()
+
+
+def single_flight(key_func):
+    """
+    Decorator that coalesces concurrent calls of a function mapping to the same key.
+
+    :param key_func: Called with the function's arguments and returns the coalescing key.
+    """
+    flight = SingleFlight()
+
+    def decorator(fn):
+        @functools.wraps(fn)
+        def wrapper(*args, **kwargs):
+            return flight.do(key_func(*args, **kwargs), fn, *args, **kwargs)
+
+        return wrapper
+
+    return decorator
+
+
+# Result shared with followers when the leader was cancelled before finishing
+_RETRY = object()
+
+
+class AsyncSingleFlight:
+    """
+    Asyncio counterpart of `SingleFlight` for coroutines running on one event loop.
+    """
+
+    def __init__(self):
+        self._calls = {}
+
+    async def do(self, key, fn, *args, **kwargs):
+        # Followers of a leader that was cancelled retry, and the first becomes the new leader
+        future = self._calls.get(key)
+        while future is not None:
+            result = await asyncio.shield(future)
+            if result is not _RETRY:
+                return result
+            future = self._calls.get(key)
+
+        future = asyncio.get_running_loop().create_future()
+        self._calls[key] = future
+        try:
+            result = await fn(*args, **kwargs)
+            future.set_result(result)
+            return result
+        except asyncio.CancelledError:
+            # Only the leader was cancelled; its followers still want the result
+            future.set_result(_RETRY)
+            raise
+        except Exception as e:
+            future.set_exception(e)
+            future.exception()  # Mark retrieved so an unshared failure is not logged as unhandled
+            raise
+        finally:
+            del self._calls[key]
+
+
+def async_single_flight(key_func):
+    """
+    Decorator that coalesces concurrent awaits of a coroutine function mapping to the same key.
+
+    :param key_func: Called with the function's arguments and returns the coalescing key.
+    """
+    flight = AsyncSingleFlight()
+
+    def decorator(fn):
+        @functools.wraps(fn)
+        async def wrapper(*args, **kwargs):
+            return await flight.do(key_func(*args, **kwargs), fn, *args, **kwargs)
+
+        return wrapper
+
+    return decorator
@@ -0,0 +1,636 @@
+"""
+Persistence for user profiles, their matches, the stored match keys, aggregates,
+shared match payloads, the per-PUUID match index and LP history, behind one interface with two implementations:
+
+    FirebaseStorage   Firebase Realtime Database (the production store)
+    SQLiteStorage     embedded SQLite file (WAL), for offline runs, load tests and benchmarks
+
+ReadThroughStorage combines them: SQLite serves reads locally and falls back to
+Firebase on a miss, and every write goes to both. A local profile is compared with
+Firebase's page_version at most every READ_THROUGH_TTL seconds and replaced (with its
+matches dropped) when another host changed it. All processes on a host (web app,
+workers, scripts) should share the same SQLite file.
+
+The backend is chosen at startup with STORAGE_BACKEND ("firebase", "sqlite" or
+"sqlite+firebase") and STORAGE_PATH (the SQLite file).
+"""
+import json
+import os
+import sqlite3
+import threading
+import time
+from write_batch import WriteBatch
+
+STORAGE_BACKEND = os.getenv("STORAGE_BACKEND", "firebase")
+STORAGE_PATH = os.getenv("STORAGE_PATH", "riftiq.sqlite3")
+
+# Seconds a local profile copy is served before its last_updated is checked against Firebase
+READ_THROUGH_TTL = float(os.getenv("READ_THROUGH_TTL", "30"))
+
+# complete_from value for a user whose every match is stored locally; sorts after all match keys
+ALL_MATCHES = "~"
+
+
+def get_path(data, path):
+    """
+    Read a "/"-separated path from nested dictionaries, or None if it is missing.
+    """
+    for part in path.strip("/").split("/"):
+        if not isinstance(data, dict):
+            return None
+        data = data.get(part)
+    return data
+
+
+def set_path(data, path, value):
+    """
+    Write a "/"-separated path into nested dictionaries (None deletes it).
+    """
+    parts = path.strip("/").split("/")
+    for part in parts[:-1]:
+        if not isinstance(data.get(part), dict):
+            data[part] = {}
+        data = data[part]
+    if value is None:
+        data.pop(parts[-1], None)
+    else:
+        data[parts[-1]] = value
+
+
+def match_sort_key(match):
+    """
+    Build the storage key for a match: its zero-padded start timestamp followed by the
+    match ID, so keys sort chronologically and can be paged with ordered range queries.
+    """
+    return f"{int(match.get('game_start_timestamp') or 0):013d}_{match['match_id']}"
+
+
+class FirebaseStorage:
+    """
+    Storage in Firebase Realtime Database:
+
+        users/{id}                   profile summary, running aggregates
+        user_matches/{id}/{key}      match details, keyed by start timestamp and match ID
+        matches/{match_id}           shared match payloads
+        puuid_matches/{puuid}/{key}  match details of every lobby participant, by PUUID
+        lp_history/{summoner_id}     LP samples and rollups
+    """
+
+    def __init__(self):
+        from firebase_admin import db
+        self._db = db
+
+    # Profiles
+
+    def get_profile(self, user_id):
+        return self._db.reference(f"users/{user_id}").get()
+
+    def get_profile_field(self, user_id, field):
+        return self._db.reference(f"users/{user_id}/{field}").get()
+
+    def update_profile(self, user_id, fields):
+        self.save_user_matches(user_id, [], fields)
+
+    def list_user_ids(self):
+        return list((self._db.reference("users").get(shallow=True) or {}).keys())
+
+    # Matches
+
+    def get_user_matches(self, user_id, limit=None, end_at=None):
+        query = self._db.reference(f"user_matches/{user_id}").order_by_key()
+        if end_at:
+            query = query.end_at(end_at)
+        if limit:
+            query = query.limit_to_last(limit)
+        stored_matches = query.get() or {}
+        return [stored_matches[key] for key in sorted(stored_matches, reverse=True)]
+
+    def get_stored_match_keys(self, user_id):
+        return set((self._db.reference(f"user_matches/{user_id}").get(shallow=True) or {}).keys())
+
+    def save_user_matches(self, user_id, matches, profile_fields=None):
+        """
+        Write matches (by storage key) and profile fields (by path) in one atomic update.
+        """
+        batch = WriteBatch()
+        for field, value in (profile_fields or {}).items():
+            batch.set(f"users/{user_id}/{field}", value)
+        for key, match in matches:
+            batch.set(f"user_matches/{user_id}/{key}", match)
+        batch.commit()
+
+    # Aggregates
+
+    def update_aggregates(self, user_id, update):
+        """
+        Apply `update` to the user's aggregates in a transaction and return the result.
+        """
+        return self._db.reference(f"users/{user_id}/aggregates").transaction(update)
+
+    # Match payloads
+
+    def get_match_payload(self, match_id):
+        return self._db.reference(f"matches/{match_id}").get()
+
+    def put_match_payload(self, match_id, payload):
+        WriteBatch().set(f"matches/{match_id}", payload).commit(wait=False)  # Coalesced with concurrent fetches
+
+    # PUUID match index
+
+    def get_puuid_matches(self, puuid, limit=None, start_at=None):
+        query = self._db.reference(f"puuid_matches/{puuid}").order_by_key()
+        if start_at:
+            query = query.start_at(start_at)
+        if limit:
+            query = query.limit_to_last(limit)
+        indexed_matches = query.get() or {}
+        return [indexed_matches[key] for key in sorted(indexed_matches, reverse=True)]
+
+    def save_puuid_matches(self, entries):
+        """
+        Write (puuid, key, match) entries in one multi-path update.
+        """
+        batch = WriteBatch()
+        for puuid, key, match in entries:
+            batch.set(f"puuid_matches/{puuid}/{key}", match)
+        batch.commit(wait=False)
+
+    # LP history
+
+    def get_lp_last(self, summoner_id):
+        return self._db.reference(f"lp_history/{summoner_id}/last").get()
+
+    def append_lp_sample(self, summoner_id, timestamp, snapshot, rollup_keys, build_sample):
+        """
+        Replace the summoner's last snapshot in a transaction, so concurrent processes
+        never compare against or build deltas from a stale one, then write the sample
+        and rollups.
+
+        :param build_sample: Called with (last snapshot or {}, snapshot); returns the
+            sample to append, or None if the rank is unchanged.
+        :return: The appended sample, or None.
+        """
+        built = []
+
+        def update(last):
+            built[:] = [build_sample(last or {}, snapshot)]
+            return last if built[0] is None else {**snapshot, "timestamp": timestamp}
+
+        self._db.reference(f"lp_history/{summoner_id}/last").transaction(update)
+        sample = built[0]
+        if sample is not None:
+            batch = WriteBatch()
+            batch.set(f"lp_history/{summoner_id}/samples/{timestamp:013d}", sample)
+            for node, key in rollup_keys.items():
+                batch.set(f"lp_history/{summoner_id}/{node}/{key}", snapshot)
+            batch.commit()
+        return sample
+
+    def get_lp_rollups(self, summoner_id, node, end_at, count):
+        """
+        Read the last `count` rollups of a node (e.g. "daily") up to and including `end_at`.
+        """
+        return self._db.reference(f"lp_history/{summoner_id}/{node}").order_by_key() \
+            .end_at(end_at).limit_to_last(count).get() or {}
+
+
+class SQLiteStorage:
+    """
+    Storage in a local SQLite file, with matches indexed by PUUID and start time.
+    """
+
+    def __init__(self, path=STORAGE_PATH):
+        self.path = path
+        self._local = threading.local()
+        with self._connect() as conn:
+            conn.execute(
+                """
+                CREATE TABLE IF NOT EXISTS profiles (
+                    user_id TEXT PRIMARY KEY,
+                    puuid TEXT,
+                    data TEXT NOT NULL
+                )
+                """
+            )
+            conn.execute(
+                """
+                CREATE TABLE IF NOT EXISTS user_matches (
+                    user_id TEXT NOT NULL,
+                    match_key TEXT NOT NULL,
+                    match_id TEXT NOT NULL,
+                    puuid TEXT,
+                    game_start_timestamp INTEGER,
+                    data TEXT NOT NULL,
+                    PRIMARY KEY (user_id, match_key)
+                )
+                """
+            )
+            conn.execute("CREATE TABLE IF NOT EXISTS match_payloads (match_id TEXT PRIMARY KEY, data TEXT NOT NULL)")
+            conn.execute(
+                """
+                CREATE TABLE IF NOT EXISTS puuid_matches (
+                    puuid TEXT NOT NULL,
+                    match_key TEXT NOT NULL,
+                    data TEXT NOT NULL,
+                    PRIMARY KEY (puuid, match_key)
+                )
+                """
+            )
+            conn.execute(
+                """
+                CREATE TABLE IF NOT EXISTS lp_history (
+                    summoner_id TEXT NOT NULL,
+                    node TEXT NOT NULL,
+                    key TEXT NOT NULL,
+                    data TEXT NOT NULL,
+                    PRIMARY KEY (summoner_id, node, key)
+                )
+                """
+            )
+            # Read-through bookkeeping: when the local profile was last checked against
+            # Firebase, and the match key at or below which every match is stored locally
+            conn.execute(
+                """
+                CREATE TABLE IF NOT EXISTS local_sync (
+                    user_id TEXT PRIMARY KEY,
+                    checked_at REAL NOT NULL,
+                    complete_from TEXT
+                )
+                """
+            )
+            conn.execute("CREATE INDEX IF NOT EXISTS profiles_puuid ON profiles (puuid)")
+            conn.execute(
+                "CREATE INDEX IF NOT EXISTS user_matches_puuid_time ON user_matches (puuid, game_start_timestamp)"
+            )
+
+    def _connect(self):
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=30, isolation_level=None)
+            conn.row_factory = sqlite3.Row
+            conn.execute("PRAGMA journal_mode=WAL")
+            self._local.conn = conn
+        return conn
+
+    def _write(self, apply):
+        """
+        Run `apply(conn)` inside a write transaction.
+        """
+        conn = self._connect()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            result = apply(conn)
+            conn.execute("COMMIT")
+            return result
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+
+    @staticmethod
+    def _read_profile(conn, user_id):
+        row = conn.execute("SELECT data FROM profiles WHERE user_id = ?", (user_id,)).fetchone()
+        return json.loads(row["data"]) if row else None
+
+    @staticmethod
+    def _write_profile(conn, user_id, profile):
+        conn.execute(
+            "INSERT OR REPLACE INTO profiles (user_id, puuid, data) VALUES (?, ?, ?)",
+            (user_id, get_path(profile, "summoner_info/puuid"), json.dumps(profile)),
+        )
+
+    # Profiles
+
+    def get_profile(self, user_id):
+        return self._read_profile(self._connect(), user_id)
+
+    def get_profile_field(self, user_id, field):
+        return get_path(self.get_profile(user_id), field)
+
+    def update_profile(self, user_id, fields):
+        self.save_user_matches(user_id, [], fields)
+
+    def list_user_ids(self):
+        return [row["user_id"] for row in self._connect().execute("SELECT user_id FROM profiles")]
+
+    # Read-through bookkeeping
+
+    def get_local_sync(self, user_id):
+        row = self._connect().execute(
+            "SELECT checked_at, complete_from FROM local_sync WHERE user_id = ?", (user_id,)
+        ).fetchone()
+        return dict(row) if row else None
+
+    def mark_checked(self, user_id, checked_at):
+        self._connect().execute(
+            "INSERT INTO local_sync (user_id, checked_at) VALUES (?, ?) "
+            "ON CONFLICT (user_id) DO UPDATE SET checked_at = excluded.checked_at",
+            (user_id, checked_at),
+        )
+
+    def mark_complete_from(self, user_id, key):
+        """
+        Record that every match with a key at or below `key` is stored locally.
+        """
+        self._connect().execute(
+            "INSERT INTO local_sync (user_id, checked_at, complete_from) VALUES (?, 0, ?) "
+            "ON CONFLICT (user_id) DO UPDATE SET complete_from = "
+            "CASE WHEN complete_from IS NULL OR complete_from < excluded.complete_from "
+            "THEN excluded.complete_from ELSE complete_from END",
+            (user_id, key),
+        )
+
+    def replace_profile(self, user_id, profile, checked_at):
+        """
+        Replace the local copy of a profile that changed elsewhere, dropping its matches
+        so they are read again.
+        """
+        def apply(conn):
+            self._write_profile(conn, user_id, profile)
+            conn.execute("DELETE FROM user_matches WHERE user_id = ?", (user_id,))
+            conn.execute(
+                "INSERT OR REPLACE INTO local_sync (user_id, checked_at, complete_from) VALUES (?, ?, NULL)",
+                (user_id, checked_at),
+            )
+
+        self._write(apply)
+
+    # Matches
+
+    def get_user_matches(self, user_id, limit=None, end_at=None):
+        query = "SELECT data FROM user_matches WHERE user_id = ?"
+        params = [user_id]
+        if end_at:
+            query += " AND match_key <= ?"
+            params.append(end_at)
+        query += " ORDER BY match_key DESC"
+        if limit:
+            query += " LIMIT ?"
+            params.append(limit)
+        return [json.loads(row["data"]) for row in self._connect().execute(query, params)]
+
+    def get_stored_match_keys(self, user_id):
+        rows = self._connect().execute("SELECT match_key FROM user_matches WHERE user_id = ?", (user_id,))
+        return set(row["match_key"] for row in rows)
+
+    def save_user_matches(self, user_id, matches, profile_fields=None):
+        """
+        Write matches (by storage key) and profile fields (by path) in one transaction.
+        """
+        def apply(conn):
+            if profile_fields:
+                profile = self._read_profile(conn, user_id) or {}
+                for field, value in profile_fields.items():
+                    set_path(profile, field, value)
+                self._write_profile(conn, user_id, profile)
+            conn.executemany(
+                "INSERT OR REPLACE INTO user_matches (user_id, match_key, match_id, puuid, game_start_timestamp, data) "
+                "VALUES (?, ?, ?, ?, ?, ?)",
+                [
+                    (
+                        user_id, key, match.get("match_id", ""), get_path(match, "user_data/puuid"),
+                        match.get("game_start_timestamp"), json.dumps(match),
+                    )
+                    for key, match in matches
+                ],
+            )
+
+        self._write(apply)
+
+    # Aggregates
+
+    def update_aggregates(self, user_id, update):
+        def apply(conn):
+            profile = self._read_profile(conn, user_id) or {}
+            aggregates = update(profile.get("aggregates"))
+            set_path(profile, "aggregates", aggregates)
+            self._write_profile(conn, user_id, profile)
+            return aggregates
+
+        return self._write(apply)
+
+    def set_aggregates(self, user_id, aggregates):
+        self.update_aggregates(user_id, lambda current: aggregates)
+
+    # Match payloads
+
+    def get_match_payload(self, match_id):
+        row = self._connect().execute("SELECT data FROM match_payloads WHERE match_id = ?", (match_id,)).fetchone()
+        return json.loads(row["data"]) if row else None
+
+    def put_match_payload(self, match_id, payload):
+        self._connect().execute(
+            "INSERT OR REPLACE INTO match_payloads (match_id, data) VALUES (?, ?)", (match_id, json.dumps(payload))
+        )
+
+    # PUUID match index
+
+    def get_puuid_matches(self, puuid, limit=None, start_at=None):
+        query = "SELECT data FROM puuid_matches WHERE puuid = ?"
+        params = [puuid]
+        if start_at:
+            query += " AND match_key >= ?"
+            params.append(start_at)
+        query += " ORDER BY match_key DESC"
+        if limit:
+            query += " LIMIT ?"
+            params.append(limit)
+        return [json.loads(row["data"]) for row in self._connect().execute(query, params)]
+
+    def save_puuid_matches(self, entries):
+        self._write(lambda conn: conn.executemany(
+            "INSERT OR REPLACE INTO puuid_matches (puuid, match_key, data) VALUES (?, ?, ?)",
+            [(puuid, key, json.dumps(match)) for puuid, key, match in entries],
+        ))
+
+    # LP history
+
+    def get_lp_last(self, summoner_id):
+        row = self._connect().execute(
+            "SELECT data FROM lp_history WHERE summoner_id = ? AND node = 'last'", (summoner_id,)
+        ).fetchone()
+        return json.loads(row["data"]) if row else None
+
+    @staticmethod
+    def _put_lp_sample(conn, summoner_id, timestamp, sample, snapshot, rollup_keys):
+        rows = [
+            (summoner_id, "samples", f"{timestamp:013d}", json.dumps(sample)),
+            (summoner_id, "last", "", json.dumps({**snapshot, "timestamp": timestamp})),
+        ] + [(summoner_id, node, key, json.dumps(snapshot)) for node, key in rollup_keys.items()]
+        conn.executemany("INSERT OR REPLACE INTO lp_history (summoner_id, node, key, data) VALUES (?, ?, ?, ?)", rows)
+
+    def append_lp_sample(self, summoner_id, timestamp, snapshot, rollup_keys, build_sample):
+        """
+        Compare with the last snapshot and append the sample in one transaction
+        (see FirebaseStorage.append_lp_sample).
+        """
+        def apply(conn):
+            row = conn.execute(
+                "SELECT data FROM lp_history WHERE summoner_id = ? AND node = 'last'", (summoner_id,)
+            ).fetchone()
+            sample = build_sample(json.loads(row["data"]) if row else {}, snapshot)
+            if sample is not None:
+                self._put_lp_sample(conn, summoner_id, timestamp, sample, snapshot, rollup_keys)
+            return sample
+
+        return self._write(apply)
+
+    def put_lp_sample(self, summoner_id, timestamp, sample, snapshot, rollup_keys):
+        """
+        Write a sample already built against the last snapshot in another store.
+        """
+        self._write(lambda conn: self._put_lp_sample(conn, summoner_id, timestamp, sample, snapshot, rollup_keys))
+
+    def get_lp_rollups(self, summoner_id, node, end_at, count):
+        rows = self._connect().execute(
+            "SELECT key, data FROM lp_history WHERE summoner_id = ? AND node = ? AND key <= ? "
+            "ORDER BY key DESC LIMIT ?",
+            (summoner_id, node, end_at, count),
+        )
+        return {row["key"]: json.loads(row["data"]) for row in rows}
+
+
+class ReadThroughStorage:
+    """
+    SQLite in front of Firebase: reads are served locally and filled from Firebase on
+    a miss, writes go to Firebase and then to SQLite.
+    """
+
+    def __init__(self, local, remote):
+        self.local = local
+        self.remote = remote
+
+    def _load_profile(self, user_id):
+        profile = self.local.get_profile(user_id)
+        sync = self.local.get_local_sync(user_id)
+        now = time.time()
+        if profile is not None and sync and now - sync["checked_at"] < READ_THROUGH_TTL:
+            return profile
+
+        # Another host may have written the profile since it was copied
+        if profile is not None and self._is_current(user_id, profile):
+            self.local.mark_checked(user_id, now)
+            return profile
+
+        profile = self.remote.get_profile(user_id)
+        if profile is not None:
+            self.local.replace_profile(user_id, profile, now)
+        return profile
+
+    def _is_current(self, user_id, profile):
+        """
+        Whether the local profile matches Firebase's version stamp: page_version, which
+        every write that changes the profile page sets, or last_updated for older profiles.
+        """
+        for field in ("page_version", "last_updated"):
+            remote_version = self.remote.get_profile_field(user_id, field)
+            if remote_version is not None or profile.get(field) is not None:
+                return remote_version == profile.get(field)
+        return True
+
+    def get_profile(self, user_id):
+        return self._load_profile(user_id)
+
+    def get_profile_field(self, user_id, field):
+        return get_path(self._load_profile(user_id), field)
+
+    def update_profile(self, user_id, fields):
+        self.save_user_matches(user_id, [], fields)
+
+    def list_user_ids(self):
+        return self.remote.list_user_ids()
+
+    def get_user_matches(self, user_id, limit=None, end_at=None):
+        self._load_profile(user_id)  # Drops the local matches if the profile changed elsewhere
+        matches = self.local.get_user_matches(user_id, limit, end_at)
+        if limit and len(matches) >= limit:
+            return matches
+
+        # A short page is complete if every match up to end_at is known to be stored locally
+        complete_from = (self.local.get_local_sync(user_id) or {}).get("complete_from")
+        if complete_from and (end_at or ALL_MATCHES) <= complete_from:
+            return matches
+
+        # Fewer stored locally than requested: the rest may only be in Firebase
+        matches = self.remote.get_user_matches(user_id, limit, end_at)
+        if matches:
+            self.local.save_user_matches(user_id, [(match_sort_key(match), match) for match in matches])
+        if not limit or len(matches) < limit:
+            self.local.mark_complete_from(user_id, end_at or ALL_MATCHES)
+        return matches
+
+    def get_stored_match_keys(self, user_id):
+        return self.remote.get_stored_match_keys(user_id)
+
+    def save_user_matches(self, user_id, matches, profile_fields=None):
+        self.remote.save_user_matches(user_id, matches, profile_fields)
+        if profile_fields and self.local.get_profile(user_id) is None:
+            # Fill the whole profile first, so the local copy is not a partial one
+            self._load_profile(user_id)
+        self.local.save_user_matches(user_id, matches, profile_fields)
+
+    def update_aggregates(self, user_id, update):
+        aggregates = self.remote.update_aggregates(user_id, update)
+        self._load_profile(user_id)
+        self.local.set_aggregates(user_id, aggregates)
+        return aggregates
+
+    def get_match_payload(self, match_id):
+        payload = self.local.get_match_payload(match_id)
+        if payload is None:
+            payload = self.remote.get_match_payload(match_id)
+            if payload is not None:
+                self.local.put_match_payload(match_id, payload)
+        return payload
+
+    def put_match_payload(self, match_id, payload):
+        self.remote.put_match_payload(match_id, payload)
+        self.local.put_match_payload(match_id, payload)
+
+    def get_puuid_matches(self, puuid, limit=None, start_at=None):
+        matches = self.local.get_puuid_matches(puuid, limit, start_at)
+        if limit and len(matches) >= limit:
+            return matches
+
+        matches = self.remote.get_puuid_matches(puuid, limit, start_at)
+        if matches:
+            self.local.save_puuid_matches([(puuid, match_sort_key(match), match) for match in matches])
+        return matches
+
+    def save_puuid_matches(self, entries):
+        self.remote.save_puuid_matches(entries)
+        self.local.save_puuid_matches(entries)
+
+    def get_lp_last(self, summoner_id):
+        # Other hosts record snapshots too, so the local copy may be behind
+        return self.remote.get_lp_last(summoner_id)
+
+    def append_lp_sample(self, summoner_id, timestamp, snapshot, rollup_keys, build_sample):
+        # Firebase holds the last snapshot every host compares against
+        sample = self.remote.append_lp_sample(summoner_id, timestamp, snapshot, rollup_keys, build_sample)
+        if sample is not None:
+            self.local.put_lp_sample(summoner_id, timestamp, sample, snapshot, rollup_keys)
+        return sample
+
+    def get_lp_rollups(self, summoner_id, node, end_at, count):
+        return self.remote.get_lp_rollups(summoner_id, node, end_at, count)
+
+
+def create_storage(name=STORAGE_BACKEND, path=STORAGE_PATH):
+    """
+    Create the storage backend by name ("firebase", "sqlite" or "sqlite+firebase").
+    """
+    if name == "sqlite":
+        return SQLiteStorage(path)
+
+    if name not in ("firebase", "sqlite+firebase"):
+        raise ValueError(f"Unknown storage backend: {name}")
+
+    import firebase_admin
+    if not firebase_admin._apps:
+        from config import firebase_config  # import to initialize db
+    if name == "firebase":
+        return FirebaseStorage()
+    return ReadThroughStorage(SQLiteStorage(path), FirebaseStorage())
+
+
+storage = create_storage()
@@ -0,0 +1,13 @@
+import os
+import sys
+import tempfile
+
+# Import the app's modules from the repository root
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+# Modules create their storage backend on import; keep it local and out of the repository
+os.environ.setdefault("STORAGE_BACKEND", "sqlite")
+os.environ.setdefault("STORAGE_PATH", os.path.join(tempfile.mkdtemp(), "riftiq.sqlite3"))
+
+# riot_client refuses to import without an API key; tests never call Riot
+os.environ.setdefault("RIOT_API_KEY", "test")
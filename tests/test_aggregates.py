@@ -0,0 +1,57 @@
+from riot_client import CURRENT_SEASON, EARLIER_SEASONS, add_matches_to_aggregates, season_start_timestamp
+
+
+def make_match(match_id, offset, win=True, champion="Ahri"):
+    return {
+        "match_id": f"NA1_{match_id}",
+        "game_start_timestamp": season_start_timestamp + offset,
+        "user_data": {"win": win, "kills": 5, "deaths": 2, "assists": 7, "totalCS": 150, "championName": champion},
+    }
+
+
+def test_reingesting_counted_matches_is_a_no_op():
+    matches = [make_match(n, n * 1000) for n in range(1, 4)]
+    aggregates = add_matches_to_aggregates(None, matches)
+    before = {"counted_range": dict(aggregates["counted_range"]), **aggregates[CURRENT_SEASON]}
+
+    add_matches_to_aggregates(aggregates, matches[1:])
+
+    assert aggregates[CURRENT_SEASON]["matches"] == 3
+    assert {"counted_range": aggregates["counted_range"], **aggregates[CURRENT_SEASON]} == before
+
+
+def test_newer_and_older_batches_extend_the_range():
+    aggregates = add_matches_to_aggregates(None, [make_match(5, 5000), make_match(6, 6000)])
+
+    add_matches_to_aggregates(aggregates, [make_match(9, 9000)])
+    add_matches_to_aggregates(aggregates, [make_match(2, 2000, win=False)])
+
+    season = aggregates[CURRENT_SEASON]
+    assert season["matches"] == 4
+    assert season["wins"] == 3
+    assert aggregates["counted_range"]["oldest"].endswith("_NA1_2")
+    assert aggregates["counted_range"]["newest"].endswith("_NA1_9")
+
+
+def test_duplicates_within_a_batch_count_once():
+    match = make_match(1, 1000)
+    aggregates = add_matches_to_aggregates(None, [match, dict(match)])
+
+    season = aggregates[CURRENT_SEASON]
+    assert season["matches"] == 1
+    assert season["kills"] == 5
+    assert season["champions"] == {"Ahri": {"games": 1, "wins": 1}}
+
+
+def test_matches_are_split_by_season():
+    aggregates = add_matches_to_aggregates(None, [
+        make_match(1, -1000, champion="Zed"),
+        make_match(2, 0),
+        make_match(3, 1000, win=False),
+    ])
+
+    assert aggregates[EARLIER_SEASONS]["matches"] == 1
+    assert aggregates[EARLIER_SEASONS]["champions"] == {"Zed": {"games": 1, "wins": 1}}
+    assert aggregates[CURRENT_SEASON]["matches"] == 2
+    assert aggregates[CURRENT_SEASON]["wins"] == 1
+    assert aggregates["counted_range"]["oldest"].endswith("_NA1_1")
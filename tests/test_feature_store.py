@@ -0,0 +1,33 @@
+import os
+
+from ml.feature_store import FeatureStore
+
+
+def make_match(number, puuid="P0"):
+    return {
+        "match_id": f"NA1_{number}",
+        "game_start_timestamp": number,
+        "user_data": {"puuid": puuid, "kills": number},
+    }
+
+
+def test_append_skips_rows_written_by_another_store(tmp_path):
+    # Two processes appending to the same directory
+    first = FeatureStore(str(tmp_path))
+    second = FeatureStore(str(tmp_path))
+
+    assert first.append([make_match(1), make_match(2)]) == 2
+    assert second.append([make_match(2), make_match(3)]) == 1
+    assert first.append([make_match(3), make_match(4)]) == 1
+    assert len(first) == 4
+
+
+def test_append_repairs_a_partial_append(tmp_path):
+    store = FeatureStore(str(tmp_path))
+    store.append([make_match(1)])
+    with open(os.path.join(str(tmp_path), "kills.bin"), "ab") as column_file:
+        column_file.write(b"\0" * 4)
+
+    assert store.append([make_match(2)]) == 1
+    assert len(set(store._row_counts().values())) == 1
+    assert store.select()["kills"].tolist() == [1, 2]
@@ -0,0 +1,54 @@
+import threading
+import time
+
+from job_queue import JobQueue, MAX_JOB_ATTEMPTS, SQLiteBackend
+
+
+def test_jobs_with_the_same_key_are_deduplicated(tmp_path):
+    backend = SQLiteBackend(str(tmp_path / "jobs.sqlite3"))
+    job_id = backend.enqueue("ingest_user", "ingest:P0", {})
+    assert backend.enqueue("ingest_user", "ingest:P0", {}) == job_id
+    assert backend.enqueue("ingest_user", "ingest:P1", {}) != job_id
+
+
+def test_expired_lease_requeues_then_fails_job(tmp_path):
+    backend = SQLiteBackend(str(tmp_path / "jobs.sqlite3"), lease_seconds=0.05)
+    job_id = backend.enqueue("ingest_user", "ingest:P0", {})
+
+    # A worker claims the job and dies without finishing it
+    assert backend.claim()["id"] == job_id
+    time.sleep(0.1)
+    assert backend.enqueue("ingest_user", "ingest:P0", {}) == job_id
+    assert backend.get(job_id)["status"] == "queued"
+
+    for _ in range(MAX_JOB_ATTEMPTS - 1):
+        assert backend.claim()["id"] == job_id
+        time.sleep(0.1)
+    assert backend.claim() is None
+    assert backend.get(job_id)["status"] == "failed"
+    assert backend.enqueue("ingest_user", "ingest:P0", {}) != job_id
+
+
+def test_running_job_lease_is_renewed(tmp_path):
+    backend = SQLiteBackend(str(tmp_path / "jobs.sqlite3"), lease_seconds=0.15)
+    job_queue = JobQueue(backend)
+    job_queue.register("slow", lambda: time.sleep(0.5) or "done")
+    job_id = job_queue.submit("slow", "slow")
+
+    worker = threading.Thread(target=job_queue.run_next)
+    worker.start()
+    time.sleep(0.3)
+    assert backend.get(job_id)["status"] == "running"
+    assert job_queue.submit("slow", "slow") == job_id
+    worker.join()
+    assert backend.get(job_id)["result"] == "done"
+
+
+def test_progress_is_readable_while_job_runs(tmp_path):
+    backend = SQLiteBackend(str(tmp_path / "jobs.sqlite3"))
+    job_queue = JobQueue(backend)
+    job_id = job_queue.submit("ingest_user", "ingest:P0")
+    backend.add_progress(job_id, {"match": 1})
+    backend.add_progress(job_id, {"match": 2})
+    assert job_queue.progress(job_id) == [{"match": 1}, {"match": 2}]
+    assert job_queue.progress(job_id, after=1) == [{"match": 2}]
@@ -0,0 +1,28 @@
+from lp_history import build_lp_sample
+from storage import SQLiteStorage
+
+ROLLUPS = {"daily": "2024-01-01", "weekly": "2024-01-01"}
+
+
+def snapshot(tier, rank, lp):
+    return {"tier": tier, "rank": rank, "lp": lp}
+
+
+def test_build_lp_sample():
+    assert build_lp_sample({}, snapshot("GOLD", "II", 10)) == snapshot("GOLD", "II", 10)
+    assert build_lp_sample(snapshot("GOLD", "II", 10), snapshot("GOLD", "II", 10)) is None
+    assert build_lp_sample(snapshot("GOLD", "II", 10), snapshot("GOLD", "II", 35)) == {"lp_delta": 25}
+    assert build_lp_sample(snapshot("GOLD", "II", 90), snapshot("GOLD", "I", 5)) == snapshot("GOLD", "I", 5)
+
+
+def test_stores_compare_against_the_shared_last_snapshot(tmp_path):
+    # Two processes recording the same summoner through one database
+    path = str(tmp_path / "riftiq.sqlite3")
+    first, second = SQLiteStorage(path), SQLiteStorage(path)
+
+    assert first.append_lp_sample("S0", 1000, snapshot("GOLD", "II", 10), ROLLUPS, build_lp_sample)
+    assert second.append_lp_sample("S0", 2000, snapshot("GOLD", "II", 30), ROLLUPS, build_lp_sample) == {"lp_delta": 20}
+    # The first store sees the second one's snapshot, so a return to 10 LP is a change
+    assert first.append_lp_sample("S0", 3000, snapshot("GOLD", "II", 10), ROLLUPS, build_lp_sample) == {"lp_delta": -20}
+    assert second.append_lp_sample("S0", 4000, snapshot("GOLD", "II", 10), ROLLUPS, build_lp_sample) is None
+    assert first.get_lp_last("S0")["timestamp"] == 3000
@@ -0,0 +1,14 @@
+import pytest
+
+from riot_client import InvalidCursorError, decode_match_cursor, encode_match_cursor
+
+
+def test_cursor_round_trip():
+    match = {"match_id": "NA1_123", "game_start_timestamp": 1700000000000}
+    assert decode_match_cursor(encode_match_cursor(match)) == "1700000000000_NA1_123"
+
+
+@pytest.mark.parametrize("cursor", ["not base64!", "bm9zZXBhcmF0b3I=", "//79", "YWJjX05BMV8x", 123])
+def test_malformed_cursor_is_rejected(cursor):
+    with pytest.raises(InvalidCursorError):
+        decode_match_cursor(cursor)
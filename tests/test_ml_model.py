@@ -0,0 +1,80 @@
+import numpy as np
+import pytest
+
+pytest.importorskip("sklearn")
+
+from ml.ml_model import (
+    calculate_performance_score,
+    calculate_performance_scores_batch,
+    calculate_precise_mmr,
+    calculate_precise_mmr_batch,
+    matches_to_table,
+)
+
+
+def make_match(kills, deaths, assists, cs, win, game_duration):
+    return {
+        "game_duration": game_duration,
+        "user_data": {"kills": kills, "deaths": deaths, "assists": assists, "totalCS": cs, "win": win},
+    }
+
+
+MATCH_HISTORIES = [
+    [make_match(8, 2, 10, 200, True, 30), make_match(1, 9, 3, 90, False, 25)],
+    [make_match(6, 5, 7, 195, True, 30), make_match(0, 0, 0, 0, False, 0), make_match(3, 6, 12, 7, True, 0)],
+    [],
+    [make_match(10, 1, 4, 300, True, 35)],
+]
+DISPLAYED_RANKS = ["GOLD II", "(DIAMOND IV)", "SILVER I", "NOT A RANK"]
+
+
+def scalar_scores(match_history):
+    return [calculate_performance_score(match["user_data"], match["game_duration"]) for match in match_history]
+
+
+def test_batch_scores_match_the_scalar_scores():
+    table = matches_to_table(MATCH_HISTORIES)
+
+    expected = [score for match_history in MATCH_HISTORIES for score in scalar_scores(match_history)]
+    assert calculate_performance_scores_batch(table).tolist() == expected
+
+
+def test_batch_scores_use_the_threshold_and_weight_overrides():
+    table = matches_to_table(MATCH_HISTORIES)
+    thresholds, weights = {"kills": 1, "cs_per_minute": 0}, {"win": (10, -10)}
+
+    expected = [
+        calculate_performance_score(match["user_data"], match["game_duration"], thresholds, weights)
+        for match_history in MATCH_HISTORIES for match in match_history
+    ]
+    assert calculate_performance_scores_batch(table, thresholds, weights).tolist() == expected
+
+
+def test_batch_mmr_matches_the_scalar_mmr():
+    _, precise_mmrs = calculate_precise_mmr_batch(matches_to_table(MATCH_HISTORIES), DISPLAYED_RANKS)
+
+    for user_index in (0, 1):
+        expected = calculate_precise_mmr(DISPLAYED_RANKS[user_index], scalar_scores(MATCH_HISTORIES[user_index]))
+        assert precise_mmrs[user_index] == expected
+
+
+def test_batch_mmr_of_a_user_without_matches_is_the_baseline():
+    _, precise_mmrs = calculate_precise_mmr_batch(matches_to_table(MATCH_HISTORIES), DISPLAYED_RANKS)
+
+    # The scalar path needs at least one score; a zero score leaves the baseline
+    assert precise_mmrs[2] == calculate_precise_mmr(DISPLAYED_RANKS[2], [0])
+
+
+def test_batch_mmr_of_an_invalid_rank_is_nan():
+    _, precise_mmrs = calculate_precise_mmr_batch(matches_to_table(MATCH_HISTORIES), DISPLAYED_RANKS)
+
+    assert np.isnan(precise_mmrs[3])
+    with pytest.raises(ValueError):
+        calculate_precise_mmr(DISPLAYED_RANKS[3], scalar_scores(MATCH_HISTORIES[3]))
+
+
+def test_empty_match_table():
+    scores, precise_mmrs = calculate_precise_mmr_batch(matches_to_table([[]]), ["GOLD II"])
+
+    assert scores.tolist() == []
+    assert precise_mmrs.tolist() == [calculate_precise_mmr("GOLD II", [0])]
@@ -0,0 +1,69 @@
+from rate_limiter import RateLimiter, RateWindow, parse_rate_limit_header
+
+
+class FakeResponse:
+    def __init__(self, headers, status_code=200):
+        self.headers = headers
+        self.status_code = status_code
+
+
+def test_parse_rate_limit_header_skips_malformed_parts():
+    assert parse_rate_limit_header("20:1,100:120") == [(20, 1), (100, 120)]
+    assert parse_rate_limit_header("20:1,junk,") == [(20, 1)]
+    assert parse_rate_limit_header(None) == []
+
+
+def test_window_waits_for_oldest_request_to_expire():
+    window = RateWindow(limit=2, window=10)
+    window.record(0)
+    window.record(3)
+    assert window.wait_time(5) == 5
+    assert window.wait_time(10) == 0
+
+
+def test_sync_count_keeps_log_sorted():
+    window = RateWindow(limit=100, window=120)
+    for t in range(50):
+        window.record(t)
+    window.sync_count(60, 100)
+
+    assert list(window.sent) == sorted(window.sent)
+    # Requests at t=0..5 fall out of the window at t=125 despite the synced ones after them
+    window._expire(125)
+    assert len(window.sent) == 54
+    assert window.wait_time(125) == 0
+
+
+def test_sync_count_never_exceeds_limit():
+    window = RateWindow(limit=5, window=10)
+    window.sync_count(50, 0)
+    assert len(window.sent) == 5
+    assert window.wait_time(1) == 9
+
+
+def test_limiter_blocks_after_app_limit():
+    limiter = RateLimiter("2:10")
+    assert limiter.try_acquire("americas", "match") == 0
+    assert limiter.try_acquire("americas", "match") == 0
+    assert limiter.try_acquire("americas", "match") > 0
+    # Each routing value has its own budget
+    assert limiter.try_acquire("europe", "match") == 0
+
+
+def test_method_429_blocks_only_that_method():
+    limiter = RateLimiter("100:10")
+    retry_after = limiter.update_from_response("na1", "league", FakeResponse(
+        {"Retry-After": "5", "X-Rate-Limit-Type": "method"}, status_code=429,
+    ))
+    assert retry_after == 5
+    assert limiter.try_acquire("na1", "league") > 0
+    assert limiter.try_acquire("na1", "summoner") == 0
+
+
+def test_response_count_header_reserves_requests_from_other_workers():
+    limiter = RateLimiter("10:10")
+    limiter.update_from_response("na1", "summoner", FakeResponse({
+        "X-App-Rate-Limit": "3:10",
+        "X-App-Rate-Limit-Count": "3:10",
+    }))
+    assert limiter.try_acquire("na1", "summoner") > 0
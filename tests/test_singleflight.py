@@ -0,0 +1,62 @@
+import asyncio
+import threading
+import time
+
+from singleflight import AsyncSingleFlight, SingleFlight
+
+
+def test_concurrent_calls_share_one_result():
+    flight = SingleFlight()
+    calls = []
+
+    def work():
+        calls.append(1)
+        time.sleep(0.1)
+        return "result"
+
+    results = []
+    threads = [threading.Thread(target=lambda: results.append(flight.do("key", work))) for _ in range(5)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert results == ["result"] * 5
+    assert len(calls) == 1
+
+
+def test_async_followers_survive_leader_cancellation():
+    calls = []
+
+    async def work():
+        calls.append(1)
+        await asyncio.sleep(0.05)
+        return "result"
+
+    async def run():
+        flight = AsyncSingleFlight()
+        leader = asyncio.create_task(flight.do("key", work))
+        await asyncio.sleep(0.01)
+        followers = [asyncio.create_task(flight.do("key", work)) for _ in range(3)]
+        await asyncio.sleep(0.01)
+        leader.cancel()
+        return await asyncio.gather(*followers), flight
+
+    results, flight = asyncio.run(run())
+    assert results == ["result"] * 3
+    # The cancelled leader's call plus one retry led by a follower
+    assert len(calls) == 2
+    assert not flight._calls
+
+
+def test_async_errors_are_shared():
+    async def fail():
+        await asyncio.sleep(0.01)
+        raise ValueError("boom")
+
+    async def run():
+        flight = AsyncSingleFlight()
+        return await asyncio.gather(flight.do("key", fail), flight.do("key", fail), return_exceptions=True)
+
+    results = asyncio.run(run())
+    assert all(isinstance(result, ValueError) for result in results)
@@ -0,0 +1,80 @@
+import storage as storage_module
+from storage import ReadThroughStorage, SQLiteStorage, match_sort_key
+
+
+class CountingStorage(SQLiteStorage):
+    """
+    Stands in for Firebase and counts the match page reads.
+    """
+
+    def __init__(self, path):
+        super().__init__(path)
+        self.match_reads = 0
+
+    def get_user_matches(self, user_id, limit=None, end_at=None):
+        self.match_reads += 1
+        return super().get_user_matches(user_id, limit, end_at)
+
+
+def make_match(number):
+    return {"match_id": f"NA1_{number}", "game_start_timestamp": number}
+
+
+def save(store, user_id, numbers, last_updated):
+    matches = [make_match(number) for number in numbers]
+    store.save_user_matches(
+        user_id, [(match_sort_key(match), match) for match in matches], {"last_updated": last_updated}
+    )
+
+
+def test_short_pages_are_served_locally_once_complete(tmp_path):
+    remote = CountingStorage(str(tmp_path / "remote.sqlite3"))
+    save(remote, "u", [1, 2, 3], "v1")
+    store = ReadThroughStorage(SQLiteStorage(str(tmp_path / "local.sqlite3")), remote)
+
+    assert len(store.get_user_matches("u", limit=20)) == 3
+    assert len(store.get_user_matches("u", limit=20)) == 3
+    assert remote.match_reads == 1
+
+    # An older page below the complete range is local too
+    end_at = match_sort_key(make_match(2))
+    assert [match["match_id"] for match in store.get_user_matches("u", limit=20, end_at=end_at)] == ["NA1_2", "NA1_1"]
+    assert remote.match_reads == 1
+
+
+def test_profile_changed_on_another_host_is_reloaded(tmp_path, monkeypatch):
+    monkeypatch.setattr(storage_module, "READ_THROUGH_TTL", 0)
+    remote = CountingStorage(str(tmp_path / "remote.sqlite3"))
+    save(remote, "u", [1], "v1")
+    first = ReadThroughStorage(SQLiteStorage(str(tmp_path / "first.sqlite3")), remote)
+    second = ReadThroughStorage(SQLiteStorage(str(tmp_path / "second.sqlite3")), remote)
+
+    assert first.get_profile_field("u", "last_updated") == "v1"
+    assert len(first.get_user_matches("u", limit=20)) == 1
+
+    save(second, "u", [2], "v2")
+    assert first.get_profile_field("u", "last_updated") == "v2"
+    assert [match["match_id"] for match in first.get_user_matches("u", limit=20)] == ["NA1_2", "NA1_1"]
+
+
+def test_local_profile_is_served_within_ttl(tmp_path, monkeypatch):
+    monkeypatch.setattr(storage_module, "READ_THROUGH_TTL", 3600)
+    remote = CountingStorage(str(tmp_path / "remote.sqlite3"))
+    save(remote, "u", [1], "v1")
+    store = ReadThroughStorage(SQLiteStorage(str(tmp_path / "local.sqlite3")), remote)
+
+    assert store.get_profile_field("u", "last_updated") == "v1"
+    remote.update_profile("u", {"last_updated": "v2"})
+    assert store.get_profile_field("u", "last_updated") == "v1"
+
+
+def test_page_version_change_is_picked_up(tmp_path, monkeypatch):
+    # e.g. lobby ranks written by a worker.py process, which leaves last_updated alone
+    monkeypatch.setattr(storage_module, "READ_THROUGH_TTL", 0)
+    remote = CountingStorage(str(tmp_path / "remote.sqlite3"))
+    remote.update_profile("u", {"last_updated": "v1", "page_version": "a"})
+    store = ReadThroughStorage(SQLiteStorage(str(tmp_path / "local.sqlite3")), remote)
+
+    assert store.get_profile_field("u", "page_version") == "a"
+    remote.update_profile("u", {"page_version": "b"})
+    assert store.get_profile_field("u", "page_version") == "b"
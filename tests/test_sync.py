@@ -0,0 +1,25 @@
+import riot_client
+
+
+def test_new_matches_are_paged_until_the_last_synced_match(monkeypatch):
+    # 150 new matches sit on top of the last synced one, newest first
+    history = [f"NA1_{n}" for n in range(1000, 849, -1)]
+    requested = []
+
+    def get_match_history_paged(puuid, start=0, count=20, **filters):
+        requested.append(start)
+        return history[start:start + count]
+
+    def fetch_match_details(puuid, match_ids, region, indexed=None):
+        return [{"match_id": match_id, "game_start_timestamp": int(match_id[4:]) * 1000} for match_id in match_ids]
+
+    monkeypatch.setattr(riot_client, "get_match_history_paged", get_match_history_paged)
+    monkeypatch.setattr(riot_client, "fetch_match_details", fetch_match_details)
+    monkeypatch.setattr(riot_client, "load_indexed_matches", lambda puuid: {})
+
+    sync_state = {"latest_match_id": "NA1_850", "latest_timestamp": 850000}
+    matches, new_state = riot_client.fetch_new_matches("puuid", "na1", sync_state)
+
+    assert len(requested) == 8
+    assert [match["match_id"] for match in matches] == history[:150]
+    assert new_state == {"latest_match_id": "NA1_1000", "latest_timestamp": 1000000}
@@ -0,0 +1,71 @@
+import write_batch
+from write_batch import WriteBatch, WriteCoalescer, merge_update
+
+
+class RecordingReference:
+    def __init__(self):
+        self.updates = []
+
+    def update(self, updates):
+        self.updates.append(updates)
+
+
+def assert_no_nested_paths(updates):
+    for path in updates:
+        assert not any(other.startswith(path + "/") for other in updates), path
+
+
+def test_child_path_is_merged_into_its_parent():
+    updates = {}
+    merge_update(updates, "users/a/summoner_info", {"puuid": "old", "name": "A"})
+    merge_update(updates, "users/a/summoner_info/puuid", "new")
+
+    assert updates == {"users/a/summoner_info": {"puuid": "new", "name": "A"}}
+
+
+def test_parent_path_replaces_its_children():
+    updates = {}
+    merge_update(updates, "users/a/summoner_info/puuid", "old")
+    merge_update(updates, "users/a/summoner_info/level", 30)
+    merge_update(updates, "users/a/summoner_info", {"puuid": "new"})
+
+    assert updates == {"users/a/summoner_info": {"puuid": "new"}}
+
+
+def test_child_merge_does_not_mutate_the_written_value():
+    summoner_info = {"puuid": "old", "name": "A"}
+    updates = {}
+    merge_update(updates, "users/a/summoner_info", summoner_info)
+    merge_update(updates, "users/a/summoner_info/puuid", None)
+
+    assert updates == {"users/a/summoner_info": {"name": "A"}}
+    assert summoner_info == {"puuid": "old", "name": "A"}
+
+
+def test_commit_sends_one_non_conflicting_update(monkeypatch):
+    reference = RecordingReference()
+    monkeypatch.setattr(write_batch.db, "reference", lambda: reference)
+
+    batch = WriteBatch()
+    batch.set("users/a/summoner_info", {"puuid": "old", "name": "A"})
+    batch.set("users/a/summoner_info/puuid", "new")
+    batch.set("users/a/last_updated", "now")
+    batch.commit()
+
+    assert reference.updates == [{
+        "users/a/summoner_info": {"puuid": "new", "name": "A"},
+        "users/a/last_updated": "now",
+    }]
+    assert_no_nested_paths(reference.updates[0])
+
+
+def test_coalesced_batches_merge_overlapping_paths(monkeypatch):
+    reference = RecordingReference()
+    monkeypatch.setattr(write_batch.db, "reference", lambda: reference)
+    coalescer = WriteCoalescer(flush_interval=3600)
+
+    WriteBatch(coalescer).set("users/a/summoner_info", {"puuid": "old", "name": "A"}).commit(wait=False)
+    WriteBatch(coalescer).set("users/a/summoner_info/puuid", "new").commit(wait=False)
+    coalescer.flush()
+
+    assert reference.updates == [{"users/a/summoner_info": {"puuid": "new", "name": "A"}}]
@@ -0,0 +1,38 @@
+"""
+Standalone ingestion worker.
+
+Runs queued match ingestion jobs from the shared SQLite job queue, so slow Riot
+lookups never tie up the web process. Start the web app with
+JOB_QUEUE_BACKEND=sqlite and JOB_WORKERS=0, then run one or more workers.
+
+Usage:
+    python worker.py [--workers 4] [--queue jobs.sqlite3]
+"""
+import argparse
+import os
+import time
+from job_queue import JobQueue, SQLiteBackend
+from riot_client import register_ingestion_jobs
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Run background match ingestion jobs.")
+    parser.add_argument("--workers", type=int, default=4, help="Number of worker threads.")
+    parser.add_argument("--queue", default=os.getenv("JOB_QUEUE_PATH", "jobs.sqlite3"), help="SQLite job queue path.")
+    args = parser.parse_args()
+
+    job_queue = JobQueue(SQLiteBackend(args.queue))
+    register_ingestion_jobs(job_queue)
+    job_queue.start_workers(args.workers)
+    print(f"Worker started with {args.workers} threads on {args.queue}.")
+
+    try:
+        while True:
+            time.sleep(1)
+    except KeyboardInterrupt:
+        print("Stopping worker...")
+        job_queue.stop()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,131 @@
+import atexit
+import os
+import threading
+from firebase_admin import db
+
+# Milliseconds a batch may wait to be combined with other batches; 0 writes every batch at once
+WRITE_COALESCE_MS = float(os.getenv("WRITE_COALESCE_MS", "0"))
+
+
+def merge_update(updates, path, value):
+    """
+    Add a path write to a multi-path update.
+
+    Realtime Database rejects updates where one path is inside another, so a write
+    below an existing path is merged into that path's value, and a write above
+    existing paths replaces them.
+    """
+    path = path.strip("/")
+    for existing in [key for key in updates if key.startswith(path + "/")]:
+        del updates[existing]  # Overwritten by the new value
+
+    for existing in list(updates):
+        if path.startswith(existing + "/"):
+            node = updates[existing] = dict(updates[existing]) if isinstance(updates[existing], dict) else {}
+            parts = path[len(existing) + 1:].split("/")
+            for part in parts[:-1]:
+                child = node.get(part)
+                node[part] = dict(child) if isinstance(child, dict) else {}
+                node = node[part]
+            if value is None:
+                node.pop(parts[-1], None)
+            else:
+                node[parts[-1]] = value
+            return
+
+    updates[path] = value
+
+
+class _Window:
+    def __init__(self):
+        self.done = threading.Event()
+        self.error = None
+
+
+class WriteCoalescer:
+    """
+    Combines the batches committed within a short flush window into one multi-path
+    update. Later writes to a path win over earlier ones in the same window.
+    """
+
+    def __init__(self, flush_interval):
+        self.flush_interval = flush_interval
+        self._lock = threading.Lock()
+        self._pending = {}
+        self._window = None
+        atexit.register(self.flush)
+
+    def submit(self, updates, wait=True):
+        """
+        Queue a batch for the current flush window.
+
+        :param wait: Block until the window is written, raising its error if it failed.
+        """
+        with self._lock:
+            for path, value in updates.items():
+                merge_update(self._pending, path, value)
+            if self._window is None:
+                self._window = _Window()
+                timer = threading.Timer(self.flush_interval, self.flush)
+                timer.daemon = True
+                timer.start()
+            window = self._window
+
+        if wait:
+            window.done.wait()
+            if window.error is not None:
+                raise window.error
+
+    def flush(self):
+        with self._lock:
+            updates, window = self._pending, self._window
+            self._pending, self._window = {}, None
+        if window is None:
+            return
+
+        try:
+            if updates:
+                db.reference().update(updates)
+        except Exception as e:
+            print(f"Failed to flush {len(updates)} coalesced writes: {e}")
+            window.error = e
+        finally:
+            window.done.set()
+
+
+default_coalescer = WriteCoalescer(WRITE_COALESCE_MS / 1000) if WRITE_COALESCE_MS > 0 else None
+
+
+class WriteBatch:
+    """
+    Collects the writes of one logical operation and sends them as a single atomic
+    multi-path update, through the write coalescer when one is configured.
+    """
+
+    def __init__(self, coalescer=None):
+        self._updates = {}
+        self._coalescer = coalescer or default_coalescer
+
+    def set(self, path, value):
+        merge_update(self._updates, path, value)
+        return self
+
+    def delete(self, path):
+        return self.set(path, None)
+
+    def __len__(self):
+        return len(self._updates)
+
+    def commit(self, wait=True):
+        """
+        Write the collected changes.
+
+        :param wait: When coalescing, block until the flush window is written.
+        """
+        updates, self._updates = self._updates, {}
+        if not updates:
+            return
+        if self._coalescer is not None:
+            self._coalescer.submit(updates, wait)
+        else:
+            db.reference().update(updates)